@@ -1,8 +1,11 @@
-
 import pandas as pd
 import numpy as np
 from faker import Faker
 import random
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 # Initialize Faker
@@ -16,80 +19,262 @@ PROJECT_STATUSES = ["Completed", "In Progress", "Not Started"]
 VENDORS = ["Apex Construction", "Stellar Renovations", "Keystone Builders", "Summit Contractors", "Precision Mechanical"]
 ESG_INITIATIVES = ["LED Lighting Upgrade", "High-Efficiency HVAC", "Water Conservation Fixtures", "Solar Panel Installation", "Green Roof"]
 
-# --- Data Generation ---
-data = []
-for i in range(1, NUM_ROWS + 1):
-    project_id = f"CAP-{i:03d}"
-    property_name = fake.company() + " Heights"
-    city = random.choice(CITIES)
-    project_type = random.choice(PROJECT_TYPES)
-    project_status = random.choice(PROJECT_STATUSES)
-    
-    start_date = fake.date_between(start_date=datetime(2022, 1, 1), end_date=datetime(2024, 12, 31))
-    planned_end_date = start_date + timedelta(days=random.randint(60, 365))
-    
-    budget = random.randint(50000, 5000000)
-    vendor = random.choice(VENDORS)
-
-    # Initialize fields that depend on status
-    actual_end_date = None
-    actual_cost = None
-    pre_reno_rent = None
-    post_reno_rent = None
-
-    # --- Logic for "Completed" projects ---
-    if project_status == "Completed":
-        # Simulate schedule variance
-        schedule_variance_days = random.randint(-15, 90)
-        # Apex Construction is more likely to be late
-        if vendor == "Apex Construction":
-            schedule_variance_days = random.randint(30, 120)
-        actual_end_date = planned_end_date + timedelta(days=schedule_variance_days)
-
-        # Simulate cost variance
-        cost_variance_multiplier = random.uniform(-0.05, 0.20)
-        # Apex Construction is more likely to be over budget
-        if vendor == "Apex Construction":
-            cost_variance_multiplier = random.uniform(0.10, 0.25)
-        actual_cost = budget * (1 + cost_variance_multiplier)
-
-    # --- Logic for "Suite Renovation" projects ---
-    if project_type == "Suite Renovation":
-        pre_reno_rent = random.randint(1800, 2500)
-        if project_status == "Completed":
-            rent_multiplier = random.uniform(1.15, 1.30)
-            post_reno_rent = pre_reno_rent * rent_multiplier
-
-    # --- Logic for ESG Initiatives (25% chance) ---
-    esg_initiative = random.choice(ESG_INITIATIVES) if random.random() < 0.25 else None
-
-    data.append([
-        project_id,
-        property_name,
-        city,
-        project_type,
-        project_status,
-        start_date,
-        planned_end_date,
-        actual_end_date,
-        budget,
-        actual_cost,
-        vendor,
-        esg_initiative,
-        pre_reno_rent,
-        post_reno_rent
-    ])
-
-# --- Create DataFrame ---
-columns = [
+START_DATE_MIN = datetime(2022, 1, 1)
+START_DATE_MAX = datetime(2024, 12, 31)
+PROPERTY_NAME_POOL_SIZE = 5000
+OUTPUT_PATH = "mock_capex_data.csv"
+CHUNK_SIZE = 100_000
+
+COLUMNS = [
     "ProjectID", "PropertyName", "City", "ProjectType", "ProjectStatus",
     "StartDate", "PlannedEndDate", "ActualEndDate", "Budget", "ActualCost",
     "Vendor", "ESG_Initiative", "PreReno_Rent", "PostReno_Rent"
 ]
-df = pd.DataFrame(data, columns=columns)
 
-# --- Save to CSV ---
-output_path = "mock_capex_data.csv"
-df.to_csv(output_path, index=False, date_format='%Y-%m-%d')
+# --- 1. Row-by-row Generation (original) ---
+def generate_rows(num_rows):
+    """Generates projects one row at a time with Faker and `random`."""
+    data = []
+    for i in range(1, num_rows + 1):
+        project_id = f"CAP-{i:03d}"
+        property_name = fake.company() + " Heights"
+        city = random.choice(CITIES)
+        project_type = random.choice(PROJECT_TYPES)
+        project_status = random.choice(PROJECT_STATUSES)
+
+        start_date = fake.date_between(start_date=START_DATE_MIN, end_date=START_DATE_MAX)
+        planned_end_date = start_date + timedelta(days=random.randint(60, 365))
+
+        budget = random.randint(50000, 5000000)
+        vendor = random.choice(VENDORS)
+
+        # Initialize fields that depend on status
+        actual_end_date = None
+        actual_cost = None
+        pre_reno_rent = None
+        post_reno_rent = None
+
+        # --- Logic for "Completed" projects ---
+        if project_status == "Completed":
+            # Simulate schedule variance
+            schedule_variance_days = random.randint(-15, 90)
+            # Apex Construction is more likely to be late
+            if vendor == "Apex Construction":
+                schedule_variance_days = random.randint(30, 120)
+            actual_end_date = planned_end_date + timedelta(days=schedule_variance_days)
+
+            # Simulate cost variance
+            cost_variance_multiplier = random.uniform(-0.05, 0.20)
+            # Apex Construction is more likely to be over budget
+            if vendor == "Apex Construction":
+                cost_variance_multiplier = random.uniform(0.10, 0.25)
+            actual_cost = budget * (1 + cost_variance_multiplier)
+
+        # --- Logic for "Suite Renovation" projects ---
+        if project_type == "Suite Renovation":
+            pre_reno_rent = random.randint(1800, 2500)
+            if project_status == "Completed":
+                rent_multiplier = random.uniform(1.15, 1.30)
+                post_reno_rent = pre_reno_rent * rent_multiplier
+
+        # --- Logic for ESG Initiatives (25% chance) ---
+        esg_initiative = random.choice(ESG_INITIATIVES) if random.random() < 0.25 else None
+
+        data.append([
+            project_id,
+            property_name,
+            city,
+            project_type,
+            project_status,
+            start_date,
+            planned_end_date,
+            actual_end_date,
+            budget,
+            actual_cost,
+            vendor,
+            esg_initiative,
+            pre_reno_rent,
+            post_reno_rent
+        ])
+
+    return pd.DataFrame(data, columns=COLUMNS)
+
+# --- 2. Vectorized Generation ---
+def build_property_name_pool(seed, pool_size=PROPERTY_NAME_POOL_SIZE):
+    """Pre-generates property names so Faker is not called once per row."""
+    pool_faker = Faker()
+    pool_faker.seed_instance(seed)
+    return np.array([pool_faker.company() + " Heights" for _ in range(pool_size)], dtype=object)
+
+
+def generate_vectorized(num_rows, seed, name_pool=None, start_id=1):
+    """Generates projects as whole NumPy arrays; the same seed gives the same frame.
+
+    `seed` may be an int or a sequence of ints (e.g. `[seed, chunk_index]`),
+    and `start_id` offsets the ProjectIDs so chunks cover disjoint ranges.
+    """
+    rng = np.random.default_rng(seed)
+    if name_pool is None:
+        name_pool = build_property_name_pool(int(rng.integers(2**32)))
+
+    ids = np.arange(start_id, start_id + num_rows)
+    project_ids = [f"CAP-{i:03d}" for i in ids]
+    property_names = name_pool[rng.integers(0, len(name_pool), num_rows)]
+    cities = np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), num_rows)]
+    project_types = np.array(PROJECT_TYPES, dtype=object)[rng.integers(0, len(PROJECT_TYPES), num_rows)]
+    statuses = np.array(PROJECT_STATUSES, dtype=object)[rng.integers(0, len(PROJECT_STATUSES), num_rows)]
+    vendors = np.array(VENDORS, dtype=object)[rng.integers(0, len(VENDORS), num_rows)]
+
+    # Dates are drawn as day offsets and kept as datetime64[D] throughout
+    span_days = (START_DATE_MAX - START_DATE_MIN).days
+    start_dates = np.datetime64(START_DATE_MIN.date()) + rng.integers(0, span_days + 1, num_rows).astype('timedelta64[D]')
+    planned_end_dates = start_dates + rng.integers(60, 366, num_rows).astype('timedelta64[D]')
+
+    budgets = rng.integers(50000, 5000001, num_rows)
+
+    # --- "Completed" projects, with Apex Construction skewed late and over budget ---
+    is_completed = statuses == "Completed"
+    is_apex = vendors == "Apex Construction"
+    schedule_variance_days = np.where(is_apex, rng.integers(30, 121, num_rows), rng.integers(-15, 91, num_rows))
+    actual_end_dates = np.where(is_completed, planned_end_dates + schedule_variance_days.astype('timedelta64[D]'), np.datetime64('NaT'))
+
+    cost_variance_multiplier = np.where(is_apex, rng.uniform(0.10, 0.25, num_rows), rng.uniform(-0.05, 0.20, num_rows))
+    actual_costs = np.where(is_completed, budgets * (1 + cost_variance_multiplier), np.nan)
+
+    # --- "Suite Renovation" rents ---
+    is_suite_reno = project_types == "Suite Renovation"
+    pre_reno_rents = np.where(is_suite_reno, rng.integers(1800, 2501, num_rows), np.nan)
+    post_reno_rents = np.where(is_suite_reno & is_completed, pre_reno_rents * rng.uniform(1.15, 1.30, num_rows), np.nan)
+
+    # --- ESG Initiatives (25% chance) ---
+    esg_choices = np.array(ESG_INITIATIVES, dtype=object)[rng.integers(0, len(ESG_INITIATIVES), num_rows)]
+    esg_initiatives = np.where(rng.random(num_rows) < 0.25, esg_choices, None)
+
+    return pd.DataFrame({
+        "ProjectID": project_ids,
+        "PropertyName": property_names,
+        "City": cities,
+        "ProjectType": project_types,
+        "ProjectStatus": statuses,
+        "StartDate": start_dates,
+        "PlannedEndDate": planned_end_dates,
+        "ActualEndDate": actual_end_dates,
+        "Budget": budgets,
+        "ActualCost": actual_costs,
+        "Vendor": vendors,
+        "ESG_Initiative": esg_initiatives,
+        "PreReno_Rent": pre_reno_rents,
+        "PostReno_Rent": post_reno_rents,
+    }, columns=COLUMNS)
+
+# --- 3. Streaming and Sharded Output ---
+def write_chunks(path, num_rows, seed, chunk_indices, chunk_size=CHUNK_SIZE, name_pool=None):
+    """Streams the given chunks to `path`, holding at most one chunk in memory.
+
+    Each chunk is seeded with `[seed, chunk_index]` and owns the ProjectIDs
+    `chunk_index * chunk_size + 1 ...`, so the output only depends on the seed
+    and chunk size, not on how chunks are spread across workers.
+    """
+    if num_rows < 1:
+        # No chunk means no header either, and the ETL cannot load a headerless CSV
+        raise ValueError("num_rows must be at least 1.")
+    if name_pool is None:
+        name_pool = build_property_name_pool(seed)
+
+    rows_written = 0
+    with open(path, "w", newline="") as f:
+        for position, chunk_index in enumerate(chunk_indices):
+            start = chunk_index * chunk_size
+            chunk_rows = min(chunk_size, num_rows - start)
+            df = generate_vectorized(chunk_rows, [seed, chunk_index], name_pool, start_id=start + 1)
+            df.to_csv(f, header=(position == 0), index=False, date_format='%Y-%m-%d')
+            rows_written += chunk_rows
+    return rows_written
+
+
+def _write_shard(task):
+    """Process-pool entry point: writes one shard covering a contiguous run of chunks."""
+    path, num_rows, seed, chunk_indices, chunk_size = task
+    return write_chunks(path, num_rows, seed, chunk_indices, chunk_size)
+
+
+def shard_path(output_path, shard_index):
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}.part-{shard_index:03d}{ext}"
+
+
+def generate_sharded(output_path, num_rows, seed, workers, chunk_size=CHUNK_SIZE, keep_shards=False):
+    """Generates disjoint ProjectID ranges in a process pool, one shard file per worker.
+
+    Shards are merged into `output_path` in ProjectID order unless
+    `keep_shards` is set. Returns the list of files written.
+    """
+    if num_rows < 1:
+        raise ValueError("num_rows must be at least 1.")
+    num_chunks = -(-num_rows // chunk_size)
+    chunk_groups = [list(group) for group in np.array_split(np.arange(num_chunks), max(1, workers)) if len(group)]
+    tasks = [(shard_path(output_path, i), num_rows, seed, [int(c) for c in group], chunk_size)
+             for i, group in enumerate(chunk_groups)]
+
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        list(executor.map(_write_shard, tasks))
+
+    shard_files = [task[0] for task in tasks]
+    if keep_shards:
+        return shard_files
+
+    # Concatenate shards, keeping only the first header
+    with open(output_path, "wb") as out:
+        for i, shard_file in enumerate(shard_files):
+            with open(shard_file, "rb") as shard:
+                if i > 0:
+                    shard.readline()
+                shutil.copyfileobj(shard, out)
+            os.remove(shard_file)
+    return [output_path]
+
+# --- 4. Command Line Interface ---
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate mock capital expenditure projects.")
+    parser.add_argument("--rows", type=int, default=NUM_ROWS, help="Number of projects to generate.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible output.")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Use the NumPy-vectorized generator (recommended for large row counts).")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Rows generated and written per chunk in vectorized mode.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes generating shards in vectorized mode.")
+    parser.add_argument("--keep-shards", action="store_true",
+                        help="Leave one CSV per worker instead of merging them into --output.")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Path of the CSV file to write.")
+    args = parser.parse_args()
+    for option in ("rows", "chunk_size", "workers"):
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1.")
+    return args
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.vectorized or args.workers > 1:
+        seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % (2**32))
+        if args.workers > 1:
+            written = generate_sharded(args.output, args.rows, seed, args.workers,
+                                       chunk_size=args.chunk_size, keep_shards=args.keep_shards)
+        else:
+            num_chunks = -(-args.rows // args.chunk_size)
+            write_chunks(args.output, args.rows, seed, range(num_chunks), chunk_size=args.chunk_size)
+            written = [args.output]
+        print(f"Successfully generated {args.rows} rows of mock data (seed {seed}) and saved to {', '.join(repr(p) for p in written)}.")
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+            Faker.seed(args.seed)
+        df = generate_rows(args.rows)
+
+        # --- Save to CSV ---
+        df.to_csv(args.output, index=False, date_format='%Y-%m-%d')
 
-print(f"Successfully generated {NUM_ROWS} rows of mock data and saved to '{output_path}'.")
+        print(f"Successfully generated {args.rows} rows of mock data and saved to '{args.output}'.")
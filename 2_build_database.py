@@ -1,17 +1,24 @@
 import pandas as pd
 import sqlite3
 import pandera as pa
-from pandera.errors import SchemaError
+from pandera.errors import SchemaError, SchemaErrors
 import sys
+import argparse
+
+from rollups import create_rollup_schema, refresh_rollups
+from vendor_stats import create_vendor_stats_schema, refresh_vendor_stats
+from db_version import bump_db_version
+from db_pool import enable_wal
 
 # --- Configuration ---
 CSV_FILE_PATH = 'mock_capex_data.csv'
 DB_FILE_PATH = 'lighthouse.db'
+DEFAULT_CHUNK_SIZE = 100_000
 
 # --- 1. Data Validation Schema ---
 # Define the validation schema for the raw input data
 raw_data_schema = pa.DataFrameSchema({
-    "ProjectID": pa.Column(str, pa.Check.str_matches(r'^CAP-\d{3}$'), unique=True, required=True),
+    "ProjectID": pa.Column(str, pa.Check.str_matches(r'^CAP-\d{3,}$'), unique=True, required=True),
     "PropertyName": pa.Column(str, required=True),
     "City": pa.Column(str, pa.Check.isin(["Toronto", "Vancouver", "Calgary", "Montreal", "Ottawa", "Halifax"])),
     "ProjectType": pa.Column(str, pa.Check.isin(["Suite Renovation", "Lobby Upgrade", "HVAC Replacement", "Roof Repair", "Window Replacement", "Parking Garage Repair"])),
@@ -28,46 +35,106 @@ raw_data_schema = pa.DataFrameSchema({
 })
 
 # --- 2. Database Schema Definition ---
-def create_database_schema(conn):
-    # ... (same as before)
+def create_database_schema(conn, drop_existing=True):
+    """Creates the normalized schema, dropping existing tables unless `drop_existing` is False.
+
+    Statements run one at a time (not as a script, which commits first), so
+    a caller can make the schema part of the same transaction as the load.
+    """
     print("Creating database schema...")
     cursor = conn.cursor()
-    cursor.executescript('''
-        DROP TABLE IF EXISTS projects;
-        DROP TABLE IF EXISTS vendors;
-        DROP TABLE IF EXISTS properties;
-    ''')
-    cursor.executescript('''
-        CREATE TABLE vendors ( VendorID INTEGER PRIMARY KEY AUTOINCREMENT, VendorName TEXT NOT NULL UNIQUE );
-        CREATE TABLE properties ( PropertyID INTEGER PRIMARY KEY AUTOINCREMENT, PropertyName TEXT NOT NULL, City TEXT NOT NULL, UNIQUE(PropertyName, City) );
-        CREATE TABLE projects ( ProjectID TEXT PRIMARY KEY, PropertyID INTEGER, VendorID INTEGER, ProjectType TEXT, ProjectStatus TEXT, StartDate TEXT, PlannedEndDate TEXT, ActualEndDate TEXT, Budget REAL, ActualCost REAL, ESG_Initiative TEXT, PreReno_Rent REAL, PostReno_Rent REAL, ScheduleVariance_Days INTEGER, BudgetVariance_CAD REAL, ReturnOnCost_Percent REAL, RiskScore REAL, PredictedRisk TEXT, PrimaryRiskFactor TEXT, PredictedCost REAL, PredictedDuration_Days INTEGER, FOREIGN KEY (PropertyID) REFERENCES properties (PropertyID), FOREIGN KEY (VendorID) REFERENCES vendors (VendorID) );
-    ''')
+    if drop_existing:
+        for table in ('projects', 'vendors', 'properties'):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    for ddl in [
+        "CREATE TABLE IF NOT EXISTS vendors ( VendorID INTEGER PRIMARY KEY AUTOINCREMENT, VendorName TEXT NOT NULL UNIQUE )",
+        "CREATE TABLE IF NOT EXISTS properties ( PropertyID INTEGER PRIMARY KEY AUTOINCREMENT, PropertyName TEXT NOT NULL, City TEXT NOT NULL, UNIQUE(PropertyName, City) )",
+        "CREATE TABLE IF NOT EXISTS projects ( ProjectID TEXT PRIMARY KEY, PropertyID INTEGER, VendorID INTEGER, ProjectType TEXT, ProjectStatus TEXT, StartDate TEXT, PlannedEndDate TEXT, ActualEndDate TEXT, Budget REAL, ActualCost REAL, ESG_Initiative TEXT, PreReno_Rent REAL, PostReno_Rent REAL, ScheduleVariance_Days INTEGER, BudgetVariance_CAD REAL, ReturnOnCost_Percent REAL, RiskScore REAL, PredictedRisk TEXT, PrimaryRiskFactor TEXT, PredictedCost REAL, PredictedDuration_Days INTEGER, RowHash TEXT, NeedsScoring INTEGER NOT NULL DEFAULT 1, FOREIGN KEY (PropertyID) REFERENCES properties (PropertyID), FOREIGN KEY (VendorID) REFERENCES vendors (VendorID) )",
+    ]:
+        cursor.execute(ddl)
+
+    # Databases built before incremental loads existed lack the change-tracking columns
+    for column_ddl in ["RowHash TEXT", "NeedsScoring INTEGER NOT NULL DEFAULT 1"]:
+        try:
+            cursor.execute(f"ALTER TABLE projects ADD COLUMN {column_ddl}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
     print("Schema created successfully.")
 
+# Secondary indexes, designed around the filters and joins of the shipped queries
+# (see check_query_plans.py). They are created after the bulk load.
+INDEX_DEFINITIONS = [
+    # /api/projects filters; the trailing columns let combined filters use one index
+    "CREATE INDEX IF NOT EXISTS idx_projects_status_type ON projects (ProjectStatus, ProjectType)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_type ON projects (ProjectType)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_risk_status ON projects (PredictedRisk, ProjectStatus)",
+    # City filters resolve properties first, then join into projects by PropertyID
+    "CREATE INDEX IF NOT EXISTS idx_properties_city ON properties (City, PropertyID)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_property ON projects (PropertyID)",
+    # Date windows of /api/contractors/performance, which the rollups cannot answer
+    "CREATE INDEX IF NOT EXISTS idx_projects_start_date ON projects (StartDate)",
+    # Recomputing one vendor/month bucket of vendor_stats.py is a range search
+    "CREATE INDEX IF NOT EXISTS idx_projects_vendor_end ON projects (VendorID, ActualEndDate)",
+    # Keyset pagination over the dashboard's default Budget sort
+    "CREATE INDEX IF NOT EXISTS idx_projects_budget ON projects (Budget, ProjectID)",
+    # Covering index for per-vendor cost/schedule aggregates over a status
+    "CREATE INDEX IF NOT EXISTS idx_projects_status_vendor_cost ON projects (ProjectStatus, VendorID, Budget, ActualCost, BudgetVariance_CAD, ScheduleVariance_Days)",
+]
+
+
+def create_indexes(conn):
+    """Creates the secondary indexes and refreshes the planner statistics."""
+    print("Creating indexes and analyzing tables...")
+    cursor = conn.cursor()
+    for ddl in INDEX_DEFINITIONS:
+        cursor.execute(ddl)
+    cursor.execute("ANALYZE")
+    conn.commit()
+    print(f"{len(INDEX_DEFINITIONS)} indexes ready.")
+
 # --- 3. ETL and Data Loading ---
-def run_etl(conn):
-    """Runs the full ETL process from CSV to normalized SQLite database."""
-    print("Starting ETL process...")
-    
-    # --- EXTRACT ---
-    print(f"Reading data from {CSV_FILE_PATH}...")
-    df = pd.read_csv(CSV_FILE_PATH)
+PROJECT_COLUMNS = [
+    'ProjectID', 'PropertyID', 'VendorID', 'ProjectType', 'ProjectStatus',
+    'StartDate', 'PlannedEndDate', 'ActualEndDate', 'Budget', 'ActualCost',
+    'ESG_Initiative', 'PreReno_Rent', 'PostReno_Rent', 'ScheduleVariance_Days',
+    'BudgetVariance_CAD', 'ReturnOnCost_Percent', 'RowHash'
+]
+RAW_COLUMNS = [
+    'ProjectID', 'PropertyName', 'City', 'ProjectType', 'ProjectStatus',
+    'StartDate', 'PlannedEndDate', 'ActualEndDate', 'Budget', 'ActualCost',
+    'Vendor', 'ESG_Initiative', 'PreReno_Rent', 'PostReno_Rent'
+]
+DATE_COLUMNS = ['StartDate', 'PlannedEndDate', 'ActualEndDate']
+# Explicit dtypes keep sparse columns (e.g. ESG_Initiative) typed even when a chunk is all-null
+RAW_DTYPES = {
+    'ProjectID': str, 'PropertyName': str, 'City': str, 'ProjectType': str, 'ProjectStatus': str,
+    'Vendor': str, 'ESG_Initiative': str, 'ActualCost': float, 'PreReno_Rent': float, 'PostReno_Rent': float,
+}
 
-    # --- VALIDATE ---
-    print("Validating raw data...")
+
+def validate_raw_data(df):
+    """Parses date columns and validates a raw frame, exiting on failure."""
     # First, convert date columns so pandera can validate them as datetimes
-    for col in ['StartDate', 'PlannedEndDate', 'ActualEndDate']:
+    for col in DATE_COLUMNS:
         df[col] = pd.to_datetime(df[col], errors='coerce')
     try:
         raw_data_schema.validate(df, lazy=True)
-        print("Raw data validation successful.")
-    except SchemaError as err:
+    except (SchemaError, SchemaErrors) as err:
         print("Raw data validation failed!")
         print(err.failure_cases)
         sys.exit(1) # Exit if data is invalid
+    return df
 
-    # --- TRANSFORM ---
-    print("Transforming data and engineering features...")
+
+def add_row_hash(df):
+    """Adds a content hash of the (rounded) source columns, used to detect changed projects."""
+    hashes = pd.util.hash_pandas_object(df[RAW_COLUMNS], index=False)
+    df['RowHash'] = [f"{h:016x}" for h in hashes]
+    return df
+
+
+def engineer_features(df):
+    """Adds ScheduleVariance_Days, BudgetVariance_CAD and ReturnOnCost_Percent."""
     df['ScheduleVariance_Days'] = (df['ActualEndDate'] - df['PlannedEndDate']).dt.days
     df['BudgetVariance_CAD'] = df['ActualCost'] - df['Budget']
     suite_reno_mask = (df['ProjectType'] == 'Suite Renovation') & (df['ProjectStatus'] == 'Completed')
@@ -78,6 +145,25 @@ def run_etl(conn):
     for col in ['ActualCost', 'BudgetVariance_CAD', 'PreReno_Rent', 'PostReno_Rent']:
         df[col] = df[col].round(2)
     df['ReturnOnCost_Percent'] = pd.to_numeric(df['ReturnOnCost_Percent']).round(2)
+    return df
+
+
+def run_etl(conn):
+    """Runs the full ETL process from CSV to normalized SQLite database."""
+    print("Starting ETL process...")
+    
+    # --- EXTRACT ---
+    print(f"Reading data from {CSV_FILE_PATH}...")
+    df = pd.read_csv(CSV_FILE_PATH, dtype=RAW_DTYPES)
+
+    # --- VALIDATE ---
+    print("Validating raw data...")
+    df = validate_raw_data(df)
+    print("Raw data validation successful.")
+
+    # --- TRANSFORM ---
+    print("Transforming data and engineering features...")
+    df = add_row_hash(engineer_features(df))
 
     # --- LOAD ---
     vendors_df = pd.DataFrame(df['Vendor'].unique(), columns=['VendorName'])
@@ -94,22 +180,160 @@ def run_etl(conn):
     df = df.merge(vendors_map, on='Vendor')
     df = df.merge(properties_map, on=['PropertyName', 'City'])
 
-    projects_df = df[[
-        'ProjectID', 'PropertyID', 'VendorID', 'ProjectType', 'ProjectStatus',
-        'StartDate', 'PlannedEndDate', 'ActualEndDate', 'Budget', 'ActualCost',
-        'ESG_Initiative', 'PreReno_Rent', 'PostReno_Rent', 'ScheduleVariance_Days',
-        'BudgetVariance_CAD', 'ReturnOnCost_Percent'
-    ]]
+    projects_df = df[PROJECT_COLUMNS]
     
-    for col in ['StartDate', 'PlannedEndDate', 'ActualEndDate']:
+    for col in DATE_COLUMNS:
         projects_df[col] = projects_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
 
     projects_df.to_sql('projects', conn, if_exists='append', index=False)
     print(f"Loaded {len(projects_df)} projects.")
 
+# --- 4. Chunked ETL ---
+def load_key_maps(conn):
+    """Reads the existing vendor and property surrogate keys into dictionaries."""
+    vendor_ids = dict(conn.execute('SELECT VendorName, VendorID FROM vendors').fetchall())
+    property_ids = {(name, city): pid for pid, name, city in
+                    conn.execute('SELECT PropertyID, PropertyName, City FROM properties')}
+    return vendor_ids, property_ids
+
+
+def resolve_keys(cursor, df, vendor_ids, property_ids):
+    """Adds VendorID/PropertyID to a chunk, inserting and caching keys not seen before."""
+    for vendor in df['Vendor'].unique():
+        if vendor not in vendor_ids:
+            cursor.execute('INSERT INTO vendors (VendorName) VALUES (?)', (vendor,))
+            vendor_ids[vendor] = cursor.lastrowid
+
+    for key in df[['PropertyName', 'City']].drop_duplicates().itertuples(index=False, name=None):
+        if key not in property_ids:
+            cursor.execute('INSERT INTO properties (PropertyName, City) VALUES (?, ?)', key)
+            property_ids[key] = cursor.lastrowid
+
+    df['VendorID'] = df['Vendor'].map(vendor_ids)
+    df['PropertyID'] = [property_ids[key] for key in zip(df['PropertyName'], df['City'])]
+    return df
+
+
+def project_rows(df):
+    """Yields projects rows as plain tuples with NULLs in place of NaN/NaT."""
+    projects_df = df[PROJECT_COLUMNS].copy()
+    for col in DATE_COLUMNS:
+        projects_df[col] = projects_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+    projects_df = projects_df.astype(object).where(projects_df.notna(), None)
+    return projects_df.itertuples(index=False, name=None)
+
+
+def build_insert_sql(incremental=False):
+    """Builds the projects INSERT, or an upsert that only rewrites rows whose RowHash changed.
+
+    The upsert leaves the prediction columns untouched and flags updated rows
+    with NeedsScoring = 1 so the prediction script can rescore just those.
+    """
+    columns = ', '.join(PROJECT_COLUMNS)
+    placeholders = ', '.join('?' * len(PROJECT_COLUMNS))
+    sql = f"INSERT INTO projects ({columns}) VALUES ({placeholders})"
+    if incremental:
+        assignments = ', '.join(f"{col} = excluded.{col}" for col in PROJECT_COLUMNS if col != 'ProjectID')
+        sql += (f" ON CONFLICT(ProjectID) DO UPDATE SET {assignments}, NeedsScoring = 1"
+                f" WHERE projects.RowHash IS NOT excluded.RowHash")
+    return sql
+
+
+def run_etl_chunked(conn, chunk_size, incremental=False):
+    """Streams the CSV through validate/transform/load one chunk at a time.
+
+    Only the current chunk and the vendor/property key dictionaries are held
+    in memory, so peak RSS does not grow with the size of the input file.
+    ProjectID uniqueness across chunks is enforced by the primary key. With
+    `incremental`, existing projects are upserted, unchanged rows are no-ops
+    and projects no longer in the file are deleted; otherwise the tables are
+    dropped and recreated first. The IDs loaded so far are kept in a temp
+    table, so a ProjectID repeated in a later chunk is reported in either mode.
+
+    The whole load, including the drop, is one transaction: a chunk that
+    fails validation or repeats a ProjectID leaves the database as it was.
+    """
+    mode = "incremental" if incremental else "chunked"
+    print(f"Starting {mode} ETL process ({chunk_size:,} rows per chunk)...")
+    insert_sql = build_insert_sql(incremental)
+
+    total_rows = 0
+    projects_written = 0
+    conn.execute("BEGIN")
+    with conn:
+        if not incremental:
+            create_database_schema(conn)
+        vendor_ids, property_ids = load_key_maps(conn)
+        existing_projects = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+        conn.execute("DROP TABLE IF EXISTS temp.loaded_ids")
+        conn.execute("DROP TABLE IF EXISTS temp.chunk_ids")
+        conn.execute("CREATE TEMP TABLE loaded_ids (ProjectID TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute("CREATE TEMP TABLE chunk_ids (ProjectID TEXT PRIMARY KEY) WITHOUT ROWID")
+        for chunk_number, df in enumerate(pd.read_csv(CSV_FILE_PATH, dtype=RAW_DTYPES, chunksize=chunk_size), start=1):
+            df = add_row_hash(engineer_features(validate_raw_data(df)))
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM temp.chunk_ids")
+            cursor.executemany("INSERT INTO temp.chunk_ids VALUES (?)", ((pid,) for pid in df['ProjectID']))
+            repeated = [row[0] for row in cursor.execute(
+                "SELECT ProjectID FROM temp.chunk_ids JOIN temp.loaded_ids USING (ProjectID) LIMIT 5")]
+            if repeated:
+                print(f"Raw data validation failed! Chunk {chunk_number} repeats ProjectIDs from an earlier chunk "
+                      f"(e.g. {', '.join(repeated)}); ProjectIDs must be unique across the file.")
+                sys.exit(1)  # Leaving the transaction on SystemExit rolls the whole load back
+            cursor.execute("INSERT INTO temp.loaded_ids SELECT ProjectID FROM temp.chunk_ids")
+            df = resolve_keys(cursor, df, vendor_ids, property_ids)
+            cursor.executemany(insert_sql, project_rows(df))
+            # Upserts whose WHERE clause skips an unchanged row do not count as changes,
+            # and rowcount (unlike total_changes) leaves out rows written by triggers
+            projects_written += cursor.rowcount
+            total_rows += len(df)
+            print(f"Loaded chunk {chunk_number} ({total_rows:,} projects so far).")
+
+        if incremental:
+            new_projects = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0] - existing_projects
+            # Projects dropped from the source go too; the delete triggers mark their rollup groups dirty
+            removed_projects = conn.execute(
+                "DELETE FROM projects WHERE ProjectID NOT IN (SELECT ProjectID FROM temp.loaded_ids)").rowcount
+        conn.execute("DROP TABLE temp.loaded_ids")
+        conn.execute("DROP TABLE temp.chunk_ids")
+
+    print(f"Loaded {len(vendor_ids)} unique vendors, {len(property_ids)} unique properties and {total_rows:,} projects.")
+    if incremental:
+        changed_projects = projects_written - new_projects
+        print(f"Incremental load: {new_projects:,} new, {changed_projects:,} changed, "
+              f"{total_rows - projects_written:,} unchanged, {removed_projects:,} removed projects.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the normalized Lighthouse database from the raw CSV.")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Stream the CSV in chunks of this many rows instead of loading it all at once.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep existing tables, upsert new or changed projects and delete removed ones, preserving predictions.")
+    return parser.parse_args()
+
 # --- Main Execution ---
 if __name__ == "__main__":
+    args = parse_args()
     with sqlite3.connect(DB_FILE_PATH) as conn:
-        create_database_schema(conn)
-        run_etl(conn)
-    print("Database build process completed successfully.")
\ No newline at end of file
+        enable_wal(conn)
+        if args.incremental:
+            create_database_schema(conn, drop_existing=False)
+            # Triggers must exist before the upserts so changed groups are recorded
+            create_rollup_schema(conn)
+            create_vendor_stats_schema(conn)
+            run_etl_chunked(conn, args.chunk_size or DEFAULT_CHUNK_SIZE, incremental=True)
+        elif args.chunk_size:
+            # Drops and recreates the tables inside its load transaction
+            run_etl_chunked(conn, args.chunk_size)
+        else:
+            create_database_schema(conn)
+            run_etl(conn)
+        create_indexes(conn)
+        # A full load rebuilds every group; an incremental one refreshes only the changed ones
+        create_rollup_schema(conn)
+        refresh_rollups(conn, full=not args.incremental)
+        create_vendor_stats_schema(conn)
+        refresh_vendor_stats(conn, full=not args.incremental)
+        bump_db_version(conn)
+    print("Database build process completed successfully.")
@@ -1,6 +1,5 @@
 import pandas as pd
 import sqlite3
-import shap
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -8,27 +7,40 @@ from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.metrics import mean_absolute_error, r2_score
 import numpy as np
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+from model_registry import compute_training_data_hash, save_models, load_models, latest_metadata
+from prediction_service import risk_level, at_risk_probability
+from risk_explanations import update_primary_risk_factors, EXPLAIN_WORKERS
+from rollups import create_rollup_schema, refresh_rollups
+from db_version import bump_db_version
+from db_pool import enable_wal
+
 # --- Configuration ---
 DB_FILE_PATH = 'lighthouse.db'
 
+PROJECTS_QUERY = '''
+    SELECT p.ProjectID, p.ProjectType, p.ProjectStatus, p.Budget, 
+           p.ActualCost, p.StartDate, p.PlannedEndDate, p.ActualEndDate,
+           p.ScheduleVariance_Days, p.BudgetVariance_CAD, p.NeedsScoring, p.RowHash,
+           prop.City, v.VendorName as Vendor
+    FROM projects p
+    JOIN properties prop ON p.PropertyID = prop.PropertyID
+    JOIN vendors v ON p.VendorID = v.VendorID
+'''
+
 # --- 1. Load Data from Database ---
 
 
 def load_data_from_db(db_path):
     print("Loading data from normalized database...")
     with sqlite3.connect(db_path) as conn:
-        query = '''
-            SELECT p.ProjectID, p.ProjectType, p.ProjectStatus, p.Budget, 
-                   p.ActualCost, p.StartDate, p.PlannedEndDate, p.ActualEndDate,
-                   p.ScheduleVariance_Days, p.BudgetVariance_CAD,
-                   prop.City, v.VendorName as Vendor
-            FROM projects p
-            JOIN properties prop ON p.PropertyID = prop.PropertyID
-            JOIN vendors v ON p.VendorID = v.VendorID
-        '''
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(PROJECTS_QUERY, conn)
         # Convert data types for modeling
         df['ScheduleVariance_Days'] = pd.to_numeric(
             df['ScheduleVariance_Days'])
@@ -58,171 +70,188 @@ def load_data_from_db(db_path):
 
         return df
 
-# --- 2. Train Risk Classification Model ---
-
-
-def train_risk_model(df):
-    print("Training project risk model with RandomForestClassifier...")
-    train_df = df[df['ProjectStatus'] == 'Completed'].copy()
-    train_df['IsAtRisk'] = ((train_df['ScheduleVariance_Days'] > 15) | (
-        train_df['BudgetVariance_CAD'] > 0)).astype(int)
-    train_df.dropna(subset=['ProjectType', 'Vendor',
-                    'Budget', 'City', 'IsAtRisk'], inplace=True)
+# --- 2. Shared Feature Matrix ---
+# All three models share one encoding of the project features. Risk and cost
+# models ignore PlannedDuration_Days, which only the duration model uses.
+FEATURES = ['ProjectType', 'Vendor', 'Budget', 'City', 'PlannedDuration_Days']
+CATEGORICAL_FEATURES = ['ProjectType', 'Vendor', 'City']
+NUMERIC_FEATURES = ['Budget', 'PlannedDuration_Days']
+BASE_FEATURES = ['ProjectType', 'Vendor', 'Budget', 'City']
 
-    if len(train_df) < 10:
-        return None
 
-    features = ['ProjectType', 'Vendor', 'Budget', 'City']
-    X = train_df[features]
-    y = train_df['IsAtRisk']
+@contextmanager
+def stage_timer(stage, timings):
+    """Records the wall time of a pipeline stage in `timings` and prints it."""
+    started = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - started
+    print(f"[timing] {stage}: {timings[stage]:.2f}s")
 
-    categorical_features = ['ProjectType', 'Vendor', 'City']
-    numeric_features = ['Budget']
 
-    numeric_transformer = Pipeline(
-        steps=[('imputer', SimpleImputer(strategy='median'))])
-    categorical_transformer = Pipeline(
-        steps=[('onehot', OneHotEncoder(handle_unknown='ignore'))])
+def build_feature_matrix(train_df):
+    """Fits the shared preprocessor once and returns it with the encoded training matrix.
 
+    Categoricals are one-hot encoded as uint8 and the matrix is stored as
+    float32, the dtype the forests train on, so no model copies it again.
+    """
     preprocessor = ColumnTransformer(
         transformers=[
-            ('num', numeric_transformer, numeric_features),
-            ('cat', categorical_transformer, categorical_features)
-        ])
-
-    model_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('classifier', RandomForestClassifier(
-            n_estimators=100, random_state=42, class_weight='balanced'))
-    ])
-
-    model_pipeline.fit(X, y)
-    print("Risk model training complete.")
-    return model_pipeline, features
-
-# --- 3. Train Cost Prediction Model ---
-
-
-def train_cost_model(df):
-    print("Training cost prediction model with RandomForestRegressor...")
-    train_df = df[df['ProjectStatus'] == 'Completed'].copy()
-    train_df.dropna(subset=['ProjectType', 'Vendor',
-                    'Budget', 'City', 'ActualCost'], inplace=True)
-
-    if len(train_df) < 10:
-        print("Not enough data for cost model training.")
-        return None
-
-    features = ['ProjectType', 'Vendor', 'Budget', 'City']
-    X = train_df[features]
-    y = train_df['ActualCost']
+            ('num', SimpleImputer(strategy='median'), NUMERIC_FEATURES),
+            ('cat', OneHotEncoder(handle_unknown='ignore', dtype=np.uint8), CATEGORICAL_FEATURES)
+        ],
+        sparse_threshold=0)
+    X = preprocessor.fit_transform(train_df[FEATURES]).astype(np.float32)
+    return preprocessor, X
 
-    categorical_features = ['ProjectType', 'Vendor', 'City']
-    numeric_features = ['Budget']
 
-    numeric_transformer = Pipeline(
-        steps=[('imputer', SimpleImputer(strategy='median'))])
-    categorical_transformer = Pipeline(
-        steps=[('onehot', OneHotEncoder(handle_unknown='ignore'))])
+def feature_columns(preprocessor, features):
+    """Indices of the encoded matrix columns derived from the given source features."""
+    names = preprocessor.get_feature_names_out()
+    return [i for i, name in enumerate(names)
+            if any(name.startswith(f"num__{f}") or name.startswith(f"cat__{f}_") for f in features)]
 
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', numeric_transformer, numeric_features),
-            ('cat', categorical_transformer, categorical_features)
-        ])
 
-    model_pipeline = Pipeline(steps=[
+def assemble_pipeline(preprocessor, X, columns, step_name, estimator):
+    """Wraps a forest fitted on the shared matrix into a predict-ready Pipeline."""
+    selector = ColumnTransformer([('select', 'passthrough', columns)]).fit(X)
+    return Pipeline(steps=[
         ('preprocessor', preprocessor),
-        ('regressor', RandomForestRegressor(n_estimators=100, random_state=42))
+        ('selector', selector),
+        (step_name, estimator)
     ])
 
-    model_pipeline.fit(X, y)
-
-    # Evaluate model performance
-    y_pred = model_pipeline.predict(X)
-    mae = mean_absolute_error(y, y_pred)
-    r2 = r2_score(y, y_pred)
-    print(f"Cost model training complete. MAE: ${mae:,.2f}, R²: {r2:.3f}")
-
-    return model_pipeline, features
-
-# --- 4. Train Duration Prediction Model ---
-
-
-def train_duration_model(df):
-    print("Training duration prediction model with RandomForestRegressor...")
-    train_df = df[df['ProjectStatus'] == 'Completed'].copy()
-    train_df.dropna(subset=['ProjectType', 'Vendor', 'Budget', 'City',
-                    'ActualDuration_Days', 'PlannedDuration_Days'], inplace=True)
-
+# --- 3. Train Risk, Cost and Duration Models ---
+# Each trainer fits one forest on the shared matrix and returns
+# (pipeline, features), or (None, None) when it has too little data.
+
+
+def train_risk_model(train_df, preprocessor, X, columns, n_jobs, metrics, timings):
+    with stage_timer('train risk model', timings):
+        print("Training project risk model with RandomForestClassifier...")
+        y = ((train_df['ScheduleVariance_Days'] > 15) | (
+            train_df['BudgetVariance_CAD'] > 0)).astype(int).to_numpy()
+        classifier = RandomForestClassifier(
+            n_estimators=100, random_state=42, class_weight='balanced', n_jobs=n_jobs)
+        classifier.fit(X[:, columns], y)
+        metrics['risk'] = {'at_risk_rate': float(y.mean()), 'rows': int(len(y))}
+        print("Risk model training complete.")
+        return assemble_pipeline(preprocessor, X, columns, 'classifier', classifier), FEATURES
+
+
+def train_cost_model(train_df, preprocessor, X, columns, n_jobs, metrics, timings):
+    with stage_timer('train cost model', timings):
+        print("Training cost prediction model with RandomForestRegressor...")
+        mask = train_df['ActualCost'].notna().to_numpy()
+        if mask.sum() < 10:
+            print("Not enough data for cost model training.")
+            return None, None
+        X_cost, y = X[mask][:, columns], train_df.loc[mask, 'ActualCost'].to_numpy()
+        regressor = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        regressor.fit(X_cost, y)
+
+        # Evaluate model performance
+        y_pred = regressor.predict(X_cost)
+        mae = mean_absolute_error(y, y_pred)
+        r2 = r2_score(y, y_pred)
+        print(f"Cost model training complete. MAE: ${mae:,.2f}, R²: {r2:.3f}")
+        metrics['cost'] = {'mae': float(mae), 'r2': float(r2), 'rows': int(mask.sum())}
+        return assemble_pipeline(preprocessor, X, columns, 'regressor', regressor), FEATURES
+
+
+def train_duration_model(train_df, preprocessor, X, columns, n_jobs, metrics, timings):
+    with stage_timer('train duration model', timings):
+        print("Training duration prediction model with RandomForestRegressor...")
+        mask = (train_df['ActualDuration_Days'].notna() & train_df['PlannedDuration_Days'].notna()).to_numpy()
+        if mask.sum() < 10:
+            print("Not enough data for duration model training.")
+            return None, None
+        X_duration, y = X[mask], train_df.loc[mask, 'ActualDuration_Days'].to_numpy()
+        regressor = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        regressor.fit(X_duration, y)
+
+        # Evaluate model performance
+        y_pred = regressor.predict(X_duration)
+        mae = mean_absolute_error(y, y_pred)
+        r2 = r2_score(y, y_pred)
+        print(
+            f"Duration model training complete. MAE: {mae:.1f} days, R²: {r2:.3f}")
+        metrics['duration'] = {'mae': float(mae), 'r2': float(r2), 'rows': int(mask.sum())}
+        return assemble_pipeline(preprocessor, X, columns, 'regressor', regressor), FEATURES
+
+
+def train_models(df, timings, n_jobs=-1, metrics=None, parallel=False):
+    """Trains the risk, cost and duration forests from one shared feature matrix.
+
+    Returns a dict mapping 'risk', 'cost' and 'duration' to (pipeline, features),
+    or (None, None) when there is not enough completed-project data. Training
+    metrics are recorded in `metrics` when a dict is passed. With `parallel`,
+    the three forests train at the same time on threads sharing the matrix.
+    """
+    if metrics is None:
+        metrics = {}
+    models = {'risk': (None, None), 'cost': (None, None), 'duration': (None, None)}
+
+    train_df = df[df['ProjectStatus'] == 'Completed'].dropna(subset=BASE_FEATURES).copy()
     if len(train_df) < 10:
-        print("Not enough data for duration model training.")
-        return None
-
-    features = ['ProjectType', 'Vendor',
-                'Budget', 'City', 'PlannedDuration_Days']
-    X = train_df[features]
-    y = train_df['ActualDuration_Days']
-
-    categorical_features = ['ProjectType', 'Vendor', 'City']
-    numeric_features = ['Budget', 'PlannedDuration_Days']
-
-    numeric_transformer = Pipeline(
-        steps=[('imputer', SimpleImputer(strategy='median'))])
-    categorical_transformer = Pipeline(
-        steps=[('onehot', OneHotEncoder(handle_unknown='ignore'))])
-
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', numeric_transformer, numeric_features),
-            ('cat', categorical_transformer, categorical_features)
-        ])
-
-    model_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('regressor', RandomForestRegressor(n_estimators=100, random_state=42))
-    ])
-
-    model_pipeline.fit(X, y)
-
-    # Evaluate model performance
-    y_pred = model_pipeline.predict(X)
-    mae = mean_absolute_error(y, y_pred)
-    r2 = r2_score(y, y_pred)
-    print(
-        f"Duration model training complete. MAE: {mae:.1f} days, R²: {r2:.3f}")
-
-    return model_pipeline, features
-
-# --- 5. Make Predictions ---
-
-
-def make_predictions(df, risk_model, cost_model, duration_model, risk_features, cost_features, duration_features):
+        print("Not enough completed projects for model training.")
+        return models
+
+    with stage_timer('encode features', timings):
+        train_df['PlannedDuration_Days'] = pd.to_numeric(train_df['PlannedDuration_Days'])
+        train_df['ActualDuration_Days'] = pd.to_numeric(train_df['ActualDuration_Days'])
+        preprocessor, X = build_feature_matrix(train_df)
+        base_columns = feature_columns(preprocessor, BASE_FEATURES)
+        all_columns = list(range(X.shape[1]))
+        print(f"Encoded {X.shape[0]} completed projects into {X.shape[1]} features "
+              f"({X.nbytes / 1024:.0f} KiB).")
+
+    trainers = {
+        'risk': (train_risk_model, base_columns),
+        'cost': (train_cost_model, base_columns),
+        'duration': (train_duration_model, all_columns),
+    }
+    if not parallel:
+        for name, (trainer, columns) in trainers.items():
+            models[name] = trainer(train_df, preprocessor, X, columns, n_jobs, metrics, timings)
+        return models
+
+    # Forest fitting releases the GIL, so threads train side by side without
+    # copying the matrix. The cores are split between the forests rather than
+    # each one starting a thread per core, and the per-model timings overlap,
+    # so only the combined wall time goes into `timings`.
+    if n_jobs == -1:
+        n_jobs = max(1, (os.cpu_count() or 1) // len(trainers))
+    with stage_timer('train models (parallel)', timings):
+        with ThreadPoolExecutor(max_workers=len(trainers)) as executor:
+            futures = {name: executor.submit(trainer, train_df, preprocessor, X, columns, n_jobs, metrics, {})
+                       for name, (trainer, columns) in trainers.items()}
+            for name, future in futures.items():
+                models[name] = future.result()
+    return models
+
+# --- 4. Make Predictions ---
+
+
+def make_predictions(df, risk_model, cost_model, duration_model, risk_features, cost_features, duration_features, dirty_only=False):
     print("Making predictions for ongoing and future projects...")
     predict_df = df[df['ProjectStatus'].isin(
         ['In Progress', 'Not Started'])].copy()
+    if dirty_only:
+        # Only projects inserted or changed by an incremental ETL run
+        predict_df = predict_df[predict_df['NeedsScoring'] == 1]
     if predict_df.empty:
         print("No projects to predict.")
         return None
 
-    predictions = pd.DataFrame({'ProjectID': predict_df['ProjectID']})
+    # RowHash records which version of each project was scored
+    predictions = pd.DataFrame({'ProjectID': predict_df['ProjectID'], 'RowHash': predict_df['RowHash']})
 
     # Risk predictions
     if risk_model is not None:
         X_risk = predict_df[risk_features]
-        risk_scores = risk_model.predict_proba(X_risk)[:, 1]
-
-        def map_score_to_risk(score):
-            if score > 0.7:
-                return "High"
-            elif score > 0.4:
-                return "Medium"
-            else:
-                return "Low"
-
+        risk_scores = at_risk_probability(risk_model.predict_proba(X_risk), risk_model.classes_)
         predictions['RiskScore'] = risk_scores.round(4)
-        predictions['PredictedRisk'] = [
-            map_score_to_risk(s) for s in risk_scores]
+        predictions['PredictedRisk'] = risk_level(risk_scores)
 
     # Cost predictions
     if cost_model is not None:
@@ -240,16 +269,39 @@ def make_predictions(df, risk_model, cost_model, duration_model, risk_features,
     print(f"Generated predictions for {len(predictions)} projects.")
     return predictions
 
-# --- 6. Update Database ---
+# --- 5. Update Database ---
+
+
+PREDICTION_COLUMNS = {
+    'RiskScore': 'REAL',
+    'PredictedRisk': 'TEXT',
+    'PredictedCost': 'REAL',
+    'PredictedDuration_Days': 'INTEGER',
+}
 
 
-def update_database_with_predictions(db_path, predictions):
+def update_database_with_predictions(db_path, predictions, predictions_table=False, model_version=None):
+    """Bulk-writes predictions in one transaction.
+
+    Rows are staged into a temp table with `executemany` and applied with a
+    single set-based statement: an `UPDATE ... FROM` on `projects`, or, with
+    `predictions_table`, an upsert into `predictions` keyed by
+    (ProjectID, ModelVersion) so the wide projects table is left alone. The
+    scored projects' NeedsScoring flags are cleared in the same transaction.
+    """
     if predictions is None or predictions.empty:
         print("No predictions to update.")
         return
 
-    print(f"Updating {len(predictions)} projects in the database...")
+    columns = [col for col in PREDICTION_COLUMNS if col in predictions.columns]
+    staged = predictions[['ProjectID', 'RowHash'] + columns]
+    staged = staged.astype(object).where(staged.notna(), None)
+
+    target = f"predictions (model {model_version})" if predictions_table else "projects"
+    print(f"Writing {len(predictions)} predictions to {target}...")
     with sqlite3.connect(db_path) as conn:
+        # In WAL mode the API keeps reading the previous snapshot while this writes
+        enable_wal(conn)
         cursor = conn.cursor()
 
         # Add new columns if they don't exist
@@ -265,55 +317,141 @@ def update_database_with_predictions(db_path, predictions):
         except sqlite3.OperationalError:
             pass  # Column already exists
 
-        for _, row in predictions.iterrows():
-            update_query = "UPDATE projects SET "
-            update_values = []
-            params = []
-
-            if 'RiskScore' in row and pd.notna(row['RiskScore']):
-                update_values.append("RiskScore = ?")
-                params.append(row['RiskScore'])
-
-            if 'PredictedRisk' in row and pd.notna(row['PredictedRisk']):
-                update_values.append("PredictedRisk = ?")
-                params.append(row['PredictedRisk'])
-
-            if 'PredictedCost' in row and pd.notna(row['PredictedCost']):
-                update_values.append("PredictedCost = ?")
-                params.append(row['PredictedCost'])
-
-            if 'PredictedDuration_Days' in row and pd.notna(row['PredictedDuration_Days']):
-                update_values.append("PredictedDuration_Days = ?")
-                params.append(row['PredictedDuration_Days'])
-
-            if update_values:
-                update_query += ", ".join(update_values) + \
-                    " WHERE ProjectID = ?"
-                params.append(row['ProjectID'])
-                cursor.execute(update_query, params)
-
+        column_ddl = ", ".join(f"{col} {PREDICTION_COLUMNS[col]}" for col in columns)
+        cursor.execute("DROP TABLE IF EXISTS temp.staged_predictions")
+        cursor.execute(
+            f"CREATE TEMP TABLE staged_predictions (ProjectID TEXT PRIMARY KEY, RowHash TEXT, {column_ddl})")
+        cursor.executemany(
+            f"INSERT INTO staged_predictions (ProjectID, RowHash, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+            staged.itertuples(index=False, name=None))
+
+        if predictions_table:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS predictions (
+                    ProjectID TEXT NOT NULL, ModelVersion TEXT NOT NULL,
+                    RiskScore REAL, PredictedRisk TEXT, PredictedCost REAL, PredictedDuration_Days INTEGER,
+                    ScoredAt TEXT NOT NULL, PRIMARY KEY (ProjectID, ModelVersion)
+                )
+            ''')
+            assignments = ", ".join(f"{col} = excluded.{col}" for col in columns)
+            # "WHERE true" disambiguates the upsert clause after INSERT ... SELECT
+            cursor.execute(
+                f"INSERT INTO predictions (ProjectID, ModelVersion, ScoredAt, {', '.join(columns)}) "
+                f"SELECT ProjectID, ?, ?, {', '.join(columns)} FROM staged_predictions WHERE true "
+                f"ON CONFLICT (ProjectID, ModelVersion) DO UPDATE SET {assignments}, ScoredAt = excluded.ScoredAt",
+                (model_version, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        else:
+            # Missing values keep whatever the project already had, as before
+            assignments = ", ".join(
+                f"{col} = COALESCE(s.{col}, projects.{col})" for col in columns)
+            cursor.execute(
+                f"UPDATE projects SET {assignments} FROM staged_predictions s "
+                f"WHERE projects.ProjectID = s.ProjectID")
+
+        print(f"Applied {cursor.rowcount} predictions.")
+
+        # Only the projects scored here, and only if a build has not changed them since they were read
+        cleared = cursor.execute(
+            "UPDATE projects SET NeedsScoring = 0 FROM staged_predictions s "
+            "WHERE projects.ProjectID = s.ProjectID AND projects.RowHash IS s.RowHash "
+            "AND projects.NeedsScoring = 1").rowcount
+        print(f"Cleared the rescoring flag on {cleared} projects.")
+        cursor.execute("DROP TABLE temp.staged_predictions")
         conn.commit()
+        # PredictedRisk changed, so refresh the planner statistics for its index
+        cursor.execute("ANALYZE")
         print("Database updated successfully.")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the Lighthouse models and score open projects.")
+    parser.add_argument("--dirty-only", action="store_true",
+                        help="Only rescore projects flagged as new or changed by an incremental ETL run.")
+    parser.add_argument("--predictions-table", action="store_true",
+                        help="Write to a separate `predictions` table keyed by model version instead of `projects`.")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="Parallel jobs per forest (-1 uses every core).")
+    parser.add_argument("--model-version", default=None,
+                        help="Version label stored with --predictions-table rows (defaults to the registry version).")
+    parser.add_argument("--retrain", action="store_true",
+                        help="Train and save new models even when the training data hash matches the latest version.")
+    parser.add_argument("--score-only", action="store_true",
+                        help="Kept for existing scripts: saved models are always reused while the training data is unchanged.")
+    parser.add_argument("--parallel-models", action="store_true",
+                        help="Train the risk, cost and duration models at the same time.")
+    parser.add_argument("--explain-workers", type=int, default=EXPLAIN_WORKERS,
+                        help="Processes computing SHAP explanations for PrimaryRiskFactor "
+                             "(about 20 ms per open project per process, for projects new to the model version).")
+    parser.add_argument("--skip-explanations", action="store_true",
+                        help="Leave PrimaryRiskFactor as it is.")
+    return parser.parse_args()
+
+
 # --- Main Execution ---
 if __name__ == '__main__':
-    # Load data
-    df = load_data_from_db(DB_FILE_PATH)
+    args = parse_args()
+    timings = {}
 
-    # Train models
-    risk_model, risk_features = train_risk_model(df) if len(
-        df[df['ProjectStatus'] == 'Completed']) > 0 else (None, None)
-    cost_model, cost_features = train_cost_model(df) if len(
-        df[df['ProjectStatus'] == 'Completed']) > 0 else (None, None)
-    duration_model, duration_features = train_duration_model(df) if len(
-        df[df['ProjectStatus'] == 'Completed']) > 0 else (None, None)
+    # Load data
+    with stage_timer('load data', timings):
+        df = load_data_from_db(DB_FILE_PATH)
+
+    # Train models, or reuse the saved ones when the training data is unchanged:
+    # a new version would only churn models/ and the explanation cache keyed on it
+    data_hash = compute_training_data_hash(df)
+    saved = None if args.retrain else latest_metadata()
+    dirty_only = args.dirty_only
+    if saved is not None and saved['data_hash'] == data_hash:
+        print(f"Training data unchanged; loading saved model version {saved['version']}.")
+        with stage_timer('load models', timings):
+            models, metadata = load_models(saved['version'])
+    else:
+        if saved is not None:
+            print("No saved models match the current training data; retraining.")
+        if dirty_only:
+            # Unflagged projects were scored by the previous models
+            print("New models rescore every open project, not only the flagged ones.")
+            dirty_only = False
+        metrics = {}
+        models = train_models(df, timings, n_jobs=args.n_jobs, metrics=metrics, parallel=args.parallel_models)
+        with stage_timer('save models', timings):
+            metadata = save_models(models, data_hash, metrics)
+    risk_model, risk_features = models['risk']
+    cost_model, cost_features = models['cost']
+    duration_model, duration_features = models['duration']
 
     # Make predictions
-    predictions = make_predictions(df, risk_model, cost_model, duration_model,
-                                   risk_features, cost_features, duration_features)
+    with stage_timer('predict', timings):
+        predictions = make_predictions(df, risk_model, cost_model, duration_model,
+                                       risk_features, cost_features, duration_features,
+                                       dirty_only=dirty_only)
 
     # Update database
-    update_database_with_predictions(DB_FILE_PATH, predictions)
+    with stage_timer('write predictions', timings):
+        update_database_with_predictions(DB_FILE_PATH, predictions,
+                                         predictions_table=args.predictions_table,
+                                         model_version=args.model_version or metadata['version'])
+
+    # Every scored open project is explained; cached explanations make unchanged ones free
+    if risk_model is not None and not args.skip_explanations and not args.predictions_table:
+        with stage_timer('explain risk', timings):
+            open_projects = df[df['ProjectStatus'].isin(['In Progress', 'Not Started'])]
+            update_primary_risk_factors(DB_FILE_PATH, open_projects, metadata['version'],
+                                        workers=args.explain_workers)
+
+    # Risk levels and predicted costs feed the rollups; refresh the groups they moved
+    with sqlite3.connect(DB_FILE_PATH) as conn:
+        if not args.predictions_table:
+            with stage_timer('refresh rollups', timings):
+                create_rollup_schema(conn)
+                refresh_rollups(conn)
+        # Responses cached by the API are keyed on this stamp
+        bump_db_version(conn)
+
+    print("Stage timings:")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<22} {seconds:8.2f}s")
+    print(f"  {'total':<22} {sum(timings.values()):8.2f}s")
 
     print("Enhanced prediction process completed.")
@@ -1,103 +1,482 @@
-import sqlite3
-from flask import Flask, jsonify, request
+import time
+_import_started = time.perf_counter()
+
+import os
+import json
+import base64
+import functools
+from flask import Flask, jsonify, request, make_response
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
 
 # Import the chatbot service
-from chatbot_service import ask_chatbot
+from chatbot_service import ask_chatbot, get_chatbot_cache, chart_renderer
+from chart_service import CHART_FORMATS
+from chatbot_executor import ChatbotExecutor, ChatbotBusy, BUSY_RETRY_AFTER_SECONDS
+from prediction_service import get_predictor
+from db_version import VersionWatcher
+from response_cache import ResponseCache
+from contractor_analysis import contractor_performance, contractor_trends, PERFORMANCE_FILTERS
+from db_pool import ConnectionPool
+from serialization import (
+    JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE, ARROW_STREAM_MIMETYPE, MIN_COMPRESS_BYTES,
+    response_formats, dumps, iter_json_rows, columnar_json, arrow_stream,
+    choose_encoding, compress, iter_compressed
+)
 
 # --- Configuration ---
 DB_FILE_PATH = 'lighthouse.db'
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['ETag', 'X-Next-Cursor'])  # Enable CORS for all routes
+
+# Load the saved models at import so /api/predict never waits on disk. Under
+# `gunicorn --preload` (start.sh) this runs once in the master and forked
+# workers share the loaded models and scikit-learn; everything else heavy
+# (the Gemini client, matplotlib, pyarrow) is imported on first use.
+try:
+    get_predictor()
+except FileNotFoundError as e:
+    print(f"Online predictions disabled until models are trained: {e}")
+
+# --- Database Connections ---
+# Requests borrow read-only connections from a per-worker pool instead of
+# opening (and possibly leaking) one each time
+db_pool = ConnectionPool(DB_FILE_PATH)
+# The version stamp is kept in memory and rechecked with a stat of the
+# database files, so cache hits never touch SQLite
+version_watcher = VersionWatcher(DB_FILE_PATH, db_pool.connection)
+
+# --- Response Cache ---
+# Read endpoints only change when the pipeline bumps the database version,
+# so their rendered bodies are cached per (path, query, version).
+response_cache = ResponseCache()
+
+# --- Chatbot ---
+# Questions run on a small bounded pool of their own, so slow LLM round trips
+# cannot occupy every web thread and stall the data endpoints
+chatbot = ChatbotExecutor(ask_chatbot)
+
+
+# Extra response headers that are part of a cached representation
+CACHED_HEADERS = ['X-Next-Cursor']
+
+
+def _finish_cacheable(response, encoding):
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    # Clients may keep the body but must revalidate it, which costs a 304 at most
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _stream_and_cache(key, response, encoding, headers):
+    """Passes a streamed response through (compressing it if asked) and caches it once complete.
+
+    A streamed body has no ETag, since headers go out before the body is
+    known; the next request for the same key is served from the cache with one.
+    """
+    chunks = response.response
+    if encoding:
+        chunks = iter_compressed(chunks, encoding)
+
+    def generate():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Release the source (and its pooled connection) even if the client went away
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        response_cache.put(key, b''.join(parts), response.mimetype, encoding, headers)
+
+    streamed = app.response_class(generate(), mimetype=response.mimetype, headers=headers)
+    return _finish_cacheable(streamed, encoding)
+
+
+def cached_response(view):
+    """Serves a GET view from the response cache, with a strong ETag and 304 support.
+
+    Query parameters are normalized (sorted) into the key, along with the
+    negotiated Accept and Accept-Encoding. Bodies are cached compressed, so
+    gzip/brotli runs once per version rather than once per request. Only
+    200 responses are cached; errors always go back to the view.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version = version_watcher.version()
+        accepted_encodings = tuple(bool(request.accept_encodings[e]) for e in ('br', 'gzip'))
+        key = (request.path, tuple(sorted(request.args.items(multi=True))),
+               request.headers.get('Accept', ''), accepted_encodings, version)
+
+        entry = response_cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            encoding = choose_encoding(request.accept_encodings, response.mimetype)
+            headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+            if response.is_streamed:
+                return _stream_and_cache(key, response, encoding, headers)
+
+            body = response.get_data()
+            if encoding and len(body) < MIN_COMPRESS_BYTES:
+                encoding = None
+            if encoding:
+                body = compress(body, encoding)
+            entry = response_cache.put(key, body, response.mimetype, encoding, headers)
+
+        body, etag, mimetype, encoding, headers = entry
+        response = app.response_class(body, mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        return _finish_cacheable(response, encoding).make_conditional(request)
+    return wrapper
+
+
+def json_response(obj):
+    """A 200 JSON response encoded with the fast serializer."""
+    return app.response_class(dumps(obj), mimetype=JSON_MIMETYPE)
+
+
+def stream_query(sql, params, encode):
+    """Runs `sql` on a pooled connection and returns a generator of encoded chunks.
+
+    The query executes before this returns, so SQL errors still surface as a
+    normal error response; the connection is held until the stream finishes.
+    """
+    def generate():
+        with db_pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            yield b''  # Query is running; hand back control before fetching rows
+            yield from encode(cursor)
+
+    chunks = generate()
+    next(chunks)
+    return chunks
+
+# --- Query Definitions ---
+# Output column -> (SQL expression, joined table it needs, nullable)
+PROJECT_COLUMNS = {
+    'ProjectID': ('p.ProjectID', None, False),
+    'ProjectType': ('p.ProjectType', None, False),
+    'ProjectStatus': ('p.ProjectStatus', None, False),
+    'Budget': ('p.Budget', None, False),
+    'ActualCost': ('p.ActualCost', None, True),
+    'StartDate': ('p.StartDate', None, False),
+    'PlannedEndDate': ('p.PlannedEndDate', None, False),
+    'ActualEndDate': ('p.ActualEndDate', None, True),
+    'ScheduleVariance_Days': ('p.ScheduleVariance_Days', None, True),
+    'BudgetVariance_CAD': ('p.BudgetVariance_CAD', None, True),
+    'ReturnOnCost_Percent': ('p.ReturnOnCost_Percent', None, True),
+    'ESG_Initiative': ('p.ESG_Initiative', None, True),
+    'PreReno_Rent': ('p.PreReno_Rent', None, True),
+    'PostReno_Rent': ('p.PostReno_Rent', None, True),
+    'RiskScore': ('p.RiskScore', None, True),
+    'PredictedRisk': ('p.PredictedRisk', None, True),
+    'PrimaryRiskFactor': ('p.PrimaryRiskFactor', None, True),
+    'PredictedCost': ('p.PredictedCost', None, True),
+    'PredictedDuration_Days': ('p.PredictedDuration_Days', None, True),
+    'PropertyName': ('prop.PropertyName', 'prop', False),
+    'City': ('prop.City', 'prop', False),
+    'Vendor': ('v.VendorName', 'v', False),
+}
+
+TABLE_JOINS = {
+    'prop': "JOIN properties prop ON p.PropertyID = prop.PropertyID",
+    'v': "JOIN vendors v ON p.VendorID = v.VendorID",
+}
+
+PROJECT_FILTERS = {
+    'ProjectStatus': 'p.ProjectStatus',
+    'City': 'prop.City',
+    'ProjectType': 'p.ProjectType',
+    'PredictedRisk': 'p.PredictedRisk'
+}
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(sort_value, project_id):
+    """Packs the last row's sort key into an opaque, URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps([sort_value, project_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, project_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    return sort_value, project_id
+
+
+def build_filter_conditions(query_params):
+    """Returns (conditions, params, joins) for the whitelisted project filters."""
+    conditions = []
+    params = {}
+    joins = set()
+    for key, column in PROJECT_FILTERS.items():
+        if key in query_params:
+            conditions.append(f'{column} = :{key}')
+            params[key] = query_params[key]
+            if column.startswith('prop.'):
+                joins.add('prop')
+    return conditions, params, joins
+
+
+def build_projects_query(query_params, fields=None, sort='ProjectID', descending=False, limit=None, cursor=None):
+    """Builds the /api/projects SQL and named parameters.
+
+    Applies the whitelisted filters, projects only `fields` (all columns by
+    default), joins properties/vendors only when a selected column or filter
+    needs them, and orders by `sort` with ProjectID as a tie-breaker so that
+    `cursor` (the last row's sort key) can resume the next page by keyset.
+    """
+    fields = list(fields or PROJECT_COLUMNS)
+    selected = fields + [f for f in ('ProjectID', sort) if f not in fields]
+
+    conditions, params, filter_joins = build_filter_conditions(query_params)
+    joins = ({PROJECT_COLUMNS[f][1] for f in selected} - {None}) | filter_joins
+
+    sort_expr, _, nullable = PROJECT_COLUMNS[sort]
+    direction, comparison = ('DESC', '<') if descending else ('ASC', '>')
+    # A filtered listing is found through the filter's index and then sorted; the unary
+    # `+` stops SQLite from walking a sort index (e.g. the primary key) to skip the sort
+    order_prefix = "+" if conditions else ""
+
+    if cursor is not None:
+        cursor_value, params['cursor_id'] = decode_cursor(cursor)
+        if cursor_value is None:
+            # Inside the trailing block of NULL sort values, only the tie-breaker moves
+            conditions.append(f"({sort_expr} IS NULL AND p.ProjectID {comparison} :cursor_id)")
+        else:
+            params['cursor_value'] = cursor_value
+            keyset = f"({sort_expr}, p.ProjectID) {comparison} (:cursor_value, :cursor_id)"
+            conditions.append(f"({sort_expr} IS NULL OR {keyset})" if nullable else keyset)
+
+    select_list = ",\n        ".join(f"{PROJECT_COLUMNS[f][0]} AS {f}" for f in selected)
+    base_query = f"SELECT\n        {select_list}\n    FROM projects p"
+    for alias in ('prop', 'v'):
+        if alias in joins:
+            base_query += f"\n    {TABLE_JOINS[alias]}"
+
+    if conditions:
+        base_query += " WHERE " + " AND ".join(conditions)
+
+    # NULL sort values always come last, in either direction
+    null_order = f"({sort_expr} IS NULL), " if nullable else ""
+    tie_breaker = f", {order_prefix}p.ProjectID {direction}" if sort != 'ProjectID' else ""
+    base_query += f" ORDER BY {null_order}{order_prefix}{sort_expr} {direction}{tie_breaker}"
 
-# --- Helper Function to Connect to DB ---
+    if limit is not None:
+        base_query += " LIMIT :limit"
+        params['limit'] = limit + 1  # One extra row tells us whether another page exists
 
+    return base_query, params
 
-def get_db_connection():
-    """Creates a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    return conn
+
+# Each dashboard series is one GROUP BY over the rollups table maintained by
+# the pipeline (see rollups.py), so the cost follows the number of groups
+# rather than the number of projects. Every /api/projects filter is also a
+# rollup key column. Averages are rebuilt from the additive sums and counts:
+# actual cost over completed projects, predicted cost over the rest.
+DASHBOARD_QUERIES = {
+    'kpis': """
+        SELECT COALESCE(SUM(ProjectCount), 0) AS total_projects,
+               COALESCE(SUM(CASE WHEN PredictedRisk = 'High' THEN ProjectCount END), 0) AS high_risk_projects,
+               COALESCE(SUM(Budget_Sum), 0) AS total_budget,
+               COALESCE(SUM(CASE WHEN ProjectStatus = 'Completed' THEN BudgetVariance_CAD_Sum END), 0) AS total_budget_variance
+        FROM rollups {where}
+    """,
+    'risk_distribution': """
+        SELECT PredictedRisk AS risk, SUM(ProjectCount) AS count
+        FROM rollups {where}
+        GROUP BY PredictedRisk
+        ORDER BY CASE PredictedRisk WHEN 'High' THEN 0 WHEN 'Medium' THEN 1 WHEN 'Low' THEN 2 ELSE 3 END
+    """,
+    'projects_by_city': """
+        SELECT City AS city, SUM(ProjectCount) AS count
+        FROM rollups {where}
+        GROUP BY City
+        ORDER BY City
+    """,
+    'contractor_costs': """
+        SELECT Vendor AS vendor,
+               SUM(Budget_Sum) / SUM(Budget_N) AS avg_budget,
+               SUM(CASE WHEN ProjectStatus = 'Completed' THEN ActualCost_Sum END)
+                 / SUM(CASE WHEN ProjectStatus = 'Completed' THEN ActualCost_N END) AS avg_actual_cost,
+               SUM(CASE WHEN ProjectStatus <> 'Completed' THEN PredictedCost_Sum END)
+                 / SUM(CASE WHEN ProjectStatus <> 'Completed' THEN PredictedCost_N END) AS avg_predicted_cost
+        FROM rollups {where}
+        GROUP BY Vendor
+        ORDER BY Vendor
+    """,
+}
+
+
+def build_dashboard_queries(query_params):
+    """Returns {series: (sql, params)} for the dashboard, applying the /api/projects filters."""
+    conditions = [f"{key} = :{key}" for key in PROJECT_FILTERS if key in query_params]
+    params = {key: query_params[key] for key in PROJECT_FILTERS if key in query_params}
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return {name: (template.format(where=where), params) for name, template in DASHBOARD_QUERIES.items()}
+
+
+def parse_projects_request(query_params):
+    """Validates the fields/sort/order/limit/cursor parameters of /api/projects."""
+    fields = None
+    if query_params.get('fields'):
+        fields = [f.strip() for f in query_params['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in PROJECT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    sort = query_params.get('sort', 'ProjectID')
+    if sort not in PROJECT_COLUMNS:
+        raise ValueError(f"Cannot sort by '{sort}'.")
+
+    order = query_params.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'.")
+
+    limit = query_params.get('limit')
+    cursor = query_params.get('cursor')
+    if limit is not None or cursor is not None:
+        try:
+            limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+        except ValueError:
+            raise ValueError("limit must be an integer.")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    return {'fields': fields, 'sort': sort, 'descending': order == 'desc', 'limit': limit, 'cursor': cursor}
 
 # --- API Endpoint Definitions ---
 
 
 @app.route('/api/ask', methods=['POST'])
 def handle_ask():
-    """API endpoint for the Text-to-SQL chatbot."""
+    """API endpoint for the Text-to-SQL chatbot.
+
+    Chart answers carry a base64 PNG by default, or a Chart.js config when
+    the request sets "chart_format": "spec".
+    """
     data = request.get_json()
     if not data or 'question' not in data:
         return jsonify({"error": "Question not provided"}), 400
 
     question = data['question']
+    chart_format = data.get('chart_format', 'png')
+    if chart_format not in CHART_FORMATS:
+        return jsonify({"error": f"chart_format must be one of {CHART_FORMATS}"}), 400
 
     try:
-        result = ask_chatbot(question)
+        result = chatbot.ask(question, chart_format=chart_format)
         # Handle both old string format and new dict format
         if isinstance(result, dict):
             return jsonify(result)
         else:
             return jsonify({"answer": result, "type": "text"})
+    except ChatbotBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(BUSY_RETRY_AFTER_SECONDS)}
+    except TimeoutError:
+        return jsonify({"error": "The chatbot took too long to answer. Please try again."}), 504
     except Exception as e:
         print(f"An unexpected error occurred in the chatbot endpoint: {e}")
         return jsonify({"error": "An internal error occurred."}), 500
 
 
+@app.route('/api/predict', methods=['POST'])
+def handle_predict():
+    """API endpoint to score one project (a JSON object) or a batch ({"projects": [...]}) in memory."""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Project data not provided"}), 400
+
+    projects = data['projects'] if isinstance(data, dict) and 'projects' in data else data
+    single = isinstance(projects, dict)
+    if single:
+        projects = [projects]
+    if not isinstance(projects, list) or not all(isinstance(p, dict) for p in projects):
+        return jsonify({"error": "Expected a project object or a list of project objects"}), 400
+
+    try:
+        predictor = get_predictor()
+    except FileNotFoundError:
+        return jsonify({"error": "Models are not available yet."}), 503
+
+    try:
+        results = predictor.predict(projects)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"POST /api/predict - An error occurred: {e}")
+        return jsonify({"error": "An internal error occurred."}), 500
+
+    if single:
+        return jsonify({"prediction": results[0], "model_version": predictor.version})
+    return jsonify({"predictions": results, "model_version": predictor.version})
+
+
 @app.route('/api/projects', methods=['GET'])
+@cached_response
 def get_projects():
-    """API endpoint to fetch projects from the normalized database, with optional filtering."""
+    """API endpoint to fetch projects from the normalized database, with optional filtering.
+
+    Supports `fields=` projection and server-side `sort`/`order`. Passing
+    `limit` (and then `cursor`) switches to keyset pagination, returning
+    {"projects": [...], "next_cursor": ...} instead of a plain array.
+    The Accept header can ask for columnar JSON or an Arrow IPC stream
+    instead; those carry the next cursor in an X-Next-Cursor header.
+    """
     try:
         query_params = request.args
         print(
             f"GET /api/projects - Request received with params: {dict(query_params)}")
 
-        conn = get_db_connection()
-
-        base_query = '''
-            SELECT
-                p.ProjectID, p.ProjectType, p.ProjectStatus, p.Budget, p.ActualCost,
-                p.StartDate, p.PlannedEndDate, p.ActualEndDate,
-                p.ScheduleVariance_Days, p.BudgetVariance_CAD, p.ReturnOnCost_Percent,
-                p.ESG_Initiative, p.PreReno_Rent, p.PostReno_Rent,
-                p.RiskScore, p.PredictedRisk, p.PrimaryRiskFactor,
-                p.PredictedCost, p.PredictedDuration_Days,
-                prop.PropertyName,
-                prop.City,
-                v.VendorName as Vendor
-            FROM projects p
-            JOIN properties prop ON p.PropertyID = prop.PropertyID
-            JOIN vendors v ON p.VendorID = v.VendorID
-        '''
-
-        allowed_filters = {
-            'ProjectStatus': 'p.ProjectStatus',
-            'City': 'prop.City',
-            'ProjectType': 'p.ProjectType',
-            'PredictedRisk': 'p.PredictedRisk'
-        }
-
-        conditions = []
-        params = {}
+        try:
+            options = parse_projects_request(query_params)
+            base_query, params = build_projects_query(query_params, **options)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        for key, column in allowed_filters.items():
-            if key in query_params:
-                conditions.append(f'{column} = :{key}')
-                params[key] = query_params[key]
+        fields = options['fields'] or list(PROJECT_COLUMNS)
+        limit = options['limit']
+        mimetype = request.accept_mimetypes.best_match(response_formats(), default=JSON_MIMETYPE)
 
-        if conditions:
-            base_query += " WHERE " + " AND ".join(conditions)
+        # The full list as row objects is streamed: rows are fetched and encoded
+        # in batches, so the first bytes leave before the last row is read
+        if limit is None and mimetype == JSON_MIMETYPE:
+            chunks = stream_query(base_query, params, lambda cursor: iter_json_rows(fields, cursor))
+            return app.response_class(chunks, mimetype=JSON_MIMETYPE)
 
-        df = pd.read_sql_query(base_query, conn, params=params)
-        conn.close()
+        # Rows are built straight from the cursor; NULLs already come back as None
+        with db_pool.connection() as conn:
+            cursor = conn.execute(base_query, params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
 
-        df = df.replace({np.nan: None})
+        next_cursor = None
+        if limit is not None:
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if has_more:
+                last = dict(zip(columns, rows[-1]))
+                next_cursor = encode_cursor(last[options['sort']], last['ProjectID'])
 
-        projects = df.to_dict(orient='records')
-
-        return jsonify(projects)
+        if mimetype == ARROW_STREAM_MIMETYPE:
+            response = app.response_class(arrow_stream(fields, rows), mimetype=ARROW_STREAM_MIMETYPE)
+        elif mimetype == COLUMNAR_JSON_MIMETYPE:
+            response = app.response_class(columnar_json(fields, rows, next_cursor=next_cursor),
+                                          mimetype=COLUMNAR_JSON_MIMETYPE)
+        else:
+            return json_response({"projects": [dict(zip(fields, row)) for row in rows],
+                                  "next_cursor": next_cursor})
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
 
     except Exception as e:
         print(f"GET /api/projects - An error occurred: {e}")
@@ -105,18 +484,106 @@ def get_projects():
 
 
 @app.route('/api/dashboard-analytics', methods=['GET'])
+@cached_response
 def get_dashboard_analytics():
-    """API endpoint to get dashboard KPIs and analytics."""
+    """API endpoint to get dashboard KPIs and chart series, aggregated in SQL.
+
+    Accepts the same filters as /api/projects and returns only the
+    aggregates, so the dashboard does not need the project list.
+    """
     try:
-        # For now, return a simple response until enhanced chatbot is fixed
-        return jsonify({"message": "Dashboard analytics endpoint - enhanced features coming soon"})
+        queries = build_dashboard_queries(request.args)
+        analytics = {}
+        with db_pool.connection() as conn:
+            for name, (sql, params) in queries.items():
+                cursor = conn.execute(sql, params)
+                columns = [description[0] for description in cursor.description]
+                analytics[name] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        analytics['kpis'] = analytics['kpis'][0]
+        return json_response(analytics)
     except Exception as e:
         print(f"GET /api/dashboard-analytics - An error occurred: {e}")
         return jsonify({"error": "An internal error occurred."}), 500
 
 
+@app.route('/api/contractors/performance', methods=['GET'])
+@cached_response
+def get_contractor_performance():
+    """API endpoint returning cost, schedule and prediction metrics per contractor.
+
+    Optional filters: City, ProjectType, and a StartDate window given as
+    start_date/end_date (YYYY-MM-DD, inclusive).
+    """
+    filters = {key: request.args[key] for key in PERFORMANCE_FILTERS if request.args.get(key)}
+    try:
+        with db_pool.connection() as conn:
+            performance = contractor_performance(conn, filters, request.args.get('start_date') or None,
+                                                 request.args.get('end_date') or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"GET /api/contractors/performance - An error occurred: {e}")
+        return jsonify({"error": "An internal error occurred."}), 500
+    return json_response(performance)
+
+
+@app.route('/api/contractors/trends', methods=['GET'])
+@cached_response
+def get_contractor_trends():
+    """API endpoint returning rolling budget and schedule variance statistics per contractor.
+
+    Parameters: period (month or quarter), window (periods per rolling
+    window, default 3), Vendor (repeatable) and start/end months (YYYY-MM).
+    """
+    try:
+        try:
+            window = int(request.args.get('window', 3))
+        except ValueError:
+            raise ValueError("window must be an integer.")
+        with db_pool.connection() as conn:
+            trends = contractor_trends(conn, request.args.get('period', 'month'), window,
+                                       request.args.getlist('Vendor') or None,
+                                       request.args.get('start') or None, request.args.get('end') or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"GET /api/contractors/trends - An error occurred: {e}")
+        return jsonify({"error": "An internal error occurred."}), 500
+    return json_response(trends)
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """API endpoint reporting this worker's startup time and its pool, cache, chatbot and predictor counters."""
+    predictor_stats = None
+    try:
+        predictor_stats = get_predictor().stats()
+    except FileNotFoundError:
+        pass
+    return jsonify({
+        "pid": os.getpid(),
+        "startup_seconds": STARTUP_SECONDS,
+        "db_pool": db_pool.stats(),
+        "response_cache": response_cache.stats(),
+        "chatbot": chatbot.stats(),
+        "chatbot_cache": get_chatbot_cache().stats(),
+        "charts": chart_renderer.stats(),
+        "predictor": predictor_stats,
+    })
+
+
+STARTUP_SECONDS = round(time.perf_counter() - _import_started, 3)
+
+
+def log_startup():
+    """Reports the import time; called by the server entry points, not at import, so tools importing the app stay quiet."""
+    print(f"API loaded in {STARTUP_SECONDS}s (python startup_report.py breaks this down by import).")
+
+
 # --- Main Execution ---
 if __name__ == '__main__':
+    log_startup()
     print("Starting Flask server with chatbot endpoint...")
     print("Access the API at http://127.0.0.1:5001/api/projects")
     print("Chatbot endpoint at http://127.0.0.1:5001/api/ask")
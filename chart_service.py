@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+# matplotlib is only imported by the rendering processes, never by the web workers
+CHARTS_AVAILABLE = importlib.util.find_spec('matplotlib') is not None
+if not CHARTS_AVAILABLE:
+    print("Warning: matplotlib not available. Chart images disabled; chart specs still work.")
+
+# --- Configuration ---
+CHART_WORKERS = 2  # Rendering processes per web worker
+CHART_TIMEOUT_SECONDS = 20.0
+CHART_CACHE_ENTRIES = 128
+FIGURE_SIZE = (12, 8)
+FIGURE_DPI = 150
+CHART_FORMATS = ['png', 'spec']  # A base64 PNG, or a Chart.js config the browser draws itself
+
+BUDGET_COLOR = '#3498db'
+ACTUAL_COLOR = '#e74c3c'
+
+
+def _chart_rows(data):
+    """Splits result rows into (column names, first-column labels, up to two value series as floats)."""
+    columns = list(data[0].keys())
+    labels = [row[columns[0]] for row in data]
+    values = [[float(row[column] or 0) for row in data] for column in columns[1:3]]
+    return columns, labels, values
+
+
+def _currency(x, pos):
+    return f'${x:,.0f}'
+
+
+def render_chart_png(data, title, chart_type='bar'):
+    """Draws a chart of SQL query rows with a standalone Figure and returns the PNG as base64.
+
+    Runs in the chart worker processes. Three or more columns are drawn as
+    label / budget / actual cost bars, two columns as one bar or pie series.
+    """
+    # The object-oriented API only; pyplot's global figure state is not thread-safe
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    fig = Figure(figsize=FIGURE_SIZE)
+    ax = fig.add_subplot()
+    if isinstance(data, list) and len(data) > 0:
+        columns, labels, values = _chart_rows(data)
+        if len(columns) >= 3:  # Vendor, Budget, Actual pattern
+            x_pos = range(len(labels))
+            width = 0.35
+            ax.bar([p - width/2 for p in x_pos], values[0], width, label='Budget', alpha=0.8, color=BUDGET_COLOR)
+            ax.bar([p + width/2 for p in x_pos], values[1], width, label='Actual Cost', alpha=0.8, color=ACTUAL_COLOR)
+            ax.set_xlabel('Vendor')
+            ax.set_ylabel('Amount ($)')
+            ax.set_xticks(list(x_pos))
+            ax.set_xticklabels(labels, rotation=45, ha='right')
+            ax.legend()
+            ax.yaxis.set_major_formatter(FuncFormatter(_currency))
+        elif len(columns) == 2:  # Simple key-value pairs
+            if chart_type == 'pie':
+                ax.pie(values[0], labels=labels, autopct='%1.1f%%')
+            else:
+                ax.bar([str(label) for label in labels], values[0], color=BUDGET_COLOR, alpha=0.8)
+                ax.tick_params(axis='x', labelrotation=45)
+                for label in ax.get_xticklabels():
+                    label.set_horizontalalignment('right')
+    ax.set_title(title)
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=FIGURE_DPI, bbox_inches='tight', facecolor='white')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _rgba(hex_color, alpha):
+    red, green, blue = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f'rgba({red}, {green}, {blue}, {alpha})'
+
+
+def chart_spec(data, title, chart_type='bar'):
+    """Returns a Chart.js config ({type, data, options}) for the same chart render_chart_png draws.
+
+    A few hundred bytes of JSON instead of a rendered image; None when
+    the rows have nothing to plot.
+    """
+    if not isinstance(data, list) or len(data) == 0 or len(data[0]) < 2:
+        return None
+    columns, labels, values = _chart_rows(data)
+    options = {
+        'responsive': True,
+        'plugins': {'title': {'display': True, 'text': title}},
+    }
+    if len(columns) >= 3:
+        datasets = [
+            {'label': 'Budget', 'data': values[0], 'backgroundColor': _rgba(BUDGET_COLOR, 0.8)},
+            {'label': 'Actual Cost', 'data': values[1], 'backgroundColor': _rgba(ACTUAL_COLOR, 0.8)},
+        ]
+        options['scales'] = {'x': {'title': {'display': True, 'text': 'Vendor'}},
+                             'y': {'title': {'display': True, 'text': 'Amount ($)'}}}
+        return {'type': 'bar', 'data': {'labels': labels, 'datasets': datasets}, 'options': options}
+
+    dataset = {'label': columns[1], 'data': values[0]}
+    if chart_type == 'pie':
+        return {'type': 'pie', 'data': {'labels': labels, 'datasets': [dataset]}, 'options': options}
+    dataset['backgroundColor'] = _rgba(BUDGET_COLOR, 0.8)
+    options['plugins']['legend'] = {'display': False}
+    return {'type': 'bar', 'data': {'labels': labels, 'datasets': [dataset]}, 'options': options}
+
+
+def chart_key(data, title, chart_type):
+    """A content hash of everything that determines a rendered chart."""
+    payload = json.dumps([data, title, chart_type], sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class ChartRenderer:
+    """Renders chart PNGs in a small process pool and caches them by content hash.
+
+    Rendering runs outside the web worker, so a chart costs no GIL time
+    on the request threads. The pool is started on first use in each
+    process ('spawn', so workers never inherit a threaded parent's locks).
+    """
+
+    def __init__(self, workers=CHART_WORKERS, timeout=CHART_TIMEOUT_SECONDS, max_entries=CHART_CACHE_ENTRIES):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._cache = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._pool
+
+    def render(self, data, title, chart_type='bar'):
+        """Returns the chart as a base64 PNG, or None when it cannot be drawn."""
+        if not CHARTS_AVAILABLE:
+            return None
+        key = chart_key(data, title, chart_type)
+        with self._lock:
+            chart = self._cache.get(key)
+            if chart is not None:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return chart
+            self._stats['misses'] += 1
+
+        try:
+            chart = self._get_pool().submit(render_chart_png, data, title, chart_type).result(timeout=self.timeout)
+        except Exception as e:
+            print(f"Error creating chart: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+                if isinstance(e, BrokenProcessPool):
+                    self._pid = None  # Start a fresh pool on the next chart
+            return None
+
+        with self._lock:
+            self._cache[key] = chart
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return chart
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._cache), workers=self.workers)
@@ -0,0 +1,121 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# --- Configuration ---
+CACHE_DB_PATH = 'chatbot_cache.db'  # Kept apart from lighthouse.db, which the pipeline rebuilds
+SQL_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Generated SQL does not depend on the data, only on the schema
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600  # Answers are keyed by database version; the TTL just bounds storage
+MAX_SQL_ENTRIES = 2000
+MAX_ANSWER_ENTRIES = 2000  # Answer text, plus the result rows (at most 1,000) behind a chart; images are never stored
+BUSY_TIMEOUT_SECONDS = 5.0  # Gunicorn workers share the cache file
+
+
+def normalize_question(question):
+    """Lowercases a question and drops punctuation and repeated whitespace."""
+    return " ".join(re.sub(r"[^\w\s-]", " ", question.lower()).split())
+
+
+class ChatbotCache:
+    """A persistent cache of question -> SQL and (SQL, database version) -> answer.
+
+    Both live in one SQLite file shared by every worker. Entries expire
+    after a TTL, and each table is trimmed to its least recently used
+    `max_*_entries` on insert. Hit and miss counters are per process.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, sql_ttl=SQL_CACHE_TTL_SECONDS, answer_ttl=ANSWER_CACHE_TTL_SECONDS,
+                 max_sql_entries=MAX_SQL_ENTRIES, max_answer_entries=MAX_ANSWER_ENTRIES):
+        self.path = path
+        self.sql_ttl = sql_ttl
+        self.answer_ttl = answer_ttl
+        self.max_sql_entries = max_sql_entries
+        self.max_answer_entries = max_answer_entries
+        self._lock = threading.Lock()
+        self._stats = {'sql_hits': 0, 'sql_misses': 0, 'answer_hits': 0, 'answer_misses': 0, 'evictions': 0}
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS question_sql (
+                    Question TEXT PRIMARY KEY, SQL TEXT NOT NULL, CreatedAt REAL NOT NULL, LastUsed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_question_sql_last_used ON question_sql (LastUsed);
+                CREATE TABLE IF NOT EXISTS answers (
+                    SQL TEXT NOT NULL, DbVersion INTEGER NOT NULL, IsChart INTEGER NOT NULL,
+                    Response TEXT NOT NULL, CreatedAt REAL NOT NULL, LastUsed REAL NOT NULL,
+                    PRIMARY KEY (SQL, DbVersion, IsChart)
+                );
+                CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers (LastUsed);
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.execute("PRAGMA synchronous = NORMAL")  # A lost cache entry after a crash costs one LLM call
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get(self, table, value_column, key_sql, key, ttl):
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(f"SELECT rowid, {value_column} FROM {table} WHERE {key_sql} AND CreatedAt >= ?",
+                                   key + (now - ttl,)).fetchone()
+                if row is not None:
+                    conn.execute(f"UPDATE {table} SET LastUsed = ? WHERE rowid = ?", (now, row[0]))
+        except sqlite3.Error as e:
+            # A cache that cannot be read is a miss, never a failed question
+            print(f"Chatbot cache read failed: {e}")
+            return None
+        return row[1] if row is not None else None
+
+    def _put(self, table, columns, values, ttl, max_entries):
+        now = time.time()
+        placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, CreatedAt, LastUsed) "
+                             f"VALUES ({placeholders})", values + (now, now))
+                evicted = conn.execute(f"DELETE FROM {table} WHERE CreatedAt < ?", (now - ttl,)).rowcount
+                evicted += conn.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} "
+                                        f"ORDER BY LastUsed DESC LIMIT -1 OFFSET ?)", (max_entries,)).rowcount
+        except sqlite3.Error as e:
+            print(f"Chatbot cache write failed: {e}")
+            return
+        if evicted:
+            with self._lock:
+                self._stats['evictions'] += evicted
+
+    def get_sql(self, question):
+        """Returns the SQL cached for a (normalized) question, or None."""
+        sql = self._get('question_sql', 'SQL', "Question = ?", (question,), self.sql_ttl)
+        self._count('sql_hits' if sql is not None else 'sql_misses')
+        return sql
+
+    def put_sql(self, question, sql):
+        self._put('question_sql', ['Question', 'SQL'], (question, sql), self.sql_ttl, self.max_sql_entries)
+
+    def get_answer(self, sql, db_version, is_chart):
+        """Returns the response cached for a query on a given database version, or None."""
+        response = self._get('answers', 'Response', "SQL = ? AND DbVersion = ? AND IsChart = ?",
+                             (sql, db_version, int(is_chart)), self.answer_ttl)
+        self._count('answer_hits' if response is not None else 'answer_misses')
+        return json.loads(response) if response is not None else None
+
+    def put_answer(self, sql, db_version, is_chart, response):
+        self._put('answers', ['SQL', 'DbVersion', 'IsChart', 'Response'],
+                  (sql, db_version, int(is_chart), json.dumps(response)), self.answer_ttl, self.max_answer_entries)
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM question_sql")
+            conn.execute("DELETE FROM answers")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
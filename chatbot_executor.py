@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# --- Configuration ---
+# A question spends seconds waiting on the LLM, so it runs on its own small
+# pool instead of on the web worker's threads. Running plus queued questions
+# (MAX_CONCURRENT_QUESTIONS + MAX_QUEUED_QUESTIONS) stay below the gunicorn
+# thread count, leaving threads free for /api/projects and the dashboard.
+MAX_CONCURRENT_QUESTIONS = 2
+MAX_QUEUED_QUESTIONS = 2
+QUEUE_TIMEOUT_SECONDS = 15.0  # A question that waited this long for a slot is dropped unanswered
+ANSWER_TIMEOUT_SECONDS = 75.0  # Covers two LLM calls (LLM_TIMEOUT_SECONDS each) plus the query
+BUSY_RETRY_AFTER_SECONDS = 5
+
+
+class ChatbotBusy(Exception):
+    """Raised when a question cannot be accepted or did not get a slot in time."""
+
+
+class ChatbotExecutor:
+    """Answers chatbot questions on a bounded thread pool with its own queue.
+
+    At most `max_concurrent` questions run at once and `max_queued` more
+    wait for a slot; anything beyond that is rejected right away with
+    ChatbotBusy rather than tying up another web thread. A question whose
+    caller timed out still holds its slot until it finishes, so the limits
+    hold even when the LLM is slow.
+    """
+
+    def __init__(self, answer, max_concurrent=MAX_CONCURRENT_QUESTIONS, max_queued=MAX_QUEUED_QUESTIONS,
+                 queue_timeout=QUEUE_TIMEOUT_SECONDS):
+        self.answer = answer
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'expired': 0,
+                       'timed_out': 0, 'queue_seconds': 0.0, 'answer_seconds': 0.0}
+
+    def _ensure_pool(self):
+        # Threads do not survive fork, so each worker process starts its own pool
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='chatbot')
+            self._in_flight = 0
+            self._pid = os.getpid()
+
+    def submit(self, question, **options):
+        """Queues a question and returns a Future of its answer; raises ChatbotBusy when full.
+
+        `options` are passed on to the answer function with the question.
+        """
+        with self._lock:
+            self._ensure_pool()
+            if self._in_flight >= self.max_concurrent + self.max_queued:
+                self._stats['rejected'] += 1
+                raise ChatbotBusy("The chatbot is busy answering other questions. Please try again shortly.")
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+            executor = self._executor
+        future = executor.submit(self._run, question, options, time.perf_counter())
+        future.add_done_callback(self._finished)
+        return future
+
+    def ask(self, question, timeout=ANSWER_TIMEOUT_SECONDS, **options):
+        """Answers a question on the pool, blocking the caller for at most `timeout` seconds.
+
+        Raises ChatbotBusy when the question is not accepted, and TimeoutError
+        when the answer takes longer than `timeout`.
+        """
+        future = self.submit(question, **options)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats['timed_out'] += 1
+            raise TimeoutError(f"No answer within {timeout} seconds.")
+
+    def _run(self, question, options, queued_at):
+        started = time.perf_counter()
+        with self._lock:
+            self._stats['queue_seconds'] += started - queued_at
+        if started - queued_at > self.queue_timeout:
+            with self._lock:
+                self._stats['expired'] += 1
+            raise ChatbotBusy("The chatbot is busy answering other questions. Please try again shortly.")
+        try:
+            return self.answer(question, **options)
+        finally:
+            with self._lock:
+                self._stats['answer_seconds'] += time.perf_counter() - started
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.exception() is None:
+                self._stats['completed'] += 1
+            elif not isinstance(future.exception(), ChatbotBusy):
+                self._stats['failed'] += 1
+
+    def stats(self):
+        with self._lock:
+            self._ensure_pool()
+            return dict(self._stats, max_concurrent=self.max_concurrent, max_queued=self.max_queued,
+                        running=min(self._in_flight, self.max_concurrent),
+                        queued=max(self._in_flight - self.max_concurrent, 0),
+                        queue_seconds=round(self._stats['queue_seconds'], 4),
+                        answer_seconds=round(self._stats['answer_seconds'], 4))
@@ -2,18 +2,12 @@ import os
 import sqlite3
 import re
 import json
-import base64
-from io import BytesIO
-import google.generativeai as genai
+import threading
 from dotenv import load_dotenv
-try:
-    import matplotlib.pyplot as plt
-    import matplotlib
-    matplotlib.use('Agg')  # Use non-interactive backend
-    CHARTS_AVAILABLE = True
-except ImportError:
-    CHARTS_AVAILABLE = False
-    print("Warning: matplotlib not available. Chart generation disabled.")
+from db_version import get_db_version, file_signature
+from chatbot_cache import ChatbotCache, normalize_question
+from sql_guard import run_guarded_query, QueryRejected
+from chart_service import ChartRenderer, chart_spec
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,12 +15,69 @@ load_dotenv()
 # --- Configuration & Initialization ---
 DB_FILE_PATH = 'lighthouse.db'
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    print("Warning: Gemini API key is not configured. Please create a .env file and add GEMINI_API_KEY='YOUR_API_KEY'")
-
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Tables and columns described to the LLM; pipeline bookkeeping columns are left out
+SCHEMA_TABLES = ['projects', 'properties', 'vendors']
+SCHEMA_HIDDEN_COLUMNS = {'RowHash', 'NeedsScoring'}
+# Columns whose known values go into the prompt, read from the matching rollups key column
+SCHEMA_ENUM_COLUMNS = {
+    ('vendors', 'VendorName'): 'Vendor',
+    ('properties', 'City'): 'City',
+    ('projects', 'ProjectType'): 'ProjectType',
+    ('projects', 'ProjectStatus'): 'ProjectStatus',
+    ('projects', 'PredictedRisk'): 'PredictedRisk',
+}
+MAX_ENUM_VALUES = 30  # Longer value lists cost more prompt tokens than they save
+
+MAX_RESULT_ROWS = 1000  # Rows fetched per question; anything past this is cut off
+PROMPT_ROWS = 20  # Rows pasted into the answer prompt; larger results are summarized
+
+ANSWER_ERROR_MESSAGE = "Sorry, I encountered an error while formulating the answer."
+LLM_TIMEOUT_SECONDS = 30  # Per Gemini call, so a stalled request cannot hold a chatbot slot forever
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_llm():
+    """Returns the Gemini model, importing and configuring the client on the first question.
+
+    The client library takes about a second to import and opens network
+    channels that must not be shared across a fork, so each worker
+    creates its own on demand rather than at startup.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if os.getenv("USE_FAKE_LLM"):
+                    # Offline stand-in with a fixed latency, for load-testing the chatbot path
+                    from fake_llm import FakeLLM, FAKE_LATENCY_SECONDS
+                    _model = FakeLLM(float(os.getenv("FAKE_LLM_LATENCY_SECONDS", FAKE_LATENCY_SECONDS)))
+                    print(f"Using the fake LLM ({_model.latency_seconds}s per call).")
+                else:
+                    import google.generativeai as genai
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        print("Warning: Gemini API key is not configured. Please create a .env file and add GEMINI_API_KEY='YOUR_API_KEY'")
+                    genai.configure(api_key=api_key)
+                    _model = genai.GenerativeModel('gemini-2.5-flash')
+    return _model
+
+# Chart images render in a process pool of their own and are cached by content
+chart_renderer = ChartRenderer()
+
+# --- Fixed SQL used for chart requests and when the LLM output is unusable ---
+# Canned aggregates read the pipeline's rollups table (see rollups.py) instead
+# of grouping every project on each question
+VENDOR_BUDGET_CHART_SQL = "SELECT Vendor as VendorName, SUM(Budget_Sum) as Total_Budget, SUM(ActualCost_Sum) as Total_Actual FROM rollups WHERE ProjectStatus = 'Completed' GROUP BY Vendor"
+
+FALLBACK_QUERIES = {
+    'project_count': "SELECT COALESCE(SUM(ProjectCount), 0) as project_count FROM rollups",
+    'high_risk_count': "SELECT COALESCE(SUM(ProjectCount), 0) as high_risk_count FROM rollups WHERE PredictedRisk = 'High'",
+    'avg_budget_toronto': "SELECT SUM(Budget_Sum) / SUM(Budget_N) as avg_budget FROM rollups WHERE City = 'Toronto'",
+    'avg_budget': "SELECT SUM(Budget_Sum) / SUM(Budget_N) as avg_budget FROM rollups",
+    'completed_budget_vs_actual': "SELECT SUM(Budget_Sum) as total_budget, SUM(ActualCost_Sum) as total_actual FROM rollups WHERE ProjectStatus = 'Completed'",
+}
 
 
 def is_chart_request(question):
@@ -38,83 +89,113 @@ def is_chart_request(question):
     return any(keyword in question.lower() for keyword in chart_keywords)
 
 
-def create_chart_from_data(data, title, chart_type='bar'):
-    """Create a chart from SQL query results and return as base64."""
-    if not CHARTS_AVAILABLE:
-        return None
+def create_chart_from_data(data, title, chart_type='bar', chart_format='png'):
+    """Create a chart from SQL query results.
+
+    Returns {"chart": <base64 PNG>} or {"chart_spec": <Chart.js config>},
+    or None when nothing could be drawn.
+    """
+    if chart_format == 'spec':
+        spec = chart_spec(data, title, chart_type)
+        return {"chart_spec": spec} if spec else None
+    chart_b64 = chart_renderer.render(data, title, chart_type)
+    return {"chart": chart_b64} if chart_b64 else None
+
 
+def _enum_values(conn, rollup_column):
+    """Known values of a rollups key column, or None when there are too many to list."""
     try:
-        plt.figure(figsize=(12, 8))
-
-        # Extract data for chart
-        if isinstance(data, list) and len(data) > 0:
-            # Get the first row to determine structure
-            first_row = data[0]
-
-            if len(first_row) >= 3:  # Vendor, Budget, Actual pattern
-                vendors = [row[list(row.keys())[0]] for row in data]
-                budgets = [float(row[list(row.keys())[1]] or 0)
-                           for row in data]
-                actuals = [float(row[list(row.keys())[2]] or 0)
-                           for row in data]
-
-                x_pos = range(len(vendors))
-                width = 0.35
-
-                plt.bar([p - width/2 for p in x_pos], budgets, width,
-                        label='Budget', alpha=0.8, color='#3498db')
-                plt.bar([p + width/2 for p in x_pos], actuals, width,
-                        label='Actual Cost', alpha=0.8, color='#e74c3c')
-
-                plt.xlabel('Vendor')
-                plt.ylabel('Amount ($)')
-                plt.title(title)
-                plt.xticks(x_pos, vendors, rotation=45, ha='right')
-                plt.legend()
-
-                # Format y-axis as currency
-                ax = plt.gca()
-                ax.yaxis.set_major_formatter(
-                    plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-
-            elif len(first_row) == 2:  # Simple key-value pairs
-                keys = [row[list(row.keys())[0]] for row in data]
-                values = [float(row[list(row.keys())[1]] or 0) for row in data]
-
-                if chart_type == 'pie':
-                    plt.pie(values, labels=keys, autopct='%1.1f%%')
-                else:
-                    plt.bar(keys, values, color='#3498db', alpha=0.8)
-                    plt.xticks(rotation=45, ha='right')
+        values = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT {rollup_column} FROM rollups ORDER BY 1 LIMIT {MAX_ENUM_VALUES + 1}")]
+    except sqlite3.OperationalError:
+        return None  # A database built before the rollups existed
+    if len(values) > MAX_ENUM_VALUES:
+        return None
+    return values
+
+
+def build_schema_summary(conn):
+    """Builds a compact, prompt-ready description of the tables the LLM may query.
+
+    One line per table listing each column with its type, key and foreign
+    key, and the known values of categorical columns such as cities,
+    statuses and risk levels, so the LLM filters on values that exist.
+    """
+    lines = []
+    for table in SCHEMA_TABLES:
+        foreign_keys = {row[3]: f"{row[2]}.{row[4]}" for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+        columns = []
+        for _, name, col_type, _, _, primary_key in conn.execute(f"PRAGMA table_info({table})"):
+            if name in SCHEMA_HIDDEN_COLUMNS:
+                continue
+            column = f"{name} {col_type}"
+            if primary_key:
+                column += " PK"
+            if name in foreign_keys:
+                column += f" -> {foreign_keys[name]}"
+            rollup_column = SCHEMA_ENUM_COLUMNS.get((table, name))
+            values = _enum_values(conn, rollup_column) if rollup_column else None
+            if values:
+                # The rollups key unscored projects as 'N/A'; in the table they are NULL
+                listed = " | ".join(f"'{v}'" for v in values if v != 'N/A')
+                column += f" [{listed}{' | NULL' if 'N/A' in values else ''}]"
+            columns.append(column)
+        lines.append(f"{table}({', '.join(columns)})")
+    return "\n".join(lines)
+
+
+# db_path -> (file signature, version stamp, schema summary)
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
+
+def _schema_entry(db_path):
+    """Returns the cached (file signature, version stamp, schema summary) for a database.
+
+    Each call costs a stat of the database files. When they changed, the
+    version stamp is read and the summary rebuilt only if the stamp moved
+    or the file was replaced.
+    """
+    signature = file_signature(db_path)
+    cached = _schema_cache.get(db_path)
+    if cached is not None and cached[0] == signature:
+        return cached
 
-                plt.title(title)
+    with sqlite3.connect(db_path) as conn:
+        version = get_db_version(conn)
+        if cached is not None and cached[1] == version and cached[0][0] == signature[0]:
+            schema = cached[2]
+        else:
+            schema = build_schema_summary(conn)
+            print(f"Built the chatbot schema summary for database version {version}.")
+    entry = (signature, version, schema)
+    with _schema_cache_lock:
+        _schema_cache[db_path] = entry
+    return entry
 
-        plt.tight_layout()
 
-        # Convert to base64
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=150,
-                    bbox_inches='tight', facecolor='white')
-        buffer.seek(0)
-        chart_b64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
+def get_db_schema(db_path):
+    """Returns the prompt-ready schema summary for a database, cached per file."""
+    return _schema_entry(db_path)[2]
 
-        return chart_b64
 
-    except Exception as e:
-        print(f"Error creating chart: {e}")
-        plt.close()
-        return None
+def get_current_db_version(db_path):
+    """Returns the database version stamp, checked the same cheap way as the schema."""
+    return _schema_entry(db_path)[1]
 
 
-def get_db_schema(db_path):
-    """Reads the CREATE TABLE statements from the SQLite database."""
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT name, sql FROM sqlite_master WHERE type='table';")
-        schema_str = "\n".join([row[1] for row in cursor.fetchall()])
-    return schema_str
+_chatbot_cache = None
+_chatbot_cache_lock = threading.Lock()
+
+
+def get_chatbot_cache():
+    """Returns the question/answer cache, creating its database file on first use."""
+    global _chatbot_cache
+    if _chatbot_cache is None:
+        with _chatbot_cache_lock:
+            if _chatbot_cache is None:
+                _chatbot_cache = ChatbotCache()
+    return _chatbot_cache
 
 
 def generate_sql_from_question(schema, question):
@@ -123,7 +204,8 @@ def generate_sql_from_question(schema, question):
 You are an expert SQLite data analyst. Your task is to convert a user's natural language question into a valid SQLite query based on the database schema provided below.
 
 ### Database Schema:
-```sql
+Each line is table(column TYPE, ...). PK marks a primary key, -> a foreign key, and [...] the values a column holds.
+```
 {schema}
 ```
 
@@ -145,7 +227,8 @@ You are an expert SQLite data analyst. Your task is to convert a user's natural
 ### SQL Query (start with SELECT):
 """
     try:
-        response = model.generate_content(prompt)
+        response = get_llm().generate_content(
+            prompt, request_options={"timeout": LLM_TIMEOUT_SECONDS})
         sql_query = response.text.strip()
         # Clean up potential markdown formatting
         sql_query = re.sub(r"^```sql\n|```$", "", sql_query).strip()
@@ -156,20 +239,39 @@ You are an expert SQLite data analyst. Your task is to convert a user's natural
 
 
 def run_sql_query(db_path, query):
-    """Executes a SELECT query and returns the results."""
+    """Executes a SELECT query under the sql_guard limits.
+
+    Returns (results, truncated): at most MAX_RESULT_ROWS row dicts and
+    whether more rows were cut off, or ({"error": ...}, False).
+    """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            columns = [description[0] for description in cursor.description]
-            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        return results
+        # Read-only, so nothing the LLM writes can modify the data
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            columns, rows, truncated = run_guarded_query(conn, query, max_rows=MAX_RESULT_ROWS)
+        return [dict(zip(columns, row)) for row in rows], truncated
+    except QueryRejected as e:
+        print(f"Database query rejected: {e}")
+        return {"error": str(e)}, False
     except sqlite3.Error as e:
         print(f"Database query failed: {e}")
-        return {"error": str(e)}
+        return {"error": str(e)}, False
+
 
+def summarize_results(results, truncated=False):
+    """Shrinks a large result for the answer prompt: its size, column totals and the first rows."""
+    if isinstance(results, dict) or (len(results) <= PROMPT_ROWS and not truncated):
+        return results
+    numeric_columns = [column for column in results[0]
+                       if all(isinstance(row[column], (int, float)) or row[column] is None for row in results)]
+    return {
+        "row_count": f"more than {MAX_RESULT_ROWS}" if truncated else len(results),
+        "column_totals": {column: round(sum(row[column] or 0 for row in results), 2) for column in numeric_columns},
+        "totals_cover": f"the first {len(results)} rows only" if truncated else "all rows",
+        f"first_{PROMPT_ROWS}_rows": results[:PROMPT_ROWS],
+    }
 
-def generate_answer_from_result(question, sql_query, results):
+
+def generate_answer_from_result(question, sql_query, results, truncated=False):
     """Uses the LLM to generate a human-readable answer from the query results."""
     prompt = f"""
 You are a helpful assistant. Based on the user's original question and the data retrieved from the database, provide a concise, human-readable answer.
@@ -183,25 +285,25 @@ You are a helpful assistant. Based on the user's original question and the data
 ```
 
 ### Data:
-{results}
+{summarize_results(results, truncated)}
 
 ### Answer:
 """
     try:
-        response = model.generate_content(prompt)
+        response = get_llm().generate_content(
+            prompt, request_options={"timeout": LLM_TIMEOUT_SECONDS})
         return response.text.strip()
     except Exception as e:
         print(f"Error calling Gemini API for answer generation: {e}")
-        return "Sorry, I encountered an error while formulating the answer."
+        return ANSWER_ERROR_MESSAGE
 
 
-def ask_chatbot(question):
-    """Main orchestrator for the Text-to-SQL chatbot with chart generation."""
-    print(f"Received question: {question}")
-
-    # Check if this is a chart request
-    is_chart = is_chart_request(question)
+def plan_sql_query(question, is_chart):
+    """Generates and validates the SQL for a question.
 
+    Returns (sql_query, None), or (None, response) when no usable query
+    could be produced.
+    """
     # 1. Get Schema
     schema = get_db_schema(DB_FILE_PATH)
 
@@ -216,12 +318,12 @@ def ask_chatbot(question):
 
     sql_query = generate_sql_from_question(schema, enhanced_question)
     if not sql_query:
-        return {"answer": "Sorry, I couldn't generate an SQL query for your question.", "type": "text"}
+        return None, {"answer": "Sorry, I couldn't generate an SQL query for your question.", "type": "text"}
     print(f"Generated SQL: {sql_query}")
 
     # 3. Add fallback for chart requests
     if is_chart and 'vendor' in question.lower() and ('budget' in question.lower() or 'actual' in question.lower()):
-        sql_query = "SELECT v.VendorName, SUM(p.Budget) as Total_Budget, SUM(p.ActualCost) as Total_Actual FROM projects p JOIN vendors v ON p.VendorID = v.VendorID WHERE p.ProjectStatus = 'Completed' GROUP BY v.VendorName"
+        sql_query = VENDOR_BUDGET_CHART_SQL
         print(f"Using chart-specific SQL: {sql_query}")
 
     # 4. Validate SQL (Security Check)
@@ -229,46 +331,96 @@ def ask_chatbot(question):
         print(f"Validation failed: Invalid query generated: {sql_query}")
         # Try a simpler fallback approach for common questions
         if any(word in question.lower() for word in ['how many', 'count', 'total projects']):
-            sql_query = "SELECT COUNT(*) as project_count FROM projects"
+            sql_query = FALLBACK_QUERIES['project_count']
         elif 'high-risk' in question.lower() or 'high risk' in question.lower():
-            sql_query = "SELECT COUNT(*) as high_risk_count FROM projects WHERE PredictedRisk = 'High'"
+            sql_query = FALLBACK_QUERIES['high_risk_count']
         elif 'average budget' in question.lower():
             if 'toronto' in question.lower():
-                sql_query = "SELECT AVG(p.Budget) as avg_budget FROM projects p JOIN properties pr ON p.PropertyID = pr.PropertyID WHERE pr.City = 'Toronto'"
+                sql_query = FALLBACK_QUERIES['avg_budget_toronto']
             else:
-                sql_query = "SELECT AVG(Budget) as avg_budget FROM projects"
+                sql_query = FALLBACK_QUERIES['avg_budget']
         elif 'completed' in question.lower() and ('budget' in question.lower() or 'cost' in question.lower()):
-            sql_query = "SELECT SUM(Budget) as total_budget, SUM(ActualCost_CAD) as total_actual FROM projects WHERE ProjectStatus = 'Completed'"
+            sql_query = FALLBACK_QUERIES['completed_budget_vs_actual']
         else:
-            return {"answer": "I couldn't understand your question. Try asking about project counts, budgets, or risk levels.", "type": "text"}
+            return None, {"answer": "I couldn't understand your question. Try asking about project counts, budgets, or risk levels.", "type": "text"}
 
         print(f"Using fallback SQL: {sql_query}")
 
     # Validate the fallback query
     if not re.match(r"^\s*SELECT", sql_query, re.IGNORECASE):
-        return {"answer": "I can only process read-only (SELECT) queries.", "type": "text"}
+        return None, {"answer": "I can only process read-only (SELECT) queries.", "type": "text"}
+
+    return sql_query, None
+
+
+def ask_chatbot(question, chart_format='png'):
+    """Main orchestrator for the Text-to-SQL chatbot with chart generation.
+
+    Generated SQL is cached per normalized question, and final responses
+    per (SQL, database version), so a repeated question skips both LLM calls.
+    Charts are drawn per request in `chart_format` ('png' or 'spec') from
+    the cached rows, so the answer cache never stores images.
+    """
+    print(f"Received question: {question}")
+    cache = get_chatbot_cache()
+
+    # Check if this is a chart request
+    is_chart = is_chart_request(question)
+    chart_title = f"Chart: {question}"
+
+    # 1-4. Reuse the SQL generated for the same question, or generate and validate it
+    normalized_question = normalize_question(question)
+    sql_query = cache.get_sql(normalized_question)
+    sql_cached = sql_query is not None
+    if sql_cached:
+        print(f"Using cached SQL: {sql_query}")
+    else:
+        sql_query, response = plan_sql_query(question, is_chart)
+        if response is not None:
+            return response
+
+    # Reuse the answer for the same query on unchanged data
+    db_version = get_current_db_version(DB_FILE_PATH)
+    response = cache.get_answer(sql_query, db_version, is_chart)
+    if response is not None:
+        print("Using cached answer.")
+        if response["type"] == "chart":
+            chart = create_chart_from_data(response["results"], chart_title, 'bar', chart_format)
+            response.update(chart or {})
+        return response
 
     # 5. Execute SQL
-    results = run_sql_query(DB_FILE_PATH, sql_query)
-    print(f"Query results: {results}")
+    results, truncated = run_sql_query(DB_FILE_PATH, sql_query)
+    print(f"Query results: {summarize_results(results, truncated)}")
+    if isinstance(results, dict):
+        # A failed query is neither cached nor worth reusing
+        return {"answer": generate_answer_from_result(question, sql_query, results, truncated), "type": "text"}
+    if not sql_cached:
+        cache.put_sql(normalized_question, sql_query)
 
     # 6. Handle chart generation
-    if is_chart and results and not isinstance(results, dict):
-        chart_b64 = create_chart_from_data(
-            results, f"Chart: {question}", 'bar')
-        if chart_b64:
+    response = None
+    chart = None
+    if is_chart and results:
+        chart = create_chart_from_data(results, chart_title, 'bar', chart_format)
+        if chart:
             text_answer = generate_answer_from_result(
-                question, sql_query, results)
-            return {
+                question, sql_query, results, truncated)
+            response = {
                 "type": "chart",
                 "answer": text_answer,
-                "chart": chart_b64,
                 "sql_query": sql_query,
                 "results": results
             }
 
     # 7. Generate text answer (fallback or non-chart requests)
-    final_answer = generate_answer_from_result(question, sql_query, results)
-    print(f"Final answer: {final_answer}")
-
-    return {"answer": final_answer, "type": "text"}
+    if response is None:
+        final_answer = generate_answer_from_result(question, sql_query, results, truncated)
+        print(f"Final answer: {final_answer}")
+        response = {"answer": final_answer, "type": "text"}
+
+    if response["answer"] != ANSWER_ERROR_MESSAGE:
+        cache.put_answer(sql_query, db_version, is_chart, response)
+    if chart:
+        response.update(chart)
+    return response
@@ -0,0 +1,161 @@
+import sqlite3
+import importlib
+import itertools
+import re
+import sys
+
+from sql_guard import table_aliases
+
+# --- Configuration ---
+DB_FILE_PATH = 'lighthouse.db'
+
+# Sample values for the /api/projects filters; plans do not depend on the exact value
+SAMPLE_FILTER_VALUES = {
+    'ProjectStatus': 'In Progress',
+    'City': 'Toronto',
+    'ProjectType': 'Roof Repair',
+    'PredictedRisk': 'High',
+}
+
+# A plan line like "SCAN p" or "SCAN p USING COVERING INDEX ..." reads a whole table or index
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (\S+)')
+# Scans of intermediate results rather than stored tables; the tables inside them get plan lines of their own
+SUBQUERY_SCAN_PATTERN = re.compile(r'^\((?:subquery|join)-\d+\)$')
+CONSTANT_ROW = 'CONSTANT'  # "SCAN CONSTANT ROW"
+# Derived tables: "FROM (SELECT ...) d", "JOIN (...) AS d", and CTEs ("WITH d AS (", ", d AS (")
+DERIVED_TABLE_START = re.compile(r'\b(?:FROM|JOIN)\s*\(', re.IGNORECASE)
+DERIVED_TABLE_ALIAS = re.compile(r'\s*(?:AS\s+)?(\w+)', re.IGNORECASE)
+CTE_NAME_PATTERN = re.compile(r'(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s+AS\s*\(', re.IGNORECASE)
+
+# Scanning a table with one row per contractor is the cheapest way to drive a
+# per-vendor join, and the rollup tables hold one row per (changed) group by
+# design, so none of them is treated as a fallback
+SMALL_DIMENSION_TABLES = {'vendors', 'rollups', 'rollup_dirty', 'vendor_months', 'vendor_months_dirty'}
+
+
+def collect_shipped_queries():
+    """Returns (name, sql, params, full_read) for every query the backend ships.
+
+    `full_read` marks queries that return or aggregate every project by design
+    (e.g. the unfiltered project list, model training); a scan is expected there.
+    """
+    app = importlib.import_module('4_app')
+    model = importlib.import_module('3_enhanced_prediction_model')
+    rollups = importlib.import_module('rollups')
+    chatbot_service = importlib.import_module('chatbot_service')
+    contractor_analysis = importlib.import_module('contractor_analysis')
+    vendor_stats = importlib.import_module('vendor_stats')
+
+    queries = []
+
+    # /api/projects with every filter combination
+    filter_names = list(app.PROJECT_FILTERS)
+    for size in range(len(filter_names) + 1):
+        for combo in itertools.combinations(filter_names, size):
+            sql, params = app.build_projects_query({name: SAMPLE_FILTER_VALUES[name] for name in combo})
+            label = '+'.join(combo) if combo else 'unfiltered'
+            queries.append((f"/api/projects [{label}]", sql, params, not combo))
+
+    # A later keyset page of a filtered, sorted listing
+    sql, params = app.build_projects_query(
+        {'ProjectStatus': SAMPLE_FILTER_VALUES['ProjectStatus']}, fields=['ProjectID', 'Budget'],
+        sort='Budget', descending=True, limit=50, cursor=app.encode_cursor(1000000.0, 'CAP-500'))
+    queries.append(("/api/projects [ProjectStatus page, sort Budget]", sql, params, False))
+
+    # /api/dashboard-analytics reads only the rollups
+    for filters in ({}, {'ProjectStatus': SAMPLE_FILTER_VALUES['ProjectStatus']}, {'City': SAMPLE_FILTER_VALUES['City']}):
+        label = '+'.join(filters) if filters else 'unfiltered'
+        for series, (sql, params) in app.build_dashboard_queries(filters).items():
+            queries.append((f"/api/dashboard-analytics {series} [{label}]", sql, params, False))
+
+    # /api/contractors/performance reads the rollups, or projects in a StartDate window
+    for label, filters, window in (('unfiltered', {}, {}), ('City', {'City': SAMPLE_FILTER_VALUES['City']}, {}),
+                                   ('date window', {}, {'start_date': '2023-01-01', 'end_date': '2023-03-31'}),
+                                   ('City+date window', {'City': SAMPLE_FILTER_VALUES['City']},
+                                    {'start_date': '2023-01-01', 'end_date': '2023-03-31'})):
+        sql, params, _ = contractor_analysis.performance_sql(filters, **window)
+        queries.append((f"/api/contractors/performance [{label}]", sql, params, False))
+
+    # /api/contractors/trends combines vendor/month buckets only
+    for period in vendor_stats.PERIODS:
+        sql, params = vendor_stats.rolling_sql(period, 3, ['Apex Construction'], '2023-01', '2023-12')
+        queries.append((f"/api/contractors/trends [{period}]", sql, params, False))
+
+    queries.append(("model loader", model.PROJECTS_QUERY, {}, True))
+    queries.append(("rollups: full rebuild", rollups.refresh_sql(full=True), {}, True))
+    queries.append(("rollups: incremental refresh", rollups.refresh_sql(), {}, False))
+    queries.append(("vendor stats: full rebuild", vendor_stats.refresh_sql(full=True), {}, True))
+    queries.append(("vendor stats: incremental refresh", vendor_stats.refresh_sql(), {}, False))
+    queries.append(("chatbot: vendor budget chart", chatbot_service.VENDOR_BUDGET_CHART_SQL, {}, False))
+    for name, sql in chatbot_service.FALLBACK_QUERIES.items():
+        # Portfolio-wide counts/averages have no filter to search on
+        queries.append((f"chatbot fallback: {name}", sql, {}, 'WHERE' not in sql))
+
+    return queries
+
+
+def derived_table_names(sql):
+    """Names given to subqueries in FROM/JOIN and to CTEs; scanning them reads no stored table."""
+    names = set(CTE_NAME_PATTERN.findall(sql))
+    for match in DERIVED_TABLE_START.finditer(sql):
+        depth = 1
+        position = match.end()
+        while depth and position < len(sql):
+            depth += {'(': 1, ')': -1}.get(sql[position], 0)
+            position += 1
+        alias = DERIVED_TABLE_ALIAS.match(sql, position)
+        if alias:
+            names.add(alias.group(1))
+    return names
+
+
+def find_full_scans(conn, sql, params):
+    """Runs EXPLAIN QUERY PLAN and returns the plan lines that scan a whole table or index.
+
+    Scan targets resolve through the query's aliases or the stored table
+    names. Only subqueries, CTEs and constant rows are exempt by name; any
+    other target that cannot be resolved is reported, so the check fails closed.
+    """
+    aliases = table_aliases(sql)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    derived = derived_table_names(sql)
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        match = FULL_SCAN_PATTERN.match(detail)
+        if not match:
+            continue
+        target = match.group(1)
+        table = aliases.get(target, target if target in tables else None)
+        if table is None:
+            if target == CONSTANT_ROW or SUBQUERY_SCAN_PATTERN.match(target) or target in derived:
+                continue
+            scans.append(f"{detail} (unresolved scan target)")
+        elif table not in SMALL_DIMENSION_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(db_path):
+    """Checks every shipped query and returns the number of unexpected full scans."""
+    failures = 0
+    with sqlite3.connect(db_path) as conn:
+        for name, sql, params, full_read in collect_shipped_queries():
+            scans = find_full_scans(conn, sql, params)
+            if scans and not full_read:
+                failures += 1
+                print(f"FAIL  {name}: {'; '.join(scans)}")
+            else:
+                status = "ok (full read)" if full_read else "ok"
+                print(f"{status:<15} {name}")
+    return failures
+
+
+# --- Main Execution ---
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE_PATH
+    failures = check_query_plans(db_path)
+    if failures:
+        print(f"{failures} shipped queries fall back to a full table scan.")
+        sys.exit(1)
+    print("All filtered queries use an index.")
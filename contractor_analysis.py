@@ -1,121 +1,251 @@
-import pandas as pd
 import sqlite3
-import numpy as np
+from datetime import datetime
+
+from rollups import sample_std
+from vendor_stats import read_rolling_stats
 
 # --- Configuration ---
 DB_FILE_PATH = 'lighthouse.db'
 
+STATUS_CLASSES = {
+    'completed': ['Completed'],
+    'ongoing': ['In Progress', 'Not Started'],
+}
+
+# (status class, measure, statistics) summed per contractor. Every metric
+# below is derived from these, so the whole report is one aggregation pass.
+PERFORMANCE_AGGREGATES = [
+    ('completed', 'Budget', ['n', 'sum']),
+    ('completed', 'ActualCost', ['n', 'sum']),
+    ('completed', 'BudgetVariance_CAD', ['n', 'sum', 'sumsq']),
+    ('completed', 'ScheduleVariance_Days', ['n', 'sum', 'sumsq']),
+    ('ongoing', 'PredictedCost', ['n', 'sum', 'min', 'max']),
+    ('ongoing', 'PredictedDuration_Days', ['n', 'sum']),
+    ('ongoing', 'RiskScore', ['n', 'sum']),
+]
+AGGREGATE_FUNCTIONS = {'n': 'SUM', 'sum': 'SUM', 'sumsq': 'SUM', 'min': 'MIN', 'max': 'MAX'}
+
+# Where the per-contractor totals are read from. The rollups already hold
+# them per vendor, city, type and status; project rows are only read when a
+# date window is given, since the rollups have no date dimension.
+ROLLUP_SOURCE = {
+    'from': "rollups",
+    'vendor': "Vendor",
+    'status': "ProjectStatus",
+    'filters': {'City': "City", 'ProjectType': "ProjectType"},
+    'n': "{m}_N", 'sum': "{m}_Sum", 'sumsq': "{m}_SumSq", 'min': "{m}_Min", 'max': "{m}_Max",
+}
+PROJECT_SOURCE = {
+    'from': "projects p JOIN vendors v ON p.VendorID = v.VendorID JOIN properties prop ON p.PropertyID = prop.PropertyID",
+    'vendor': "v.VendorName",
+    'status': "p.ProjectStatus",
+    'filters': {'City': "prop.City", 'ProjectType': "p.ProjectType"},
+    'n': "(p.{m} IS NOT NULL)", 'sum': "p.{m}", 'sumsq': "p.{m} * p.{m}", 'min': "p.{m}", 'max': "p.{m}",
+}
+PERFORMANCE_FILTERS = list(ROLLUP_SOURCE['filters'])
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def performance_sql(filters=None, start_date=None, end_date=None):
+    """Builds the one query behind contractor_performance; returns (sql, params, source name).
+
+    `filters` maps City/ProjectType to a value or a list of values. The
+    date window (inclusive, YYYY-MM-DD) applies to the project StartDate.
+    """
+    by_date = start_date is not None or end_date is not None
+    source = PROJECT_SOURCE if by_date else ROLLUP_SOURCE
+
+    columns = []
+    for status_class, measure, statistics in PERFORMANCE_AGGREGATES:
+        statuses = ", ".join(f"'{status}'" for status in STATUS_CLASSES[status_class])
+        for statistic in statistics:
+            value = source[statistic].format(m=measure)
+            columns.append(f"{AGGREGATE_FUNCTIONS[statistic]}(CASE WHEN {source['status']} IN ({statuses}) "
+                           f"THEN {value} END) AS {status_class}_{measure}_{statistic}")
+
+    conditions = []
+    params = []
+    for key, value in (filters or {}).items():
+        if key not in source['filters']:
+            raise ValueError(f"Contractor performance cannot be filtered on '{key}'.")
+        values = value if isinstance(value, (list, tuple)) else [value]
+        conditions.append(f"{source['filters'][key]} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    for bound, comparison in ((start_date, ">= ?"), (end_date, "< date(?, '+1 day')")):
+        if bound is not None:
+            try:
+                datetime.strptime(bound, DATE_FORMAT)
+            except ValueError:
+                raise ValueError(f"Dates must be formatted as YYYY-MM-DD, not '{bound}'.")
+            conditions.append(f"p.StartDate {comparison}")
+            params.append(bound)
+
+    sql = f"SELECT {source['vendor']} AS Contractor, {', '.join(columns)} FROM {source['from']}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" GROUP BY {source['vendor']} ORDER BY {source['vendor']}"
+    return sql, params, 'projects' if by_date else 'rollups'
+
+
+def _mean(total, n):
+    return total / n if n else None
+
+
+def _round(value, digits):
+    return round(value, digits) if value is not None else None
+
+
+def risk_band(score):
+    """HIGH / MEDIUM / LOW for an average risk score."""
+    if score is None:
+        return None
+    return "HIGH" if score > 0.7 else "MEDIUM" if score > 0.4 else "LOW"
 
-def analyze_contractor_performance():
+
+def contractor_metrics(totals):
+    """Turns one contractor's aggregated totals into the cost, schedule and prediction metrics."""
+    avg_budget = _mean(totals['completed_Budget_sum'], totals['completed_Budget_n'])
+    avg_actual_cost = _mean(totals['completed_ActualCost_sum'], totals['completed_ActualCost_n'])
+    variance = [totals[f'completed_BudgetVariance_CAD_{s}'] for s in ('n', 'sum', 'sumsq')]
+    avg_variance = _mean(variance[1], variance[0])
+    std_variance = sample_std(*variance)
+    schedule = [totals[f'completed_ScheduleVariance_Days_{s}'] for s in ('n', 'sum', 'sumsq')]
+    overrun_rate = None
+    if avg_budget and avg_actual_cost is not None:
+        overrun_rate = (avg_actual_cost - avg_budget) / avg_budget * 100
+    cv = None
+    if avg_variance is not None:
+        cv = std_variance / abs(avg_variance) if std_variance is not None and avg_variance else 0.0
+
+    avg_risk = _mean(totals['ongoing_RiskScore_sum'], totals['ongoing_RiskScore_n'])
+    return {
+        'contractor': totals['Contractor'],
+        'completed': {
+            'projects': totals['completed_Budget_n'] or 0,
+            'avg_budget': _round(avg_budget, 2),
+            'avg_actual_cost': _round(avg_actual_cost, 2),
+            'avg_budget_variance': _round(avg_variance, 2),
+            'std_budget_variance': _round(std_variance, 2),
+            'budget_variance_cv': _round(cv, 3),
+            'cost_overrun_rate': _round(overrun_rate, 1),
+            'avg_schedule_variance_days': _round(_mean(schedule[1], schedule[0]), 1),
+            'std_schedule_variance_days': _round(sample_std(*schedule), 1),
+        },
+        # Ongoing projects without a prediction yet are left out
+        'ongoing': {
+            'projects': totals['ongoing_PredictedCost_n'] or 0,
+            'avg_predicted_cost': _round(_mean(totals['ongoing_PredictedCost_sum'], totals['ongoing_PredictedCost_n']), 2),
+            'min_predicted_cost': _round(totals['ongoing_PredictedCost_min'], 2),
+            'max_predicted_cost': _round(totals['ongoing_PredictedCost_max'], 2),
+            'avg_predicted_duration_days': _round(_mean(totals['ongoing_PredictedDuration_Days_sum'],
+                                                        totals['ongoing_PredictedDuration_Days_n']), 1),
+            'avg_risk_score': _round(avg_risk, 3),
+            'risk_level': risk_band(avg_risk),
+        },
+    }
+
+
+def contractor_performance(conn, filters=None, start_date=None, end_date=None):
+    """Per-contractor cost, schedule and prediction metrics from a single aggregate query.
+
+    Returns {'contractors': [...], 'source': 'rollups' or 'projects'}, one
+    entry per contractor with 'completed' and 'ongoing' metrics. Raises
+    ValueError for an unknown filter or a malformed date.
+    """
+    sql, params, source = performance_sql(filters, start_date, end_date)
+    cursor = conn.execute(sql, params)
+    columns = [description[0] for description in cursor.description]
+    contractors = [contractor_metrics(dict(zip(columns, row))) for row in cursor]
+    return {'contractors': contractors, 'source': source}
+
+
+def contractor_trends(conn, period='month', window=3, vendors=None, start=None, end=None):
+    """Rolling cost-overrun and schedule-slip statistics per contractor over time.
+
+    Each period's figures cover it and the `window - 1` periods before it,
+    combined from the vendor/month buckets kept by the pipeline. Returns
+    {'period', 'window', 'contractors': [{'contractor', 'series': [...]}]}.
+    Raises ValueError for an unknown period or a bad window or month.
+    """
+    contractors = []
+    for stats in read_rolling_stats(conn, period, window, vendors, start, end):
+        if not contractors or contractors[-1]['contractor'] != stats['Vendor']:
+            contractors.append({'contractor': stats['Vendor'], 'series': []})
+        contractors[-1]['series'].append({
+            'period': stats['Period'],
+            'completed_projects': stats['ProjectCount'],
+            'window_projects': stats['WindowProjectCount'],
+            'avg_budget_variance': _round(stats['BudgetVariance_CAD_Mean'], 2),
+            'std_budget_variance': _round(stats['BudgetVariance_CAD_Std'], 2),
+            'avg_schedule_variance_days': _round(stats['ScheduleVariance_Days_Mean'], 1),
+            'std_schedule_variance_days': _round(stats['ScheduleVariance_Days_Std'], 1),
+        })
+    return {'period': period, 'window': window, 'contractors': contractors}
+
+
+def _money(value):
+    return f"${value:,.0f}" if value is not None else "n/a"
+
+
+def analyze_contractor_performance(filters=None, start_date=None, end_date=None):
     """Analyze contractor performance metrics to show why contractor is a key prediction factor."""
     print("=== CONTRACTOR PERFORMANCE ANALYSIS ===")
     print("Analyzing why contractor is a key identifier for predictions...\n")
 
     with sqlite3.connect(DB_FILE_PATH) as conn:
-        # Load completed projects with contractor info
-        query = '''
-            SELECT p.ProjectID, p.ProjectType, p.Budget, p.ActualCost, 
-                   p.ScheduleVariance_Days, p.BudgetVariance_CAD,
-                   p.PredictedCost, p.PredictedDuration_Days,
-                   v.VendorName as Contractor, prop.City
-            FROM projects p
-            JOIN properties prop ON p.PropertyID = prop.PropertyID
-            JOIN vendors v ON p.VendorID = v.VendorID
-            WHERE p.ProjectStatus = 'Completed'
-        '''
-        completed_df = pd.read_sql_query(query, conn)
-
-        # Load ongoing projects with predictions
-        query_ongoing = '''
-            SELECT p.ProjectID, p.ProjectType, p.Budget, 
-                   p.PredictedCost, p.PredictedDuration_Days, p.RiskScore,
-                   v.VendorName as Contractor, prop.City
-            FROM projects p
-            JOIN properties prop ON p.PropertyID = prop.PropertyID
-            JOIN vendors v ON p.VendorID = v.VendorID
-            WHERE p.ProjectStatus IN ('In Progress', 'Not Started')
-            AND p.PredictedCost IS NOT NULL
-        '''
-        ongoing_df = pd.read_sql_query(query_ongoing, conn)
+        contractors = contractor_performance(conn, filters, start_date, end_date)['contractors']
 
     print("📊 CONTRACTOR COST PERFORMANCE (Completed Projects)")
     print("=" * 60)
-    cost_analysis = completed_df.groupby('Contractor').agg({
-        'Budget': ['count', 'mean'],
-        'ActualCost': 'mean',
-        'BudgetVariance_CAD': ['mean', 'std']
-    }).round(2)
-
-    # Flatten column names
-    cost_analysis.columns = ['Projects', 'Avg_Budget',
-                             'Avg_Actual_Cost', 'Avg_Budget_Variance', 'Std_Budget_Variance']
-    cost_analysis['Cost_Overrun_Rate'] = (
-        (cost_analysis['Avg_Actual_Cost'] - cost_analysis['Avg_Budget']) / cost_analysis['Avg_Budget'] * 100).round(1)
-
-    print(cost_analysis)
+    for c in contractors:
+        m = c['completed']
+        print(f"{c['contractor']:<22} {m['projects']:>6} projects  avg budget {_money(m['avg_budget'])}  "
+              f"avg actual {_money(m['avg_actual_cost'])}  variance {_money(m['avg_budget_variance'])} "
+              f"(std {_money(m['std_budget_variance'])}, CV {m['budget_variance_cv']})")
     print()
 
     print("⏱️ CONTRACTOR SCHEDULE PERFORMANCE (Completed Projects)")
     print("=" * 60)
-    schedule_analysis = completed_df.groupby('Contractor').agg({
-        'ScheduleVariance_Days': ['mean', 'std']
-    }).round(1)
-    schedule_analysis.columns = [
-        'Avg_Schedule_Variance_Days', 'Std_Schedule_Variance_Days']
-
-    print(schedule_analysis)
+    for c in contractors:
+        m = c['completed']
+        print(f"{c['contractor']:<22} avg {m['avg_schedule_variance_days']} days "
+              f"(std {m['std_schedule_variance_days']})")
     print()
 
     print("🔮 CURRENT PREDICTIONS BY CONTRACTOR (Ongoing Projects)")
     print("=" * 60)
-    prediction_analysis = ongoing_df.groupby('Contractor').agg({
-        'PredictedCost': 'mean',
-        'PredictedDuration_Days': 'mean',
-        'RiskScore': 'mean',
-        'ProjectID': 'count'
-    }).round(2)
-    prediction_analysis.columns = [
-        'Avg_Predicted_Cost', 'Avg_Predicted_Duration', 'Avg_Risk_Score', 'Ongoing_Projects']
-
-    print(prediction_analysis)
+    for c in contractors:
+        m = c['ongoing']
+        print(f"{c['contractor']:<22} {m['projects']:>6} projects  avg cost {_money(m['avg_predicted_cost'])}  "
+              f"avg duration {m['avg_predicted_duration_days']} days  avg risk {m['avg_risk_score']}")
     print()
 
     print("🎯 WHY CONTRACTOR IS A KEY PREDICTION FACTOR:")
     print("=" * 50)
 
-    # Calculate coefficient of variation for costs by contractor
-    cost_cv = completed_df.groupby('Contractor')[
-        'BudgetVariance_CAD'].agg(['mean', 'std'])
-    cost_cv['CV'] = (cost_cv['std'] / abs(cost_cv['mean'])).fillna(0)
-
     print(f"1. COST VARIANCE BY CONTRACTOR:")
-    for contractor in cost_cv.index:
-        variance = cost_analysis.loc[contractor, 'Avg_Budget_Variance']
-        overrun = cost_analysis.loc[contractor, 'Cost_Overrun_Rate']
-        print(
-            f"   • {contractor}: Avg variance ${variance:,.0f} ({overrun:+.1f}%)")
+    for c in contractors:
+        m = c['completed']
+        if m['avg_budget_variance'] is not None:
+            print(f"   • {c['contractor']}: Avg variance ${m['avg_budget_variance']:,.0f} ({m['cost_overrun_rate']:+.1f}%)")
 
     print(f"\n2. SCHEDULE VARIANCE BY CONTRACTOR:")
-    for contractor in schedule_analysis.index:
-        variance = schedule_analysis.loc[contractor,
-                                         'Avg_Schedule_Variance_Days']
-        print(f"   • {contractor}: Avg {variance:+.1f} days from planned")
+    for c in contractors:
+        variance = c['completed']['avg_schedule_variance_days']
+        if variance is not None:
+            print(f"   • {c['contractor']}: Avg {variance:+.1f} days from planned")
 
     print(f"\n3. PREDICTION DIFFERENCES:")
-    pred_range = ongoing_df.groupby(
-        'Contractor')['PredictedCost'].agg(['min', 'max'])
-    for contractor in pred_range.index:
-        min_cost = pred_range.loc[contractor, 'min']
-        max_cost = pred_range.loc[contractor, 'max']
-        print(
-            f"   • {contractor}: Predicted costs range ${min_cost:,.0f} - ${max_cost:,.0f}")
+    for c in contractors:
+        m = c['ongoing']
+        if m['projects']:
+            print(f"   • {c['contractor']}: Predicted costs range ${m['min_predicted_cost']:,.0f} - ${m['max_predicted_cost']:,.0f}")
 
     print(f"\n4. RISK PROFILE BY CONTRACTOR:")
-    risk_profile = ongoing_df.groupby('Contractor')['RiskScore'].mean()
-    for contractor in risk_profile.index:
-        risk = risk_profile[contractor]
-        risk_level = "HIGH" if risk > 0.7 else "MEDIUM" if risk > 0.4 else "LOW"
-        print(f"   • {contractor}: Avg risk score {risk:.3f} ({risk_level})")
+    for c in contractors:
+        m = c['ongoing']
+        if m['avg_risk_score'] is not None:
+            print(f"   • {c['contractor']}: Avg risk score {m['avg_risk_score']:.3f} ({m['risk_level']})")
 
     print(f"\n💡 CONCLUSION:")
     print("   Contractors show significantly different patterns in:")
@@ -0,0 +1,65 @@
+import os
+import time
+
+# The database version stamp lives in SQLite's `user_version` header field,
+# so it is read without touching any table. Every pipeline step that changes
+# what the API serves bumps it in its own statement right after committing
+# its data, and anything cached from the database keys on it. A reader that
+# sees the new stamp therefore also sees the new data; one that reads the
+# old stamp just before a bump may cache new data under the old stamp,
+# which is never asked for again once the bump lands.
+
+# --- Configuration ---
+VERSION_RECHECK_SECONDS = 1.0
+
+
+def get_db_version(conn):
+    """Returns the database version stamp (0 for a database that was never stamped)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def bump_db_version(conn):
+    """Advances the version stamp after a pipeline write and returns the new version."""
+    version = get_db_version(conn) + 1
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    print(f"Database version is now {version}.")
+    return version
+
+
+def file_signature(db_path):
+    """The database file's inode and mtime, plus its WAL file's mtime, where writes land first."""
+    stat = os.stat(db_path)
+    try:
+        wal_mtime = os.stat(db_path + '-wal').st_mtime_ns
+    except FileNotFoundError:
+        wal_mtime = None
+    return (stat.st_ino, stat.st_mtime_ns, wal_mtime)
+
+
+class VersionWatcher:
+    """Keeps a database's version stamp in process memory.
+
+    `version()` costs a stat of the database files. SQLite is only asked
+    again when they changed, or once `recheck_seconds` have passed, since
+    two writes can land within one tick of the file system's mtime.
+    `connection` is a context manager factory, e.g. a pool's `connection`.
+    """
+
+    def __init__(self, db_path, connection, recheck_seconds=VERSION_RECHECK_SECONDS):
+        self.db_path = db_path
+        self._connection = connection
+        self.recheck_seconds = recheck_seconds
+        self._state = None  # (file signature, checked at, version), replaced as a whole
+
+    def version(self):
+        signature = file_signature(self.db_path)
+        now = time.monotonic()
+        state = self._state
+        if state is not None and state[0] == signature and now - state[1] < self.recheck_seconds:
+            return state[2]
+        # The signature is taken first, so a write racing this read is seen on the next call
+        with self._connection() as conn:
+            version = get_db_version(conn)
+        self._state = (signature, now, version)
+        return version
@@ -0,0 +1,26 @@
+import time
+from types import SimpleNamespace
+
+# --- Configuration ---
+FAKE_LATENCY_SECONDS = 1.0  # Roughly one Gemini round trip
+FAKE_SQL = "SELECT COALESCE(SUM(ProjectCount), 0) as project_count FROM rollups"
+
+
+class FakeLLM:
+    """An offline stand-in for the Gemini model, for load tests without an API key.
+
+    `generate_content` sleeps for a fixed latency (releasing the GIL, like a
+    network call) and answers SQL prompts with a cheap canned query and
+    answer prompts with a short canned sentence.
+    """
+
+    def __init__(self, latency_seconds=FAKE_LATENCY_SECONDS):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.latency_seconds)
+        self.calls += 1
+        if '### SQL Query' in prompt:
+            return SimpleNamespace(text=FAKE_SQL)
+        return SimpleNamespace(text="This is a canned answer from the fake LLM.")
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
-import { getProjects } from './services/api';
+import { getProjects, getDashboardAnalytics } from './services/api';
 import Dashboard from './components/Dashboard';
 import Filters from './components/Filters';
 import ProjectTable from './components/ProjectTable';
@@ -9,6 +9,7 @@ import './App.css';
 
 function App() {
   const [projects, setProjects] = useState([]);
+  const [analytics, setAnalytics] = useState(null);
   const [loading, setLoading] = useState(true);
   const [filters, setFilters] = useState({});
   const [sortConfig, setSortConfig] = useState({ key: 'Budget', direction: 'descending' });
@@ -23,12 +24,18 @@ function App() {
     setLoading(false);
   }, []);
 
+  const fetchAnalytics = useCallback(async (appliedFilters) => {
+    const data = await getDashboardAnalytics(appliedFilters);
+    setAnalytics(data);
+  }, []);
+
   useEffect(() => {
     const appliedFilters = Object.fromEntries(
       Object.entries(filters).filter(([_, value]) => value !== '')
     );
     fetchProjects(appliedFilters);
-  }, [filters, fetchProjects]);
+    fetchAnalytics(appliedFilters);
+  }, [filters, fetchProjects, fetchAnalytics]);
 
   const handleFilterChange = (name, value) => {
     setFilters(prevFilters => ({
@@ -77,7 +84,7 @@ function App() {
         <h1 className="App-title">Project Lighthouse</h1>
       </header>
       <main className="container-fluid p-4">
-        <Dashboard projects={projects} />
+        <Dashboard analytics={analytics} />
         <div className="card mt-4">
           <div className="card-body">
             <h5 className="card-title">All Projects</h5>
@@ -1,7 +1,23 @@
 import React, { useState, useRef, useEffect } from 'react';
+import {
+  Chart as ChartJS,
+  ArcElement,
+  BarController,
+  BarElement,
+  CategoryScale,
+  Legend,
+  LinearScale,
+  PieController,
+  Title,
+  Tooltip,
+} from 'chart.js';
+import { Chart } from 'react-chartjs-2';
 import { askChatbot } from '../services/api';
 import './Chatbot.css';
 
+// The generic <Chart> needs the controllers for every chart type the API can return
+ChartJS.register(ArcElement, BarController, BarElement, CategoryScale, Legend, LinearScale, PieController, Title, Tooltip);
+
 const Chatbot = ({ isVisible, onClose }) => {
   const [messages, setMessages] = useState([
     { 
@@ -91,7 +107,12 @@ const Chatbot = ({ isVisible, onClose }) => {
                 ))}
               </div>
               
-              {/* Display chart if present */}
+              {/* Display chart if present: a Chart.js config, or a server-rendered image */}
+              {msg.chartSpec && (
+                <div className="chart-container mt-2">
+                  <Chart type={msg.chartSpec.type} data={msg.chartSpec.data} options={msg.chartSpec.options} />
+                </div>
+              )}
               {msg.chart && (
                 <div className="chart-container mt-2">
                   <img 
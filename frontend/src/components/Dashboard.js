@@ -69,12 +69,18 @@ const BudgetVsActualChart = ({ data }) => {
 };
 
 
-const Dashboard = ({ projects }) => {
-  // --- Process Data for KPIs and Charts ---
-  const totalProjects = projects.length;
-  const highRiskProjects = projects.filter(p => p.PredictedRisk === 'High').length;
-  const totalBudget = projects.reduce((acc, p) => acc + (p.Budget || 0), 0);
-  const totalBudgetVariance = projects.filter(p => p.ProjectStatus === 'Completed' && p.BudgetVariance_CAD).reduce((acc, p) => acc + p.BudgetVariance_CAD, 0);
+const Dashboard = ({ analytics }) => {
+  if (!analytics) {
+    return <p className="loading-text">Loading Dashboard...</p>;
+  }
+
+  // --- KPIs and chart series are aggregated by /api/dashboard-analytics ---
+  const {
+    total_projects: totalProjects,
+    high_risk_projects: highRiskProjects,
+    total_budget: totalBudget,
+    total_budget_variance: totalBudgetVariance,
+  } = analytics.kpis;
 
   const formatCurrency = (num) => {
     if (Math.abs(num) >= 1_000_000) return `$${(num / 1_000_000).toFixed(2)}M`;
@@ -82,65 +88,32 @@ const Dashboard = ({ projects }) => {
     return `$${num}`;
   };
 
-  const riskCounts = projects.reduce((acc, p) => {
-    const risk = p.PredictedRisk || 'N/A';
-    acc[risk] = (acc[risk] || 0) + 1;
-    return acc;
-  }, {});
-
   const riskChartData = {
-    labels: Object.keys(riskCounts),
+    labels: analytics.risk_distribution.map(r => r.risk),
     datasets: [{
       label: '# of Projects',
-      data: Object.values(riskCounts),
+      data: analytics.risk_distribution.map(r => r.count),
       backgroundColor: ['rgba(255, 99, 132, 0.5)', 'rgba(255, 206, 86, 0.5)', 'rgba(75, 192, 192, 0.5)', 'rgba(153, 102, 255, 0.5)'],
       borderColor: ['rgba(255, 99, 132, 1)', 'rgba(255, 206, 86, 1)', 'rgba(75, 192, 192, 1)', 'rgba(153, 102, 255, 1)'],
       borderWidth: 1,
     }],
   };
 
-  const cityCounts = projects.reduce((acc, p) => {
-    acc[p.City] = (acc[p.City] || 0) + 1;
-    return acc;
-  }, {});
-
   const cityChartData = {
-    labels: Object.keys(cityCounts),
+    labels: analytics.projects_by_city.map(c => c.city),
     datasets: [{
       label: '# of Projects',
-      data: Object.values(cityCounts),
+      data: analytics.projects_by_city.map(c => c.count),
       backgroundColor: 'rgba(54, 162, 235, 0.5)',
       borderColor: 'rgba(54, 162, 235, 1)',
       borderWidth: 1,
     }],
   };
 
-  // Process data for budget vs actual/prediction by contractor chart
-  const contractorData = projects.reduce((acc, p) => {
-    const contractor = p.Vendor || 'Unknown';
-    if (!acc[contractor]) {
-      acc[contractor] = {
-        budgets: [],
-        actuals: [],
-        predictions: [],
-        projects: []
-      };
-    }
-    
-    acc[contractor].budgets.push(p.Budget || 0);
-    acc[contractor].projects.push(p.ProjectID);
-    
-    // Use actual cost for completed projects, predicted cost for others
-    if (p.ProjectStatus === 'Completed' && p.ActualCost) {
-      acc[contractor].actuals.push(p.ActualCost);
-    } else if (p.PredictedCost) {
-      acc[contractor].predictions.push(p.PredictedCost);
-    }
-    
-    return acc;
-  }, {});
-
-  const contractors = Object.keys(contractorData);
+  // Budget vs actual/prediction by contractor: actual cost for completed
+  // projects, predicted cost for the rest, averaged per contractor
+  const contractorCosts = analytics.contractor_costs;
+  const contractors = contractorCosts.map(c => c.vendor);
   const contractorColors = {
     'Apex Construction': 'rgba(255, 99, 132, 1)',
     'Keystone Builders': 'rgba(54, 162, 235, 1)',
@@ -154,10 +127,7 @@ const Dashboard = ({ projects }) => {
     datasets: [
       {
         label: 'Average Budget',
-        data: contractors.map(contractor => {
-          const budgets = contractorData[contractor].budgets;
-          return budgets.length > 0 ? budgets.reduce((a, b) => a + b, 0) / budgets.length : 0;
-        }),
+        data: contractorCosts.map(c => c.avg_budget || 0),
         borderColor: 'rgba(128, 128, 128, 1)',
         backgroundColor: 'rgba(128, 128, 128, 0.1)',
         tension: 0.1,
@@ -165,10 +135,7 @@ const Dashboard = ({ projects }) => {
       },
       {
         label: 'Average Actual Cost',
-        data: contractors.map(contractor => {
-          const actuals = contractorData[contractor].actuals;
-          return actuals.length > 0 ? actuals.reduce((a, b) => a + b, 0) / actuals.length : null;
-        }),
+        data: contractorCosts.map(c => c.avg_actual_cost),
         borderColor: 'rgba(220, 53, 69, 1)',
         backgroundColor: 'rgba(220, 53, 69, 0.1)',
         tension: 0.1,
@@ -176,10 +143,7 @@ const Dashboard = ({ projects }) => {
       },
       {
         label: 'Average Predicted Cost',
-        data: contractors.map(contractor => {
-          const predictions = contractorData[contractor].predictions;
-          return predictions.length > 0 ? predictions.reduce((a, b) => a + b, 0) / predictions.length : null;
-        }),
+        data: contractorCosts.map(c => c.avg_predicted_cost),
         borderColor: 'rgba(40, 167, 69, 1)',
         backgroundColor: 'rgba(40, 167, 69, 0.1)',
         tension: 0.1,
@@ -25,8 +25,27 @@ export const getProjects = async (filters = {}) => {
   }
 };
 
+/**
+ * Fetches dashboard KPIs and chart series, aggregated on the server.
+ * @param {object} filters - The same filter keys and values accepted by getProjects.
+ * @returns {Promise<object|null>} - A promise that resolves to the analytics payload, or null on error.
+ */
+export const getDashboardAnalytics = async (filters = {}) => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/dashboard-analytics`, {
+      params: filters,
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching dashboard analytics:", error);
+    return null;
+  }
+};
+
 /**
  * Sends a question to the chatbot API endpoint.
+ * Charts come back as a Chart.js config (`chart_spec`) drawn in the browser,
+ * rather than as a server-rendered image.
  * @param {string} question - The user's question.
  * @returns {Promise<object>} - A promise that resolves to the chatbot's response object.
  */
@@ -34,6 +53,7 @@ export const askChatbot = async (question) => {
   try {
     const response = await axios.post(`${API_BASE_URL}/ask`, {
       question: question,
+      chart_format: 'spec',
     });
     // Return the full response object for enhanced chatbot features
     return response.data;
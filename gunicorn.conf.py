@@ -0,0 +1,17 @@
+import sys
+
+# Server hooks for start.sh. The app module is imported by gunicorn as '4_app'.
+APP_MODULE = '4_app'
+
+
+def when_ready(server):
+    # With --preload the master has already imported the app
+    app_module = sys.modules.get(APP_MODULE)
+    if app_module is not None:
+        app_module.log_startup()
+
+
+def post_worker_init(worker):
+    # Without --preload each worker imports the app itself
+    if not worker.cfg.preload_app:
+        sys.modules[APP_MODULE].log_startup()
@@ -0,0 +1,102 @@
+import os
+import argparse
+import importlib
+import statistics
+import threading
+import time
+from collections import Counter
+
+# --- Configuration ---
+QUESTIONS = [
+    "How many projects are there?",
+    "How many high-risk projects are there?",
+    "What is the average budget in Toronto?",
+    "What is the total budget versus actual cost for completed projects?",
+]
+DATA_ENDPOINT = '/api/projects?limit=50'
+BUSY_BACKOFF_SECONDS = 0.25
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def run_clients(client, count, duration, target):
+    """Runs `count` threads calling `target(client, i)` until `duration` seconds pass.
+
+    Returns a list of (status_code, seconds) per call.
+    """
+    results = []
+    results_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(worker):
+        i = worker
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = target(client, i)
+            with results_lock:
+                results.append((status, time.perf_counter() - started))
+            i += count
+
+    threads = [threading.Thread(target=loop, args=(worker,)) for worker in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(name, results, duration):
+    latencies = [seconds for status, seconds in results if status == 200]
+    statuses = dict(Counter(status for status, _ in results))
+    print(f"{name}: {len(latencies) / duration:.2f} answered/s, statuses {statuses}")
+    if latencies:
+        print(f"  latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+              f"mean {statistics.mean(latencies) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-tests /api/ask offline against the fake LLM while probing a data endpoint.")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent chatbot users.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run for.")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake LLM latency per call, in seconds.")
+    parser.add_argument("--data-clients", type=int, default=2,
+                        help="Concurrent /api/projects users running alongside the chatbot users.")
+    args = parser.parse_args()
+
+    # Must be set before chatbot_service is imported
+    os.environ["USE_FAKE_LLM"] = "1"
+    os.environ["FAKE_LLM_LATENCY_SECONDS"] = str(args.latency)
+    app_module = importlib.import_module('4_app')
+    client = app_module.app.test_client()
+
+    def ask(client, i):
+        status = client.post('/api/ask', json={"question": QUESTIONS[i % len(QUESTIONS)]}).status_code
+        if status == 503:
+            time.sleep(BUSY_BACKOFF_SECONDS)  # A real client would honour Retry-After
+        return status
+
+    def browse(client, i):
+        return client.get(DATA_ENDPOINT).status_code
+
+    data_results = []
+    data_thread = threading.Thread(target=lambda: data_results.extend(
+        run_clients(client, args.data_clients, args.duration, browse)))
+    data_thread.start()
+    chatbot_results = run_clients(client, args.clients, args.duration, ask)
+    data_thread.join()
+
+    print(f"\n--- {args.clients} chatbot users, fake LLM at {args.latency}s per call, {args.duration}s ---")
+    report("/api/ask", chatbot_results, args.duration)
+    report(DATA_ENDPOINT, data_results, args.duration)
+    print(f"Chatbot executor: {app_module.chatbot.stats()}")
+
+
+if __name__ == '__main__':
+    main()
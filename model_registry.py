@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import shutil
+from datetime import datetime
+
+import joblib
+
+# --- Configuration ---
+MODEL_DIR = 'models'
+MODEL_NAMES = ['risk', 'cost', 'duration']
+LATEST_POINTER = 'latest.json'
+KEEP_VERSIONS = 5  # Older versions are deleted after each save (~33 MB each at 5000 projects)
+
+# Columns that determine what the models learn; a change in any of them means retraining
+TRAINING_COLUMNS = [
+    'ProjectID', 'ProjectType', 'Vendor', 'Budget', 'City', 'ActualCost',
+    'ScheduleVariance_Days', 'BudgetVariance_CAD', 'PlannedDuration_Days', 'ActualDuration_Days'
+]
+
+
+def compute_training_data_hash(df):
+    """Returns a stable SHA-256 of the completed projects the models are trained on."""
+    import pandas as pd  # Only the training script hashes data; the API never needs pandas
+
+    train_df = df.loc[df['ProjectStatus'] == 'Completed', TRAINING_COLUMNS]
+    train_df = train_df.sort_values('ProjectID').reset_index(drop=True)
+    for col in ['PlannedDuration_Days', 'ActualDuration_Days']:
+        train_df[col] = pd.to_numeric(train_df[col])
+    row_hashes = pd.util.hash_pandas_object(train_df, index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+def _atomic_write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_models(models, data_hash, metrics, model_dir=MODEL_DIR):
+    """Persists fitted pipelines as a new version and points `latest.json` at it.
+
+    `models` maps each name in MODEL_NAMES to (pipeline, features). Pipelines
+    are dumped uncompressed so they can be loaded memory-mapped.
+    """
+    version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{data_hash[:8]}"
+    version_dir = os.path.join(model_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    saved = {}
+    for name in MODEL_NAMES:
+        pipeline, features = models.get(name, (None, None))
+        if pipeline is None:
+            continue
+        joblib.dump(pipeline, os.path.join(version_dir, f"{name}.joblib"))
+        saved[name] = features
+
+    metadata = {
+        'version': version,
+        'data_hash': data_hash,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'models': saved,
+        'metrics': metrics,
+    }
+    _atomic_write_json(os.path.join(version_dir, 'metadata.json'), metadata)
+    _atomic_write_json(os.path.join(model_dir, LATEST_POINTER), {'version': version})
+    print(f"Saved model version {version} to '{version_dir}'.")
+    prune_versions(model_dir)
+    return metadata
+
+
+def prune_versions(model_dir=MODEL_DIR, keep=KEEP_VERSIONS):
+    """Deletes all but the `keep` newest versions, never the one `latest.json` points to.
+
+    Versions are named by timestamp, so they sort by age. Processes that
+    already memory-mapped a deleted version keep reading it until they reload.
+    """
+    latest = latest_metadata(model_dir)
+    versions = sorted(name for name in os.listdir(model_dir)
+                      if os.path.isfile(os.path.join(model_dir, name, 'metadata.json')))
+    stale = [name for name in versions[:-keep] if latest is None or name != latest['version']]
+    for name in stale:
+        shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+    if stale:
+        print(f"Deleted {len(stale)} old model versions (keeping the newest {keep}).")
+
+
+def latest_metadata(model_dir=MODEL_DIR):
+    """Returns the metadata of the latest saved version, or None if nothing is saved."""
+    pointer_path = os.path.join(model_dir, LATEST_POINTER)
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path) as f:
+        version = json.load(f)['version']
+    with open(os.path.join(model_dir, version, 'metadata.json')) as f:
+        return json.load(f)
+
+
+def load_models(version=None, model_dir=MODEL_DIR, mmap_mode='r'):
+    """Loads a saved version (the latest by default).
+
+    Returns (models, metadata) where `models` has the same shape as
+    `train_models` output: name -> (pipeline, features), or (None, None).
+    Large arrays are memory-mapped, so repeated loads and forked workers
+    share pages instead of copying them.
+    """
+    if version is None:
+        metadata = latest_metadata(model_dir)
+        if metadata is None:
+            raise FileNotFoundError(f"No saved models found in '{model_dir}'.")
+    else:
+        with open(os.path.join(model_dir, version, 'metadata.json')) as f:
+            metadata = json.load(f)
+
+    version_dir = os.path.join(model_dir, metadata['version'])
+    models = {}
+    for name in MODEL_NAMES:
+        features = metadata['models'].get(name)
+        if features is None:
+            models[name] = (None, None)
+            continue
+        pipeline = joblib.load(os.path.join(version_dir, f"{name}.joblib"), mmap_mode=mmap_mode)
+        models[name] = (pipeline, features)
+    return models, metadata
@@ -0,0 +1,338 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from model_registry import latest_metadata
+
+# --- Configuration ---
+STATE_PATH = 'pipeline_state.json'
+CSV_FILE_PATH = 'mock_capex_data.csv'
+DB_FILE_PATH = 'lighthouse.db'
+# Steps whose dependencies are done start side by side, up to this many. The
+# current steps form a chain, so today only the model step's own
+# --parallel-models (three forests at once) runs anything in parallel.
+MAX_PARALLEL_STEPS = 2
+HASH_BLOCK_BYTES = 1 << 20
+# Tables the model step creates in the database; they are not part of the build's schema
+MODEL_TABLES = ['risk_explanations', 'predictions']
+
+# A step's fingerprint covers its code, its input files, its parameters and
+# the outputs and run count of the steps it runs after. A step whose
+# fingerprint and outputs match its last successful run is skipped, so a
+# changed CSV reruns the build and everything downstream of it, and nothing
+# else. Any step that actually runs reruns everything after it: a full
+# rebuild reloads the projects (dropping their predictions) without
+# changing the schema or the CSV.
+
+
+# --- 1. Fingerprints ---
+def file_digest(path, state):
+    """SHA-256 of a file, or None if it is missing.
+
+    Digests are remembered in `state` by (size, mtime), so unchanged
+    files (e.g. a large CSV) are not re-read on every run.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = [stat.st_size, stat.st_mtime_ns]
+    cached = state['files'].get(path)
+    if cached is not None and cached['signature'] == signature:
+        return cached['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    state['files'][path] = {'signature': signature, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+
+def schema_digest(db_path):
+    """SHA-256 of a database's table, index and trigger definitions, or None if it has none.
+
+    Predictions, rollup refreshes and ANALYZE leave it unchanged, as do the
+    tables the model step adds (MODEL_TABLES); a schema change in the build
+    script does not.
+    """
+    if not os.path.exists(db_path):
+        return None
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        rows = conn.execute(f"SELECT type, name, sql FROM sqlite_master "
+                            f"WHERE name NOT LIKE 'sqlite_%' AND tbl_name NOT IN ({', '.join('?' * len(MODEL_TABLES))}) "
+                            f"ORDER BY type, name", MODEL_TABLES).fetchall()
+    if not rows:
+        return None
+    return hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()
+
+
+# --- 2. Steps ---
+class Step:
+    """One pipeline step: a script to run, what it depends on and how to check its outputs.
+
+    `command(fingerprint, previous)` returns the script arguments, given the
+    current fingerprint and the one of the last successful run (or None).
+    `outputs(fingerprint)` describes what the step produced, or returns None
+    when its outputs are missing. A step with `keep_existing` is skipped
+    whenever its outputs exist, unless it wrote them itself and its
+    parameters have changed since.
+    """
+
+    def __init__(self, name, code, command, outputs, inputs=(), after=(), params=None, keep_existing=False):
+        self.name = name
+        self.code = list(code)
+        self.command = command
+        self.outputs = outputs
+        self.inputs = list(inputs)
+        self.after = list(after)
+        self.params = params or {}
+        self.keep_existing = keep_existing
+
+
+def changed_parts(fingerprint, previous):
+    """The fingerprint sections ('code', 'inputs', ...) that differ from the previous run."""
+    if previous is None:
+        return set(fingerprint)
+    return {part for part in fingerprint if fingerprint[part] != previous.get(part)}
+
+
+def generate_command(fingerprint, previous):
+    args = ['1_generate_data.py']
+    for name, value in fingerprint['params'].items():
+        args += [f"--{name}", str(value)]
+    return args
+
+
+def build_command(fingerprint, previous):
+    # A CSV change is upserted into the existing tables, keeping predictions;
+    # new build code, a missing database or a crashed build means a full rebuild
+    if previous is not None and 'code' not in changed_parts(fingerprint, previous) and os.path.exists(DB_FILE_PATH):
+        return ['2_build_database.py', '--incremental']
+    return ['2_build_database.py']
+
+
+def model_command(fingerprint, previous):
+    # New model code always retrains. Otherwise the saved models are reused
+    # when the training data is unchanged, and only projects the build
+    # flagged as new or changed are rescored.
+    if 'code' in changed_parts(fingerprint, previous):
+        args = ['3_enhanced_prediction_model.py', '--retrain', '--parallel-models']
+    else:
+        args = ['3_enhanced_prediction_model.py', '--dirty-only', '--parallel-models']
+    # SHAP explanations are cached per model version, so they cost a full pass
+    # (about 20 ms per open project per core) only after a retrain
+    if not fingerprint['params'].get('explanations', True):
+        args.append('--skip-explanations')
+    return args
+
+
+def csv_outputs(fingerprint):
+    csv_hash = fingerprint['inputs'].get(CSV_FILE_PATH)
+    return {'csv': csv_hash} if csv_hash else None
+
+
+def database_outputs(fingerprint):
+    schema = schema_digest(DB_FILE_PATH)
+    return {'schema': schema, 'csv': fingerprint['inputs'][CSV_FILE_PATH]} if schema else None
+
+
+def model_outputs(fingerprint):
+    metadata = latest_metadata()
+    return {'model_version': metadata['version']} if metadata else None
+
+
+def build_steps(generate_params, explanations=True):
+    """The Lighthouse pipeline: data -> database -> models -> query plan check."""
+    return [
+        # Mock data only: an existing CSV (e.g. a real export) is never overwritten;
+        # one this step generated is regenerated when --rows/--seed change
+        Step('generate', ['1_generate_data.py'], generate_command, csv_outputs,
+             inputs=[CSV_FILE_PATH], params=generate_params, keep_existing=True),
+        Step('build', ['2_build_database.py', 'rollups.py', 'vendor_stats.py', 'db_version.py', 'db_pool.py'],
+             build_command, database_outputs, inputs=[CSV_FILE_PATH], after=['generate']),
+        Step('model', ['3_enhanced_prediction_model.py', 'model_registry.py', 'prediction_service.py', 'rollups.py',
+                       'risk_explanations.py', 'db_version.py', 'db_pool.py'],
+             model_command, model_outputs, after=['build'], params={'explanations': explanations}),
+        # After scoring: the planner statistics for PredictedRisk only mean something once it is filled in
+        Step('plans', ['check_query_plans.py', '4_app.py', 'rollups.py', 'chatbot_service.py', 'sql_guard.py',
+                       'contractor_analysis.py', 'vendor_stats.py'],
+             lambda fingerprint, previous: ['check_query_plans.py', DB_FILE_PATH],
+             lambda fingerprint: {}, after=['model']),
+    ]
+
+
+# --- 3. State ---
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {'steps': {}, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    """Writes the state atomically, so a crash leaves the previous state intact."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def step_fingerprint(step, state):
+    return {
+        'code': {path: file_digest(path, state) for path in step.code},
+        'inputs': {path: file_digest(path, state) for path in step.inputs},
+        'params': step.params,
+        'upstream': {name: {'outputs': state['steps'][name]['outputs'], 'run': state['steps'][name].get('run', 0)}
+                     for name in step.after},
+    }
+
+
+def is_up_to_date(step, record, fingerprint, force):
+    """Whether a step can be skipped; also returns its current outputs."""
+    outputs = step.outputs(fingerprint)
+    if step.name in force or outputs is None:
+        return False, outputs
+    if step.keep_existing:
+        # `produced` is only recorded when the step actually ran, so a file it merely found does not count
+        written_here = record is not None and record['status'] == 'done' and record.get('produced') == outputs
+        return not (written_here and record['fingerprint']['params'] != fingerprint['params']), outputs
+    up_to_date = (record is not None and record['status'] == 'done'
+                  and record['fingerprint'] == fingerprint and record['outputs'] == outputs)
+    return up_to_date, outputs
+
+
+# --- 4. Running ---
+def run_script(name, args):
+    """Runs a pipeline script, prefixing its output with the step name; returns the exit code."""
+    process = subprocess.Popen([sys.executable, '-u'] + args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1)
+    for line in process.stdout:
+        print(f"[{name}] {line}", end='', flush=True)
+    return process.wait()
+
+
+def run_pipeline(steps, state, state_path=STATE_PATH, force=(), dry_run=False, max_parallel=MAX_PARALLEL_STEPS):
+    """Runs every step that is out of date, starting each as soon as the steps before it finish.
+
+    State is saved after every step, so a crashed run resumes from the
+    first step that did not finish. With `dry_run`, steps are only
+    reported, and everything after a step that would run would run too.
+    Returns {step name: result}.
+    """
+    results = {}
+    running = {}
+    pending = list(steps)
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for step in list(pending):
+                if any(results.get(name) in ('failed', 'blocked') for name in step.after):
+                    results[step.name] = 'blocked'
+                    pending.remove(step)
+                    continue
+                if not all(results.get(name) in ('done', 'skipped', 'would run') for name in step.after):
+                    continue
+                pending.remove(step)
+
+                record = state['steps'].get(step.name)
+                if any(results[name] == 'would run' for name in step.after):
+                    results[step.name] = 'would run'
+                    print(f"[{step.name}] Would run after {', '.join(step.after)}.")
+                    continue
+                fingerprint = step_fingerprint(step, state)
+                up_to_date, outputs = is_up_to_date(step, record, fingerprint, force)
+                if up_to_date:
+                    state['steps'][step.name] = dict(record or {}, status='done', fingerprint=fingerprint,
+                                                     outputs=outputs)
+                    results[step.name] = 'skipped'
+                    print(f"[{step.name}] Up to date; skipping.")
+                    continue
+
+                previous = record['fingerprint'] if record is not None and record['status'] == 'done' else None
+                args = step.command(fingerprint, previous)
+                parts = changed_parts(fingerprint, previous) or {'outputs'}
+                changes = (f"{', '.join(sorted(parts))} changed" if previous is not None
+                           else "no previous successful run")
+                if dry_run:
+                    results[step.name] = 'would run'
+                    print(f"[{step.name}] Would run {' '.join(args)} ({changes}).")
+                    continue
+                print(f"[{step.name}] Running {' '.join(args)} ({changes}).")
+
+                # A step still marked 'running' on the next start crashed, so it gets no incremental shortcuts
+                state['steps'][step.name] = dict(record or {}, status='running', fingerprint=fingerprint,
+                                                 started_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                save_state(state, state_path)
+                running[executor.submit(run_script, step.name, args)] = (step, fingerprint, time.perf_counter())
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step, fingerprint, started = running.pop(future)
+                seconds = round(time.perf_counter() - started, 2)
+                if future.result() != 0:
+                    results[step.name] = 'failed'
+                    state['steps'][step.name].update(status='failed', seconds=seconds)
+                    print(f"[{step.name}] Failed with exit code {future.result()}.")
+                else:
+                    # Re-fingerprinted, since a step may create its own inputs (e.g. the CSV)
+                    fingerprint = step_fingerprint(step, state)
+                    outputs = step.outputs(fingerprint)
+                    results[step.name] = 'done'
+                    state['steps'][step.name].update(status='done', fingerprint=fingerprint,
+                                                     outputs=outputs, produced=outputs,
+                                                     run=state['steps'][step.name].get('run', 0) + 1,
+                                                     seconds=seconds,
+                                                     finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                save_state(state, state_path)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Lighthouse data pipeline, redoing only what changed.")
+    parser.add_argument("--force", action="append", default=[], metavar="STEP",
+                        help="Run this step even if it is up to date (repeatable).")
+    parser.add_argument("--dry-run", action="store_true", help="Show which steps would run without running them.")
+    parser.add_argument("--rows", type=int, default=None, help="Projects to generate when there is no CSV.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the generated data.")
+    parser.add_argument("--state", default=STATE_PATH, help="Where step fingerprints are recorded.")
+    parser.add_argument("--no-explanations", action="store_true",
+                        help="Skip the SHAP PrimaryRiskFactor pass in the model step (the bulk of a retrain's time).")
+    return parser.parse_args()
+
+
+# --- Main Execution ---
+if __name__ == '__main__':
+    args = parse_args()
+    state = load_state(args.state)
+    # Generator options stick until changed, so a plain run keeps the CSV an earlier --rows produced
+    generated = state['steps'].get('generate')
+    generate_params = dict(generated['fingerprint']['params'] if generated else {})
+    generate_params.update({name: value for name, value in (('rows', args.rows), ('seed', args.seed))
+                            if value is not None})
+    steps = build_steps(generate_params, explanations=not args.no_explanations)
+    unknown = set(args.force) - {step.name for step in steps}
+    if unknown:
+        sys.exit(f"Unknown step(s): {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    results = run_pipeline(steps, state, args.state, force=set(args.force), dry_run=args.dry_run)
+    if not args.dry_run:
+        save_state(state, args.state)
+
+    print("Pipeline summary:")
+    for step in steps:
+        seconds = state['steps'].get(step.name, {}).get('seconds')
+        timing = f"{seconds:8.2f}s" if results.get(step.name) in ('done', 'failed') else ''
+        print(f"  {step.name:<10} {results.get(step.name, 'not run'):<8} {timing}")
+    print(f"  {'total':<10} {'':<8} {time.perf_counter() - started:8.2f}s")
+    if any(result in ('failed', 'blocked') for result in results.values()):
+        sys.exit(1)
@@ -0,0 +1,320 @@
+import os
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+
+from model_registry import MODEL_DIR, LATEST_POINTER, latest_metadata, load_models
+
+# --- Configuration ---
+AT_RISK_CLASS = 1  # The risk model's label for projects that ran late or over budget
+MODEL_RECHECK_SECONDS = 1.0
+MAX_BATCH_SIZE = 256
+MAX_WAIT_SECONDS = 0.002  # How long the batcher waits for more callers before predicting
+REQUEST_TIMEOUT_SECONDS = 5.0
+REQUIRED_FIELDS = ['ProjectType', 'Vendor', 'Budget', 'City']
+
+
+def risk_level(scores):
+    """Maps risk probabilities to the High/Medium/Low labels used across the app."""
+    scores = np.asarray(scores)
+    return np.select([scores > 0.7, scores > 0.4], ["High", "Medium"], default="Low")
+
+
+def at_risk_probability(probabilities, classes):
+    """The AT_RISK_CLASS column of `predict_proba` output, or zeros if training never saw that class."""
+    index = np.flatnonzero(np.asarray(classes) == AT_RISK_CLASS)
+    if index.size == 0:
+        return np.zeros(len(probabilities))
+    return probabilities[:, index[0]]
+
+
+def _planned_duration(project):
+    """PlannedDuration_Days as given, or derived from StartDate/PlannedEndDate, else NaN."""
+    value = project.get('PlannedDuration_Days')
+    if value not in (None, ''):
+        return float(value)
+    try:
+        start = datetime.fromisoformat(str(project['StartDate'])[:10])
+        end = datetime.fromisoformat(str(project['PlannedEndDate'])[:10])
+    except (KeyError, ValueError):
+        return np.nan
+    return float((end - start).days)
+
+
+def prepare_features(projects):
+    """Builds column arrays of model inputs from project dicts.
+
+    Plain lists and NumPy arrays are used instead of a DataFrame because
+    per-request pandas overhead dominates the cost of scoring a few rows.
+    """
+    missing = [i for i, p in enumerate(projects) if any(p.get(field) in (None, '') for field in REQUIRED_FIELDS)]
+    if missing:
+        raise ValueError(f"Projects at positions {missing} are missing one of {REQUIRED_FIELDS}.")
+
+    try:
+        budgets = np.array([float(p['Budget']) for p in projects])
+        durations = np.array([_planned_duration(p) for p in projects])
+    except (TypeError, ValueError):
+        raise ValueError("Budget and PlannedDuration_Days must be numeric.")
+
+    return {
+        'ProjectID': [p.get('ProjectID') for p in projects],
+        'ProjectType': [p['ProjectType'] for p in projects],
+        'Vendor': [p['Vendor'] for p in projects],
+        'City': [p['City'] for p in projects],
+        'Budget': budgets,
+        'PlannedDuration_Days': durations,
+    }
+
+
+def concat_features(batches):
+    """Concatenates prepared feature columns from several requests into one batch."""
+    return {key: (np.concatenate([b[key] for b in batches]) if isinstance(batches[0][key], np.ndarray)
+                  else [v for b in batches for v in b[key]])
+            for key in batches[0]}
+
+
+class FastEncoder:
+    """Re-implements the fitted shared preprocessor with plain NumPy.
+
+    Uses the imputer medians and one-hot categories learned at training
+    time, producing exactly the matrix `ColumnTransformer.transform` would,
+    without its per-call DataFrame validation overhead.
+    """
+
+    def __init__(self, preprocessor):
+        imputer = preprocessor.named_transformers_['num']
+        onehot = preprocessor.named_transformers_['cat']
+        self.numeric_features = list(preprocessor.transformers_[0][2])
+        self.medians = imputer.statistics_
+        self.categorical_features = list(preprocessor.transformers_[1][2])
+        self.category_codes = [{category: i for i, category in enumerate(categories)}
+                               for categories in onehot.categories_]
+        self.width = len(self.numeric_features) + sum(len(c) for c in onehot.categories_)
+
+    def transform(self, columns):
+        """Encodes a DataFrame or a dict of feature columns."""
+        numeric = np.column_stack([np.asarray(columns[f], dtype=np.float64) for f in self.numeric_features])
+        X = np.zeros((numeric.shape[0], self.width), dtype=np.float32)
+        X[:, :len(self.numeric_features)] = np.where(np.isnan(numeric), self.medians, numeric)
+
+        offset = len(self.numeric_features)
+        for feature, codes in zip(self.categorical_features, self.category_codes):
+            for row, value in enumerate(columns[feature]):
+                # Unknown categories encode as all zeros, like handle_unknown='ignore'
+                code = codes.get(value)
+                if code is not None:
+                    X[row, offset + code] = 1
+            offset += len(codes)
+        return X
+
+
+class PackedForest:
+    """A fitted random forest flattened into contiguous node arrays.
+
+    All trees are walked together with vectorized NumPy steps, one per tree
+    level, instead of one Python-level `predict` call per tree.
+    """
+
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        self.roots = offsets.astype(np.intp)
+        self.feature = np.concatenate([tree.feature for tree in trees]).astype(np.intp)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.left = np.concatenate([np.where(tree.children_left == -1, -1, tree.children_left + off)
+                                    for tree, off in zip(trees, offsets)]).astype(np.intp)
+        self.right = np.concatenate([np.where(tree.children_right == -1, -1, tree.children_right + off)
+                                     for tree, off in zip(trees, offsets)]).astype(np.intp)
+        values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+        self.classes = getattr(forest, 'classes_', None)
+        if self.classes is not None:
+            # Per-tree class probabilities, as DecisionTreeClassifier.predict_proba normalizes them
+            totals = values.sum(axis=1, keepdims=True)
+            values = values / np.where(totals == 0, 1, totals)
+        self.values = values
+        self.n_trees = len(trees)
+
+    def _leaf_values(self, X):
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n = X.shape[0]
+        node = np.tile(self.roots, n)
+        sample = np.repeat(np.arange(n), self.n_trees)
+        active = np.arange(node.size)
+        # A tree that is a single leaf is already at its value
+        active = active[self.left[node] != -1]
+        while active.size:
+            current = node[active]
+            go_left = X[sample[active], self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[node[active]] != -1]
+        return self.values[node].reshape(n, self.n_trees, self.values.shape[1]).mean(axis=1)
+
+    def predict_proba(self, X):
+        return self._leaf_values(X)
+
+    def predict(self, X):
+        return self._leaf_values(X)[:, 0]
+
+
+class OnlinePredictor:
+    """Scores projects in memory with the saved risk, cost and duration pipelines.
+
+    Concurrent callers are micro-batched: requests are queued and a single
+    background thread scores everything that arrives within MAX_WAIT_SECONDS
+    with one vectorized `predict` call per model. `reload` swaps in another
+    model version without stopping the batcher.
+    """
+
+    def __init__(self, models, metadata, max_batch_size=MAX_BATCH_SIZE, max_wait_seconds=MAX_WAIT_SECONDS):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue = queue.Queue()
+        self._stats = {'requests': 0, 'batches': 0, 'projects': 0}
+        self.reload(models, metadata)
+
+        self._worker = None
+        self._worker_pid = None
+        self._worker_lock = threading.Lock()
+
+    def reload(self, models, metadata):
+        """Packs a model version; batches already being scored finish on the previous one."""
+        # The pipelines share one fitted preprocessor, so a single encoder serves all three
+        encoder = None
+        forests = {}
+        for name, (pipeline, _) in models.items():
+            if pipeline is None:
+                continue
+            if encoder is None:
+                encoder = FastEncoder(pipeline.named_steps['preprocessor'])
+            columns = list(pipeline.named_steps['selector'].transformers_[0][2])
+            forests[name] = (columns, PackedForest(pipeline.steps[-1][1]))
+        self._model = (metadata['version'], encoder, forests)  # Replaced as a whole
+
+    @property
+    def version(self):
+        return self._model[0]
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a predictor loaded in a preloading
+        # master starts its own batcher thread in each worker process
+        if self._worker_pid != os.getpid() or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker_pid != os.getpid() or not self._worker.is_alive():
+                    self._queue = queue.Queue()
+                    self._worker = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+                    self._worker.start()
+                    self._worker_pid = os.getpid()
+
+    def predict(self, projects, timeout=REQUEST_TIMEOUT_SECONDS):
+        """Scores a list of project dicts, blocking until its batch has run."""
+        if not projects:
+            return []
+        features = prepare_features(projects)
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((features, future))
+        return future.result(timeout=timeout)
+
+    def stats(self):
+        return dict(self._stats, model_version=self.version)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            queued = len(batch[0][0]['Budget'])
+            deadline = time.perf_counter() + self.max_wait_seconds
+            while queued < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                queued += len(item[0]['Budget'])
+
+            try:
+                results = self._score(concat_features([features for features, _ in batch]))
+                offset = 0
+                for features, future in batch:
+                    size = len(features['Budget'])
+                    future.set_result(results[offset:offset + size])
+                    offset += size
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+            self._stats['requests'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['projects'] += queued
+
+    def _score(self, columns):
+        """Runs each model once over the whole batch and returns one dict per project."""
+        output = {}
+        if any(project_id is not None for project_id in columns['ProjectID']):
+            output['ProjectID'] = columns['ProjectID']
+
+        _, encoder, forests = self._model
+        encoded = encoder.transform(columns) if encoder is not None else None
+        for name, (feature_columns, forest) in forests.items():
+            X = encoded[:, feature_columns]
+            if name == 'risk':
+                scores = at_risk_probability(forest.predict_proba(X), forest.classes)
+                output['RiskScore'] = scores.round(4).tolist()
+                output['PredictedRisk'] = risk_level(scores).tolist()
+            elif name == 'cost':
+                output['PredictedCost'] = forest.predict(X).round(2).tolist()
+            elif name == 'duration':
+                output['PredictedDuration_Days'] = forest.predict(X).round(0).astype(int).tolist()
+
+        return [dict(zip(output, values)) for values in zip(*output.values())]
+
+
+_predictor = None
+_predictor_lock = threading.Lock()
+_pointer_state = None  # (pointer file signature, checked at), replaced as a whole
+
+
+def _pointer_signature(model_dir=MODEL_DIR):
+    """The inode, mtime and size of `latest.json`, which every save replaces; None if nothing is saved."""
+    try:
+        stat = os.stat(os.path.join(model_dir, LATEST_POINTER))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def get_predictor():
+    """Returns this worker's predictor, loading the latest saved models on first use.
+
+    Like `db_version.VersionWatcher`, each call costs a stat of `latest.json`;
+    the pointer is only read again when it changed, or once
+    MODEL_RECHECK_SECONDS have passed, and a new version is loaded in place.
+    """
+    global _predictor, _pointer_state
+    # The signature is taken first, so a save racing this check is seen on the next call
+    signature = _pointer_signature()
+    now = time.monotonic()
+    state = _pointer_state
+    if _predictor is not None and state is not None and state[0] == signature and now - state[1] < MODEL_RECHECK_SECONDS:
+        return _predictor
+    with _predictor_lock:
+        metadata = latest_metadata()
+        if _predictor is None:
+            models, metadata = load_models()
+            _predictor = OnlinePredictor(models, metadata)
+            print(f"Loaded model version {metadata['version']} for online predictions.")
+        elif metadata is not None and metadata['version'] != _predictor.version:
+            # A pointer that disappeared keeps the loaded models serving
+            models, metadata = load_models(metadata['version'])
+            _predictor.reload(models, metadata)
+            print(f"Reloaded model version {metadata['version']} for online predictions.")
+        _pointer_state = (signature, now)
+    return _predictor
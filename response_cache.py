@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+MAX_ENTRIES = 512
+MAX_BYTES = 64 * 1024 * 1024  # Total size of the cached response bodies
+
+
+def strong_etag(body):
+    """A strong validator for a response body: equal bodies, equal tags."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """A thread-safe LRU of rendered responses, bounded by entry count and total bytes.
+
+    Keys should include the database version so that entries from before a
+    pipeline run are never served afterwards; stale entries simply age out.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Returns the cached (body, etag, mimetype, encoding, headers) for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key, body, mimetype, encoding=None, headers=None):
+        """Caches a rendered (possibly compressed) body and returns its entry.
+
+        Entries are (body, etag, mimetype, encoding, headers), where
+        `headers` holds any extra response headers to replay on a hit.
+        """
+        entry = (body, strong_etag(body), mimetype, encoding, headers or {})
+        if len(body) > self.max_bytes:
+            return entry  # Served, but never worth evicting everything else for
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted_body, *_) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_body)
+                self._stats['evictions'] += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
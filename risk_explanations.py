@@ -0,0 +1,172 @@
+import os
+import multiprocessing
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_registry import load_models
+from prediction_service import AT_RISK_CLASS
+
+# --- Configuration ---
+EXPLAIN_BATCH_ROWS = 500  # About five seconds of TreeExplainer work per batch on a 100-tree forest
+EXPLAIN_WORKERS = os.cpu_count() or 1
+EXPLAINED_FEATURES = ['ProjectType', 'Vendor', 'Budget', 'City']  # The risk model's inputs
+CATEGORICAL_FEATURES = ['ProjectType', 'Vendor', 'City']
+
+# Set in each worker process by _init_worker
+_explainer = None
+_aggregation = None
+_class_index = None  # Position of AT_RISK_CLASS in the forest's classes, None if it never saw it
+
+
+def encoded_risk_features(pipeline, df):
+    """The matrix the risk forest sees: the shared encoding, then the risk model's column selection."""
+    preprocessor = pipeline.named_steps['preprocessor']
+    encoded = preprocessor.transform(df[preprocessor.feature_names_in_])
+    return pipeline.named_steps['selector'].transform(encoded).astype(np.float32)
+
+
+def source_feature_matrix(pipeline):
+    """A 0/1 matrix mapping each encoded column the forest sees to the feature it came from.
+
+    Multiplying SHAP values by it sums the one-hot columns of a categorical
+    back into a single contribution per EXPLAINED_FEATURES entry.
+    """
+    names = pipeline.named_steps['preprocessor'].get_feature_names_out()
+    columns = pipeline.named_steps['selector'].transformers_[0][2]
+    aggregation = np.zeros((len(columns), len(EXPLAINED_FEATURES)), dtype=np.float32)
+    for row, name in enumerate(names[columns]):
+        for col, feature in enumerate(EXPLAINED_FEATURES):
+            if name == f"num__{feature}" or name.startswith(f"cat__{feature}_"):
+                aggregation[row, col] = 1
+    return aggregation
+
+
+def _init_worker(model_version):
+    """Loads the risk model once per worker process and builds its tree explainer."""
+    global _explainer, _aggregation, _class_index
+    import shap  # Only the explanation workers need it
+
+    models, _ = load_models(model_version)
+    pipeline, _ = models['risk']
+    classifier = pipeline.named_steps['classifier']
+    _explainer = shap.TreeExplainer(classifier)
+    _aggregation = source_feature_matrix(pipeline)
+    matches = np.flatnonzero(classifier.classes_ == AT_RISK_CLASS)
+    _class_index = int(matches[0]) if matches.size else None
+
+
+def _explain_batch(X):
+    """Process-pool entry point: per-feature SHAP contributions to the at-risk probability."""
+    if _class_index is None:
+        # Nothing raises a probability that is always zero
+        return np.zeros((len(X), len(EXPLAINED_FEATURES)), dtype=np.float32)
+    values = _explainer.shap_values(X, check_additivity=False)
+    # Older shap returns one array per class, newer a (rows, columns, classes) array
+    if isinstance(values, list):
+        values = values[_class_index]
+    elif values.ndim == 3:
+        values = values[:, :, _class_index]
+    return values.astype(np.float32) @ _aggregation
+
+
+def feature_hashes(df):
+    """A content hash of each row's model inputs; projects with equal inputs share an explanation."""
+    return [f"{h:016x}" for h in pd.util.hash_pandas_object(df[EXPLAINED_FEATURES], index=False)]
+
+
+def risk_factor_labels(df, contributions):
+    """Names the feature that pushes each project's risk up the most, with its value for categoricals.
+
+    A project none of whose features raises its risk gets None.
+    """
+    labels = []
+    top_features = contributions.argmax(axis=1)
+    for row, feature_index, top in zip(df.itertuples(index=False), top_features,
+                                       contributions[np.arange(len(contributions)), top_features]):
+        feature = EXPLAINED_FEATURES[feature_index]
+        if top <= 0:
+            labels.append(None)
+        else:
+            labels.append(f"{feature}: {getattr(row, feature)}" if feature in CATEGORICAL_FEATURES else feature)
+    return labels
+
+
+def create_explanation_cache(conn):
+    # Caches from before projects without a risk-raising feature were left unlabelled
+    # hold a label for every row; they are only a cache, so they are rebuilt
+    columns = {row[1]: row[3] for row in conn.execute("PRAGMA table_info(risk_explanations)")}
+    if columns.get('PrimaryRiskFactor'):
+        conn.execute("DROP TABLE risk_explanations")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_explanations (
+            ModelVersion TEXT NOT NULL, FeatureHash TEXT NOT NULL, PrimaryRiskFactor TEXT,
+            PRIMARY KEY (ModelVersion, FeatureHash)
+        ) WITHOUT ROWID
+    ''')
+
+
+def explain_new_rows(df, model_version, workers=EXPLAIN_WORKERS, batch_rows=EXPLAIN_BATCH_ROWS):
+    """Runs the tree explainer over `df` in batches across a process pool; returns one label per row."""
+    models, _ = load_models(model_version)
+    X = encoded_risk_features(models['risk'][0], df)
+    batches = [X[start:start + batch_rows] for start in range(0, len(X), batch_rows)]
+    workers = max(1, min(workers, len(batches)))
+    print(f"Explaining {len(df)} feature rows in {len(batches)} batches on {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(model_version,)) as executor:
+        contributions = np.vstack(list(executor.map(_explain_batch, batches)))
+    return risk_factor_labels(df, contributions)
+
+
+def update_primary_risk_factors(db_path, df, model_version, workers=EXPLAIN_WORKERS, batch_rows=EXPLAIN_BATCH_ROWS):
+    """Explains the risk scores of `df`'s projects and bulk-writes PrimaryRiskFactor.
+
+    Explanations are cached per (model version, feature row hash), so only
+    projects whose inputs are new to this model version are explained, and
+    each distinct input row once. The cache keeps the current version only.
+    Projects missing one of EXPLAINED_FEATURES get a NULL label.
+    """
+    if df.empty:
+        print("No projects to explain.")
+        return
+    df = df.copy()
+    explainable = df[EXPLAINED_FEATURES].notna().all(axis=1)
+    df['FeatureHash'] = None
+    if explainable.any():
+        df.loc[explainable, 'FeatureHash'] = feature_hashes(df[explainable])
+
+    with sqlite3.connect(db_path) as conn:
+        create_explanation_cache(conn)
+        conn.execute("DELETE FROM risk_explanations WHERE ModelVersion <> ?", (model_version,))
+        cached = {row[0] for row in conn.execute(
+            "SELECT FeatureHash FROM risk_explanations WHERE ModelVersion = ?", (model_version,))}
+        conn.commit()
+
+    is_cached = df['FeatureHash'].isin(cached)
+    new_rows = df[explainable & ~is_cached].drop_duplicates('FeatureHash')
+    print(f"{int(is_cached.sum())} of {int(explainable.sum())} explainable projects have a cached explanation.")
+    if not new_rows.empty:
+        labels = explain_new_rows(new_rows, model_version, workers, batch_rows)
+        with sqlite3.connect(db_path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO risk_explanations VALUES (?, ?, ?)",
+                             zip([model_version] * len(labels), new_rows['FeatureHash'], labels))
+            conn.commit()
+
+    # Staged and applied with one UPDATE ... FROM, like the predictions
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE IF EXISTS temp.staged_explanations")
+        conn.execute("CREATE TEMP TABLE staged_explanations (ProjectID TEXT PRIMARY KEY, FeatureHash TEXT)")
+        conn.executemany("INSERT INTO staged_explanations VALUES (?, ?)",
+                         df[['ProjectID', 'FeatureHash']].itertuples(index=False, name=None))
+        updated = conn.execute('''
+            UPDATE projects SET PrimaryRiskFactor = e.PrimaryRiskFactor
+            FROM staged_explanations s
+            LEFT JOIN risk_explanations e ON e.ModelVersion = ? AND e.FeatureHash = s.FeatureHash
+            WHERE projects.ProjectID = s.ProjectID AND projects.PrimaryRiskFactor IS NOT e.PrimaryRiskFactor
+        ''', (model_version,)).rowcount
+        conn.execute("DROP TABLE temp.staged_explanations")
+        conn.commit()
+    print(f"Updated PrimaryRiskFactor on {updated} projects.")
@@ -0,0 +1,181 @@
+import math
+
+# --- Configuration ---
+# Rollup key column -> (value over the joined projects/vendors/properties rows,
+#                       value for a single projects row, used by the change triggers).
+# Key columns are named like the /api/projects fields and filters.
+ROLLUP_DIMENSIONS = {
+    'Vendor': ("v.VendorName", "(SELECT VendorName FROM vendors WHERE VendorID = {row}.VendorID)"),
+    'City': ("prop.City", "(SELECT City FROM properties WHERE PropertyID = {row}.PropertyID)"),
+    'ProjectType': ("p.ProjectType", "{row}.ProjectType"),
+    'ProjectStatus': ("p.ProjectStatus", "{row}.ProjectStatus"),
+    'PredictedRisk': ("COALESCE(p.PredictedRisk, 'N/A')", "COALESCE({row}.PredictedRisk, 'N/A')"),
+}
+
+# Numeric project columns summarized per group. Counts, sums and sums of
+# squares are additive, so groups can be combined into any coarser grouping
+# and still yield exact means and standard deviations.
+ROLLUP_MEASURES = [
+    'Budget', 'ActualCost', 'BudgetVariance_CAD', 'ScheduleVariance_Days',
+    'PredictedCost', 'PredictedDuration_Days', 'RiskScore'
+]
+MEASURE_SUFFIXES = ['N', 'Sum', 'SumSq', 'Min', 'Max']
+
+# Any change to these columns moves a project between groups or changes a group's totals
+TRACKED_COLUMNS = ['VendorID', 'PropertyID', 'ProjectType', 'ProjectStatus', 'PredictedRisk'] + ROLLUP_MEASURES
+
+
+def _key_columns():
+    return ", ".join(ROLLUP_DIMENSIONS)
+
+
+def _dirty_group_sql(row):
+    """INSERT marking the group a projects row (OLD or NEW) belongs to as dirty."""
+    values = ", ".join(row_key.format(row=row) for _, row_key in ROLLUP_DIMENSIONS.values())
+    # An upsert rather than INSERT OR IGNORE: the ETL's own ON CONFLICT clause
+    # would override an OR IGNORE inside the trigger
+    return (f"INSERT INTO rollup_dirty ({_key_columns()}) SELECT {values} WHERE true "
+            f"ON CONFLICT DO NOTHING;")
+
+
+def create_rollup_schema(conn):
+    """Creates the rollup tables and the triggers that track which groups changed.
+
+    `rollups` holds one row per vendor, city, project type, status and risk
+    level combination, so every per-dimension summary is a GROUP BY over a
+    few thousand rollup rows at most.
+    """
+    keys_ddl = ", ".join(f"{key} TEXT NOT NULL" for key in ROLLUP_DIMENSIONS)
+    measures_ddl = ", ".join(f"{m}_{suffix} {'INTEGER' if suffix == 'N' else 'REAL'}"
+                             for m in ROLLUP_MEASURES for suffix in MEASURE_SUFFIXES)
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in TRACKED_COLUMNS)
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS rollups (
+            {keys_ddl}, ProjectCount INTEGER NOT NULL, {measures_ddl},
+            PRIMARY KEY ({_key_columns()})
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS rollup_dirty (
+            {keys_ddl}, PRIMARY KEY ({_key_columns()})
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_projects_insert AFTER INSERT ON projects
+        BEGIN {_dirty_group_sql('NEW')} END;
+        CREATE TRIGGER IF NOT EXISTS rollup_projects_delete AFTER DELETE ON projects
+        BEGIN {_dirty_group_sql('OLD')} END;
+        CREATE TRIGGER IF NOT EXISTS rollup_projects_update AFTER UPDATE ON projects
+        WHEN {changed}
+        BEGIN {_dirty_group_sql('OLD')} {_dirty_group_sql('NEW')} END;
+    ''')
+
+
+def refresh_sql(full=False):
+    """Returns the INSERT that recomputes the rollups (only the dirty groups unless `full`)."""
+    group_keys = ", ".join(expr for expr, _ in ROLLUP_DIMENSIONS.values())
+    measures = ", ".join(f"COUNT(p.{m}), SUM(p.{m}), SUM(p.{m} * p.{m}), MIN(p.{m}), MAX(p.{m})"
+                         for m in ROLLUP_MEASURES)
+    if full:
+        source, where = "projects p", ""
+    else:
+        # Each dirty status/type pair is searched once through idx_projects_status_type
+        # (CROSS JOIN pins that order); the full key then keeps dirty groups only
+        source = '''(SELECT DISTINCT ProjectStatus, ProjectType FROM rollup_dirty) d
+        CROSS JOIN projects p ON p.ProjectStatus = d.ProjectStatus AND p.ProjectType = d.ProjectType'''
+        where = f"WHERE ({group_keys}) IN (SELECT {_key_columns()} FROM rollup_dirty)"
+    return f'''
+        INSERT INTO rollups
+        SELECT {group_keys}, COUNT(*), {measures}
+        FROM {source}
+        JOIN vendors v ON p.VendorID = v.VendorID
+        JOIN properties prop ON p.PropertyID = prop.PropertyID
+        {where}
+        GROUP BY {", ".join(str(i + 1) for i in range(len(ROLLUP_DIMENSIONS)))}
+    '''
+
+
+def refresh_rollups(conn, full=False):
+    """Brings the rollups up to date with the projects table.
+
+    Only groups marked dirty by the triggers are recomputed, so the cost
+    follows the size of the changed groups rather than the whole table.
+    An empty rollups table (first build, or a database that predates the
+    rollups) is rebuilt in full.
+    """
+    with conn:
+        if not full and conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None:
+            full = True
+        if full:
+            conn.execute("DELETE FROM rollups")
+            dirty_groups = None
+        else:
+            dirty_groups = conn.execute("SELECT COUNT(*) FROM rollup_dirty").fetchone()[0]
+            if dirty_groups == 0:
+                print("Rollups are up to date.")
+                return
+            conn.execute(f"DELETE FROM rollups WHERE ({_key_columns()}) IN (SELECT {_key_columns()} FROM rollup_dirty)")
+
+        # Left on, the planner builds a throwaway index over all projects rather
+        # than searching idx_projects_status_type once per dirty status/type pair
+        conn.execute("PRAGMA automatic_index = OFF")
+        try:
+            conn.execute(refresh_sql(full=full))
+        finally:
+            conn.execute("PRAGMA automatic_index = ON")
+        conn.execute("DELETE FROM rollup_dirty")
+
+    if full:
+        print("Rebuilt all rollups.")
+    else:
+        print(f"Refreshed {dirty_groups} changed rollup groups.")
+
+
+def sample_std(n, total, total_sq):
+    """Sample standard deviation (ddof=1, as pandas computes it) from n, sum and sum of squares."""
+    if not n or n < 2:
+        return None
+    variance = (total_sq - total * total / n) / (n - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+def read_rollups(conn, dimension=None, filters=None):
+    """Summarizes the rollups by one key column (or overall when `dimension` is None).
+
+    `filters` maps key columns to a value or a list of values. Returns one
+    dict per group with the key, ProjectCount and, per measure, `<m>_N`,
+    `<m>_Sum`, `<m>_Mean`, `<m>_Std`, `<m>_Min` and `<m>_Max`. Reads touch
+    only rollup rows, never the projects table.
+    """
+    conditions = []
+    params = []
+    for key, value in (filters or {}).items():
+        if key not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"Rollups cannot be filtered on '{key}'.")
+        values = value if isinstance(value, (list, tuple)) else [value]
+        conditions.append(f"{key} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    if dimension is not None and dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown rollup dimension '{dimension}'.")
+
+    aggregates = ", ".join(f"SUM({m}_N), SUM({m}_Sum), SUM({m}_SumSq), MIN({m}_Min), MAX({m}_Max)"
+                           for m in ROLLUP_MEASURES)
+    sql = f"SELECT {dimension or 'NULL'}, SUM(ProjectCount), {aggregates} FROM rollups"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if dimension is not None:
+        sql += f" GROUP BY {dimension} ORDER BY {dimension}"
+
+    groups = []
+    for row in conn.execute(sql, params):
+        if row[1] is None:
+            continue  # Overall summary of an empty selection
+        group = {dimension: row[0]} if dimension is not None else {}
+        group['ProjectCount'] = row[1]
+        for i, m in enumerate(ROLLUP_MEASURES):
+            n, total, total_sq, minimum, maximum = row[2 + 5 * i: 7 + 5 * i]
+            group.update({
+                f'{m}_N': n, f'{m}_Sum': total,
+                f'{m}_Mean': total / n if n else None,
+                f'{m}_Std': sample_std(n, total, total_sq),
+                f'{m}_Min': minimum, f'{m}_Max': maximum,
+            })
+        groups.append(group)
+    return groups
@@ -0,0 +1,106 @@
+import importlib.util
+import json
+import zlib
+
+# Optional fast paths; every format and encoding still works without them
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# pyarrow takes a moment to import, so it is only loaded by the first Arrow response
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# --- Configuration ---
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.lighthouse.columnar+json'
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+STREAM_BATCH_ROWS = 2000  # Rows fetched and encoded per streamed chunk
+MIN_COMPRESS_BYTES = 1400  # Smaller bodies fit in one packet anyway
+COMPRESSIBLE_MIMETYPES = {JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE}  # Arrow buffers are already compact
+
+
+def response_formats():
+    """Mimetypes the API can produce, in order of preference for `Accept: */*`."""
+    formats = [JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE]
+    if ARROW_AVAILABLE:
+        formats.append(ARROW_STREAM_MIMETYPE)
+    return formats
+
+
+def dumps(obj):
+    """Serializes to compact UTF-8 JSON bytes, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def iter_json_rows(fields, cursor, batch_size=STREAM_BATCH_ROWS):
+    """Yields a JSON array of row objects in chunks, fetching from `cursor` as it goes."""
+    yield b'['
+    first = True
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        chunk = b','.join(dumps(dict(zip(fields, row))) for row in rows)
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']'
+
+
+def columnar_json(fields, rows, **extra):
+    """A JSON object with one array per field ({"columns": {...}}), plus any `extra` keys."""
+    columns = {field: list(values) for field, values in zip(fields, zip(*rows))} if rows \
+        else {field: [] for field in fields}
+    return dumps(dict(columns=columns, **extra))
+
+
+def arrow_stream(fields, rows):
+    """An Arrow IPC stream holding the rows as one record batch."""
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in fields]
+    table = pa.table({field: pa.array(list(values)) for field, values in zip(fields, columns)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def choose_encoding(accept_encodings, mimetype):
+    """Picks brotli or gzip from a request's Accept-Encoding, or None for identity."""
+    if mimetype not in COMPRESSIBLE_MIMETYPES:
+        return None
+    if BROTLI_AVAILABLE and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return zlib.compress(body, 6, wbits=31)  # wbits=31 writes a gzip container
+
+
+def iter_compressed(chunks, encoding):
+    """Compresses a stream of chunks incrementally, flushing after each one."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, wbits=31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
@@ -0,0 +1,125 @@
+import re
+import sqlite3
+import time
+
+# --- Configuration ---
+QUERY_TIMEOUT_SECONDS = 5.0
+PROGRESS_HANDLER_OPS = 10000  # VM instructions between deadline checks (well under a millisecond)
+FETCH_BATCH_ROWS = 200
+MAX_SCANNED_ROWS = 5000000  # Worst-case rows a plan may visit; a cartesian join of two real tables exceeds it
+
+TABLE_ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|JOIN|GROUP|ORDER|LIMIT|ON)(\w+))?', re.IGNORECASE)
+# The rest of a comma-separated FROM list ("FROM projects p, properties pr"), up to the next clause
+FROM_LIST_PATTERN = re.compile(r'\bFROM\s+\w+(?:\s+(?:AS\s+)?\w+)?\s*,([^()]+?)'
+                               r'(?=\b(?:WHERE|GROUP|ORDER|LIMIT|HAVING|UNION|JOIN|LEFT|INNER|CROSS)\b|\)|;|$)',
+                               re.IGNORECASE)
+LIST_ITEM_PATTERN = re.compile(r'^\s*(\w+)(?:\s+(?:AS\s+)?(\w+))?\s*$', re.IGNORECASE)
+# A plan line that loops over a table: "SCAN p ..." reads all of it, "SEARCH p ..." only matching rows
+LOOP_PATTERN = re.compile(r'^(SCAN|SEARCH) (\w+)')
+
+
+class QueryRejected(Exception):
+    """Raised when a query is refused up front or stopped for running too long."""
+
+
+def table_aliases(sql):
+    """Maps every table name and alias in the FROM/JOIN clauses to its table."""
+    pairs = TABLE_ALIAS_PATTERN.findall(sql)
+    for tail in FROM_LIST_PATTERN.findall(sql):
+        for item in tail.split(','):
+            match = LIST_ITEM_PATTERN.match(item)
+            if match:
+                pairs.append(match.groups(''))
+    aliases = {}
+    for table, alias in pairs:
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def table_row_count(conn, table):
+    """Row count estimate from ANALYZE statistics, else the largest rowid; 0 for unknown names."""
+    try:
+        row = conn.execute("SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+        if row is not None:
+            return row[0]
+    except sqlite3.OperationalError:
+        pass  # Never analyzed
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is None:
+        return 0  # A CTE or subquery alias rather than a stored table
+    try:
+        return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM \"{table}\"").fetchone()[0]
+    except sqlite3.OperationalError:
+        return conn.execute(f"SELECT COUNT(*) FROM \"{table}\"").fetchone()[0]  # WITHOUT ROWID
+
+
+def estimate_scanned_rows(conn, sql, params=()):
+    """Estimates the most rows any nested loop in the query plan visits.
+
+    Loops at the same level of the plan are nested, so their sizes
+    multiply: a full scan counts the whole table, an index search counts
+    as one row. A correlated subquery runs once per row of its enclosing
+    loops; other subqueries run once.
+    """
+    aliases = table_aliases(sql)
+    sizes = {}
+    base = {0: 1}  # Plan node -> rows its subtree is repeated for
+    running = {}  # Plan node -> product of the loops seen so far directly under it
+    worst = 0
+    for node, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        outer = running.get(parent, base.get(parent, 1))
+        match = LOOP_PATTERN.match(detail)
+        if match:
+            rows = 1
+            if match.group(1) == 'SCAN':
+                table = aliases.get(match.group(2), match.group(2))
+                if table not in sizes:
+                    sizes[table] = table_row_count(conn, table)
+                rows = max(sizes[table], 1)
+            running[parent] = outer * rows
+            worst = max(worst, running[parent])
+        else:
+            base[node] = outer if 'CORRELATED' in detail else base.get(parent, 1)
+    return worst
+
+
+def run_guarded_query(conn, sql, params=(), max_rows=None, timeout=QUERY_TIMEOUT_SECONDS,
+                      max_scanned_rows=MAX_SCANNED_ROWS):
+    """Runs a read query with a plan check, a time limit and a row limit.
+
+    Returns (columns, rows, truncated). Raises QueryRejected when the plan
+    would visit more than `max_scanned_rows` rows or the query runs past
+    `timeout` seconds, which SQLite's progress handler enforces even in
+    the middle of a scan. Rows are fetched in batches and fetching stops at
+    `max_rows`, so an oversized result is never materialized.
+    """
+    scanned = estimate_scanned_rows(conn, sql, params)
+    if scanned > max_scanned_rows:
+        raise QueryRejected(f"The query would read about {scanned:,} rows (the limit is {max_scanned_rows:,}). "
+                            f"It probably joins tables without a join condition.")
+
+    deadline = time.perf_counter() + timeout
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_HANDLER_OPS)
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        rows = []
+        truncated = False
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+            if not batch:
+                break
+            rows.extend(batch)
+            if max_rows is not None and len(rows) > max_rows:
+                del rows[max_rows:]
+                truncated = True
+                break
+        cursor.close()
+    except sqlite3.OperationalError as e:
+        if str(e) == 'interrupted':
+            raise QueryRejected(f"The query ran longer than {timeout:g} seconds and was stopped.")
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    return columns, rows, truncated
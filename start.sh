@@ -1,12 +1,8 @@
 #!/bin/bash
 
-# Run data pipeline if database does not exist
-if [ ! -f lighthouse.db ]; then
-  echo "Database not found. Running data pipeline..."
-  python 1_generate_data.py
-  python 2_build_database.py
-  python 3_enhanced_prediction_model.py
-fi
+# Bring the database and models up to date; steps whose inputs are unchanged are skipped
+python pipeline.py
 
-# Start the Gunicorn server
-gunicorn --bind 0.0.0.0:5001 4_app:app
+# Start the Gunicorn server (threaded workers let /api/predict micro-batch concurrent callers).
+# --preload loads the app and models once in the master; restarted workers fork ready to serve.
+gunicorn --config gunicorn.conf.py --bind 0.0.0.0:5001 --worker-class gthread --threads 8 --preload 4_app:app
@@ -0,0 +1,74 @@
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# --- Configuration ---
+APP_MODULE = '4_app'
+# "import time: <self us> | <cumulative us> | <1 + 2 * depth spaces><module>"
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def measure_imports(module):
+    """Imports `module` in a fresh interpreter with -X importtime.
+
+    Returns (self_us, cumulative_us, depth, name) for every module imported
+    while loading it, in import order, ending with `module` itself.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"__import__({module!r})"],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit(f"Importing {module} failed.")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2, match.group(4)))
+
+    # Keep only the subtree of `module`: the rows after the previous top-level import
+    end = max(i for i, row in enumerate(rows) if row[3] == module and row[2] == 0)
+    start = end
+    while start > 0 and rows[start - 1][2] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def print_report(module, rows, top):
+    total_us = rows[-1][1]
+    print(f"Importing {module} took {total_us / 1000:.0f} ms in a fresh interpreter "
+          f"(including anything it loads at import time, e.g. saved models).")
+
+    direct = sorted((row for row in rows if row[2] == 1), key=lambda row: -row[1])
+    print(f"\n--- Slowest direct imports of {module} (cumulative) ---")
+    for _, cumulative, _, name in direct[:top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {name}")
+
+    by_package = defaultdict(int)
+    for self_us, _, _, name in rows:
+        by_package[name.split('.')[0]] += self_us
+    print("\n--- Time by top-level package (self time) ---")
+    for name, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{self_us / 1000:>9.1f} ms  {name}")
+    return total_us / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reports where the API process spends its startup time, by import.")
+    parser.add_argument("--module", default=APP_MODULE, help="Module to import.")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per section.")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Exit non-zero if the import takes longer than this, to catch regressions.")
+    args = parser.parse_args()
+
+    total_ms = print_report(args.module, measure_imports(args.module), args.top)
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"\nStartup took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from prediction_service import OnlinePredictor, PackedForest, at_risk_probability
+
+
+def _data(rows=200, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 4)).astype(np.float32)
+    return X, rng
+
+
+def test_packed_forest_matches_regressor():
+    X, rng = _data()
+    y = X[:, 0] * 3 + rng.normal(size=len(X))
+    forest = RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+    np.testing.assert_allclose(PackedForest(forest).predict(X), forest.predict(X), rtol=1e-6)
+
+
+def test_packed_forest_matches_classifier():
+    X, _ = _data()
+    y = (X[:, 1] + X[:, 2] > 0).astype(int)
+    forest = RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+    np.testing.assert_allclose(PackedForest(forest).predict_proba(X), forest.predict_proba(X), rtol=1e-6)
+
+
+def test_at_risk_probability_single_class():
+    X, _ = _data()
+    for label, expected in [(1, 1.0), (0, 0.0)]:
+        packed = PackedForest(RandomForestClassifier(n_estimators=5, random_state=0).fit(X, np.full(len(X), label)))
+        np.testing.assert_allclose(at_risk_probability(packed.predict_proba(X), packed.classes), expected)
+
+
+def test_packed_forest_single_leaf_trees():
+    # Bootstrap samples drawn from a few constant rows give some trees no split
+    X, rng = _data(rows=6)
+    y = rng.normal(loc=5, size=len(X))
+    forest = RandomForestRegressor(n_estimators=50, max_depth=1, min_samples_split=5, random_state=0).fit(X, y)
+    leaf_trees = [tree for tree in forest.estimators_ if tree.tree_.node_count == 1]
+    split_trees = [tree for tree in forest.estimators_ if tree.tree_.node_count > 1]
+    assert leaf_trees and split_trees
+    # Ending on a split tree means a stray step off a single leaf would read another tree's node
+    forest.estimators_ = leaf_trees + split_trees
+    np.testing.assert_allclose(PackedForest(forest).predict(X), forest.predict(X), rtol=1e-6)
+
+
+def test_empty_batch():
+    X, rng = _data()
+    forest = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, rng.normal(size=len(X)))
+    assert PackedForest(forest).predict(X[:0]).shape == (0,)
+    assert OnlinePredictor({}, {'version': 'test'}).predict([]) == []
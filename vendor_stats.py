@@ -0,0 +1,179 @@
+from datetime import datetime
+
+from rollups import sample_std
+
+# --- Configuration ---
+# Completed projects are bucketed by vendor and the month they finished in
+# (ActualEndDate). Each bucket keeps count, sum and sum of squares per
+# measure, which add up across buckets, so any run of months or quarters
+# combines into exact means and standard deviations.
+VENDOR_STATS_MEASURES = ['BudgetVariance_CAD', 'ScheduleVariance_Days']
+MONTH_SQL = "strftime('%Y-%m', {row}.ActualEndDate)"
+# Any change to these columns moves a project between buckets or changes a bucket's totals
+TRACKED_COLUMNS = ['VendorID', 'ProjectStatus', 'ActualEndDate'] + VENDOR_STATS_MEASURES
+
+MAX_WINDOW_PERIODS = 60
+
+# Period -> (label, consecutive integer index) computed from a bucket's Month
+PERIODS = {
+    'month': ("Month",
+              "CAST(substr(Month, 1, 4) AS INTEGER) * 12 + CAST(substr(Month, 6, 2) AS INTEGER) - 1"),
+    'quarter': ("substr(Month, 1, 4) || '-Q' || ((CAST(substr(Month, 6, 2) AS INTEGER) + 2) / 3)",
+                "CAST(substr(Month, 1, 4) AS INTEGER) * 4 + (CAST(substr(Month, 6, 2) AS INTEGER) - 1) / 3"),
+}
+
+
+def _dirty_bucket_sql(row):
+    """INSERT marking the bucket a projects row (OLD or NEW) belongs to as dirty."""
+    month = MONTH_SQL.format(row=row)
+    return (f"INSERT INTO vendor_months_dirty (VendorID, Month) SELECT {row}.VendorID, {month} "
+            f"WHERE {month} IS NOT NULL ON CONFLICT DO NOTHING;")
+
+
+def create_vendor_stats_schema(conn):
+    """Creates the vendor_months store and the triggers that track which buckets changed."""
+    measures_ddl = ", ".join(f"{m}_{suffix} {'INTEGER' if suffix == 'N' else 'REAL'}"
+                             for m in VENDOR_STATS_MEASURES for suffix in ('N', 'Sum', 'SumSq'))
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in TRACKED_COLUMNS)
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS vendor_months (
+            Vendor TEXT NOT NULL, Month TEXT NOT NULL, ProjectCount INTEGER NOT NULL, {measures_ddl},
+            PRIMARY KEY (Vendor, Month)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS vendor_months_dirty (
+            VendorID INTEGER NOT NULL, Month TEXT NOT NULL, PRIMARY KEY (VendorID, Month)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS vendor_months_projects_insert AFTER INSERT ON projects
+        BEGIN {_dirty_bucket_sql('NEW')} END;
+        CREATE TRIGGER IF NOT EXISTS vendor_months_projects_delete AFTER DELETE ON projects
+        BEGIN {_dirty_bucket_sql('OLD')} END;
+        CREATE TRIGGER IF NOT EXISTS vendor_months_projects_update AFTER UPDATE ON projects
+        WHEN {changed}
+        BEGIN {_dirty_bucket_sql('OLD')} {_dirty_bucket_sql('NEW')} END;
+    ''')
+
+
+def refresh_sql(full=False):
+    """Returns the INSERT that recomputes the buckets (only the dirty ones unless `full`)."""
+    measures = ", ".join(f"COUNT(p.{m}), SUM(p.{m}), SUM(p.{m} * p.{m})" for m in VENDOR_STATS_MEASURES)
+    if full:
+        source = "projects p"
+    else:
+        # Each dirty bucket is one range search of idx_projects_vendor_end
+        source = '''vendor_months_dirty d
+        CROSS JOIN projects p ON p.VendorID = d.VendorID
+            AND p.ActualEndDate >= d.Month || '-01' AND p.ActualEndDate < date(d.Month || '-01', '+1 month')'''
+    return f'''
+        INSERT INTO vendor_months
+        SELECT v.VendorName, {MONTH_SQL.format(row='p')}, COUNT(*), {measures}
+        FROM {source}
+        JOIN vendors v ON p.VendorID = v.VendorID
+        WHERE p.ProjectStatus = 'Completed' AND p.ActualEndDate IS NOT NULL
+        GROUP BY 1, 2
+    '''
+
+
+def refresh_vendor_stats(conn, full=False):
+    """Brings vendor_months up to date with the projects table.
+
+    Only buckets marked dirty by the triggers are recomputed, so a load
+    that completes a handful of projects touches a handful of buckets. An
+    empty store (first build, or a database that predates it) is rebuilt
+    in full.
+    """
+    with conn:
+        if not full and conn.execute("SELECT 1 FROM vendor_months LIMIT 1").fetchone() is None:
+            full = True
+        if full:
+            conn.execute("DELETE FROM vendor_months")
+            dirty_buckets = None
+        else:
+            dirty_buckets = conn.execute("SELECT COUNT(*) FROM vendor_months_dirty").fetchone()[0]
+            if dirty_buckets == 0:
+                print("Vendor statistics are up to date.")
+                return
+            conn.execute('''DELETE FROM vendor_months WHERE (Vendor, Month) IN (
+                                SELECT v.VendorName, d.Month FROM vendor_months_dirty d
+                                JOIN vendors v ON d.VendorID = v.VendorID)''')
+        conn.execute(refresh_sql(full=full))
+        conn.execute("DELETE FROM vendor_months_dirty")
+
+    if full:
+        print("Rebuilt all vendor statistics.")
+    else:
+        print(f"Refreshed {dirty_buckets} changed vendor/month buckets.")
+
+
+def rolling_sql(period='month', window=3, vendors=None, start=None, end=None):
+    """Builds the rolling-window query over the buckets; returns (sql, params).
+
+    Months are first combined into periods, then every period is summed
+    with the `window - 1` periods before it (by calendar, so gaps count).
+    `start`/`end` ('YYYY-MM') limit the periods returned, not the history
+    the first windows draw on.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {list(PERIODS)}.")
+    if not 1 <= window <= MAX_WINDOW_PERIODS:
+        raise ValueError(f"window must be between 1 and {MAX_WINDOW_PERIODS} periods.")
+    label, index = PERIODS[period]
+    sums = ", ".join(f"SUM({m}_{s}) AS {m}_{s}" for m in VENDOR_STATS_MEASURES for s in ('N', 'Sum', 'SumSq'))
+    rolling = ", ".join(f"SUM({m}_{s}) OVER w AS Window_{m}_{s}"
+                        for m in VENDOR_STATS_MEASURES for s in ('N', 'Sum', 'SumSq'))
+
+    params = []
+    where = ""
+    if vendors:
+        where = f"WHERE Vendor IN ({', '.join('?' for _ in vendors)})"
+        params.extend(vendors)
+    bounds = []
+    for bound, condition in ((start, "LastMonth >= ?"), (end, "FirstMonth <= ?")):
+        if bound is not None:
+            try:
+                datetime.strptime(bound, '%Y-%m')
+            except ValueError:
+                raise ValueError(f"Months must be formatted as YYYY-MM, not '{bound}'.")
+            bounds.append(condition)
+            params.append(bound)
+
+    sql = f'''
+        SELECT * FROM (
+            SELECT Vendor, Period, FirstMonth, LastMonth, ProjectCount,
+                   SUM(ProjectCount) OVER w AS WindowProjectCount, {rolling}
+            FROM (
+                SELECT Vendor, {label} AS Period, {index} AS PeriodIndex,
+                       MIN(Month) AS FirstMonth, MAX(Month) AS LastMonth,
+                       SUM(ProjectCount) AS ProjectCount, {sums}
+                FROM vendor_months {where}
+                GROUP BY Vendor, Period
+            )
+            WINDOW w AS (PARTITION BY Vendor ORDER BY PeriodIndex RANGE BETWEEN {window - 1} PRECEDING AND CURRENT ROW)
+        )
+        {"WHERE " + " AND ".join(bounds) if bounds else ""}
+        ORDER BY Vendor, Period
+    '''
+    return sql, params
+
+
+def read_rolling_stats(conn, period='month', window=3, vendors=None, start=None, end=None):
+    """Rolling means and standard deviations per vendor and period, combined from the buckets.
+
+    Returns one dict per (vendor, period) with ProjectCount (completed in
+    the period), WindowProjectCount and, per measure, `<m>_N`, `<m>_Mean`
+    and `<m>_Std` over the window. Reads touch only bucket rows.
+    """
+    sql, params = rolling_sql(period, window, vendors, start, end)
+    cursor = conn.execute(sql, params)
+    columns = [description[0] for description in cursor.description]
+    results = []
+    for row in cursor:
+        row = dict(zip(columns, row))
+        stats = {'Vendor': row['Vendor'], 'Period': row['Period'], 'ProjectCount': row['ProjectCount'],
+                 'WindowProjectCount': row['WindowProjectCount']}
+        for m in VENDOR_STATS_MEASURES:
+            n, total, total_sq = (row[f'Window_{m}_{s}'] for s in ('N', 'Sum', 'SumSq'))
+            stats.update({f'{m}_N': n, f'{m}_Mean': total / n if n else None,
+                          f'{m}_Std': sample_std(n, total, total_sq)})
+        results.append(stats)
+    return results